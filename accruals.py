@@ -0,0 +1,274 @@
+"""
+Batch leave accrual.
+
+Each leave type can have an AccrualPolicy granting days_per_period days every
+month or year. A run takes every employee who has not yet accrued the period
+containing the run date, computes all their grants at once with numpy
+(pro-rated by the share of the period left after Employee.created_at), and
+applies them per policy in one transaction: one upsert into leave_balance,
+one insert into leave_ledger and one accrual_runs row. PostgreSQL and SQLite
+use their native upserts; other databases lock the existing balances, update
+them and insert the missing ones.
+
+Runs are idempotent per employee and period: an employee with an accrual
+ledger entry inside the period is skipped, so re-running later in the period
+only picks up new joiners, and a run that crashed rolled back as a whole and
+is simply run again. Concurrent runs of one policy serialize on its row lock.
+
+Usage:
+    python accruals.py run [--on YYYY-MM-DD] [--policy ID]
+"""
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+import argparse
+import os
+import threading
+
+import numpy as np
+
+from models import AccrualPolicy, AccrualRun, Employee, LeaveBalance, LeaveBalanceSnapshot, LeaveLedgerEntry
+import response_cache
+
+ACCRUAL_INTERVAL = float(os.getenv("ACCRUAL_INTERVAL", "86400"))
+ACCRUAL_SCHEDULER_ENABLED = os.getenv("ACCRUAL_SCHEDULER_ENABLED", "false").lower() == "true"
+
+FREQUENCIES = ("monthly", "annual")
+
+
+def period_bounds(frequency: str, on: date) -> Tuple[date, date]:
+    """First and last day of the accrual period containing `on`"""
+    if frequency == "annual":
+        return date(on.year, 1, 1), date(on.year, 12, 31)
+    start = date(on.year, on.month, 1)
+    next_month = date(on.year + on.month // 12, on.month % 12 + 1, 1)
+    return start, next_month - timedelta(days=1)
+
+
+def accrual_amounts(
+    days_per_period: int,
+    period_start: date,
+    period_end: date,
+    join_dates: np.ndarray,
+    prorate: bool = True
+) -> np.ndarray:
+    """Days granted to each employee for the period, rounded half up"""
+    start = np.datetime64(period_start, "D")
+    end = np.datetime64(period_end, "D")
+    length = (end - start).astype(np.int64) + 1
+    covered = np.clip((end - np.maximum(join_dates, start)).astype(np.int64) + 1, 0, length)
+    share = covered / length if prorate else (covered > 0).astype(np.float64)
+    return np.floor(days_per_period * share + 0.5).astype(np.int64)
+
+
+def _apply_postgresql(db: Session, type_id: int, employee_ids: list, days: list, effective: list, note: str):
+    # Arrays travel as three bind parameters however many employees there are
+    arrays = {"type_id": type_id, "employee_ids": employee_ids, "days": days, "effective": effective, "note": note}
+    db.execute(text("""
+        INSERT INTO leave_balance (employee_id, type_id, total_allocated, total_used, remaining)
+        SELECT e, :type_id, d, 0, d FROM unnest(CAST(:employee_ids AS int[]), CAST(:days AS int[])) AS a(e, d)
+        ON CONFLICT (employee_id, type_id) DO UPDATE SET
+            total_allocated = leave_balance.total_allocated + EXCLUDED.total_allocated,
+            remaining = leave_balance.remaining + EXCLUDED.remaining
+    """), arrays)
+    db.execute(text("""
+        INSERT INTO leave_ledger (employee_id, type_id, entry_type, days, effective_date, note, created_at)
+        SELECT e, :type_id, 'accrual', d, f, :note, now()
+        FROM unnest(CAST(:employee_ids AS int[]), CAST(:days AS int[]), CAST(:effective AS date[])) AS a(e, d, f)
+    """), arrays)
+    db.execute(text("""
+        DELETE FROM leave_balance_snapshots
+        WHERE type_id = :type_id AND employee_id = ANY(CAST(:employee_ids AS int[])) AND as_of >= :since
+    """), {"type_id": type_id, "employee_ids": employee_ids, "since": min(effective)})
+
+
+def _post_accruals(db: Session, type_id: int, employee_ids: list, days: list, effective: list, note: str):
+    db.execute(insert(LeaveLedgerEntry), [
+        {"employee_id": e, "type_id": type_id, "entry_type": "accrual", "days": d,
+         "effective_date": f, "note": note, "created_at": datetime.now()}
+        for e, d, f in zip(employee_ids, days, effective)
+    ])
+    db.execute(delete(LeaveBalanceSnapshot).where(
+        LeaveBalanceSnapshot.type_id == type_id,
+        LeaveBalanceSnapshot.employee_id.in_(employee_ids),
+        LeaveBalanceSnapshot.as_of >= min(effective)
+    ))
+
+
+def _apply_sqlite(db: Session, type_id: int, employee_ids: list, days: list, effective: list, note: str):
+    upsert = sqlite_insert(LeaveBalance)
+    db.execute(
+        upsert.on_conflict_do_update(
+            index_elements=["employee_id", "type_id"],
+            set_={
+                "total_allocated": LeaveBalance.total_allocated + upsert.excluded.total_allocated,
+                "remaining": LeaveBalance.remaining + upsert.excluded.remaining,
+            }
+        ),
+        [
+            {"employee_id": e, "type_id": type_id, "total_allocated": d, "total_used": 0, "remaining": d}
+            for e, d in zip(employee_ids, days)
+        ]
+    )
+    _post_accruals(db, type_id, employee_ids, days, effective, note)
+
+
+def _apply_portable(db: Session, type_id: int, employee_ids: list, days: list, effective: list, note: str):
+    # No upsert syntax shared by the other dialects: lock the existing balances,
+    # update them by primary key and insert the rest. A balance created
+    # concurrently makes the insert fail and the run roll back, to be run again
+    grants = dict(zip(employee_ids, days))
+    existing = db.execute(
+        select(LeaveBalance.id, LeaveBalance.employee_id, LeaveBalance.total_allocated, LeaveBalance.remaining)
+        .where(LeaveBalance.type_id == type_id, LeaveBalance.employee_id.in_(employee_ids))
+        .with_for_update()
+    ).all()
+    if existing:
+        db.execute(update(LeaveBalance), [
+            {"id": id, "total_allocated": allocated + grants[e], "remaining": remaining + grants[e]}
+            for id, e, allocated, remaining in existing
+        ])
+    found = {row[1] for row in existing}
+    missing = [
+        {"employee_id": e, "type_id": type_id, "total_allocated": d, "total_used": 0, "remaining": d}
+        for e, d in grants.items() if e not in found
+    ]
+    if missing:
+        db.execute(insert(LeaveBalance), missing)
+    _post_accruals(db, type_id, employee_ids, days, effective, note)
+
+
+APPLY_BY_DIALECT = {"postgresql": _apply_postgresql, "sqlite": _apply_sqlite}
+
+
+def run_policy(db: Session, policy_id: int, on: date) -> Optional[AccrualRun]:
+    """Accrue one policy's period containing `on`; returns the run, or None if nobody was due"""
+    policy = db.scalars(select(AccrualPolicy).where(AccrualPolicy.id == policy_id).with_for_update()).first()
+    if policy is None:
+        return None
+    period_start, period_end = period_bounds(policy.frequency, on)
+
+    # Matched in numpy rather than NOT EXISTS: right after a large run the ledger's
+    # statistics are stale and the planner picks a nested-loop anti-join
+    accrued = np.fromiter(db.scalars(
+        select(LeaveLedgerEntry.employee_id).where(
+            LeaveLedgerEntry.type_id == policy.type_id,
+            LeaveLedgerEntry.entry_type == "accrual",
+            LeaveLedgerEntry.effective_date.between(period_start, period_end)
+        )
+    ), dtype=np.int64)
+    rows = db.execute(
+        select(Employee.id, Employee.created_at)
+        .where(Employee.created_at < min(on, period_end) + timedelta(days=1))
+    ).all()
+    employee_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    join_dates = np.array([r[1] for r in rows], dtype="datetime64[D]")
+    days = accrual_amounts(policy.days_per_period, period_start, period_end, join_dates, policy.prorate)
+    # A joiner's accrual takes effect from their join date
+    effective = np.maximum(join_dates, np.datetime64(period_start, "D"))
+    due = (days > 0) & ~np.isin(employee_ids, accrued)
+    if not due.any():
+        return None
+
+    apply = APPLY_BY_DIALECT.get(db.bind.dialect.name, _apply_portable)
+    apply(
+        db,
+        policy.type_id,
+        employee_ids[due].tolist(),
+        days[due].tolist(),
+        effective[due].astype(object).tolist(),
+        f"{policy.frequency} accrual for {period_start.isoformat()}"
+    )
+    response_cache.mark_all_changed(db, response_cache.BALANCES)
+    run = AccrualRun(
+        policy_id=policy.id,
+        period_start=period_start,
+        employees=int(due.sum()),
+        days=int(days[due].sum())
+    )
+    db.add(run)
+    db.flush()
+    return run
+
+
+def run_accruals(db: Session, on: Optional[date] = None, policy_ids: Optional[Sequence[int]] = None) -> List[AccrualRun]:
+    """Run every policy (or the given ones), committing each policy separately"""
+    on = on or date.today()
+    if policy_ids is None:
+        policy_ids = list(db.scalars(select(AccrualPolicy.id).order_by(AccrualPolicy.id)))
+    runs = []
+    for policy_id in policy_ids:
+        try:
+            run = run_policy(db, policy_id, on)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        if run is not None:
+            runs.append(run)
+    return runs
+
+
+class AccrualScheduler:
+    """Background thread that runs all accrual policies for the current period"""
+
+    def __init__(self, session_factory, interval: float = ACCRUAL_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="accruals", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def run_once(self):
+        db = self.session_factory()
+        try:
+            for run in run_accruals(db):
+                print(f"Accrued {run.days} days to {run.employees} employees (policy {run.policy_id}, {run.period_start})")
+        finally:
+            db.close()
+        self.last_run = datetime.now()
+
+    def _run(self):
+        # First pass right away, so a restart on the 1st does not wait a full interval
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Accrual run failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Accrue leave for the current period")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--on", type=date.fromisoformat, help="Accrue the period containing this date (default: today)")
+    parser.add_argument("--policy", type=int, action="append", help="Only run this policy (repeatable)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        runs = run_accruals(db, args.on, args.policy)
+        for run in runs:
+            print(f"Policy {run.policy_id}: {run.days} days to {run.employees} employees for {run.period_start}")
+        print(f"{len(runs)} policies accrued")
+    finally:
+        db.close()
@@ -0,0 +1,241 @@
+"""
+Batched audit-log writer.
+
+crud.create_audit_log stages entries on the session. Once the request's
+transaction commits they are handed to the AuditSink, which inserts them
+from a background thread in multi-row batches whenever the batch size or
+the flush interval is reached. Entries staged by a transaction that rolls
+back are discarded.
+
+Queued entries belong to transactions that already committed, so a failed
+batch is never dropped: it is retried with backoff, then inserted row by
+row, and rows that still fail are appended to AUDIT_SPOOL_PATH. The spool is
+replayed when the sink starts.
+
+AUDIT_MODE=sync keeps the audit INSERT inside the request transaction, for
+deployments where an audit row must commit atomically with the change.
+"""
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from database import SessionLocal
+from models import AuditLog
+
+AUDIT_MODE = os.getenv("AUDIT_MODE", "async").lower()
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_WRITE_RETRIES = int(os.getenv("AUDIT_WRITE_RETRIES", "3"))
+AUDIT_RETRY_BACKOFF = float(os.getenv("AUDIT_RETRY_BACKOFF", "0.5"))
+AUDIT_SPOOL_PATH = os.getenv("AUDIT_SPOOL_PATH", "audit_spool.jsonl")
+
+logger = logging.getLogger(__name__)
+
+# Session.info key holding entries staged by the current transaction
+PENDING_KEY = "pending_audit_entries"
+
+
+class AuditSink:
+    """Queue of committed audit entries, flushed in batches by a worker thread"""
+
+    def __init__(
+        self,
+        session_factory,
+        batch_size: int,
+        flush_interval: float,
+        max_queue: int,
+        retries: int = AUDIT_WRITE_RETRIES,
+        backoff: float = AUDIT_RETRY_BACKOFF,
+        spool_path: str = AUDIT_SPOOL_PATH
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.spool_path = spool_path
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._spool_lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.retried = 0
+        self.spooled = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self.replay_spool()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker and write everything still queued"""
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, entries: List[dict]):
+        if not self.running:
+            # Stopped between staging and commit - write straight through
+            self._write(entries)
+            return
+        # Blocks when the queue is full, pushing back on writers instead of dropping entries
+        for entry in entries:
+            self._queue.put(entry)
+
+    def stats(self) -> dict:
+        return {
+            "mode": AUDIT_MODE,
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "retried": self.retried,
+            "spooled": self.spooled,
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+        # Drain on shutdown
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+    def _collect(self) -> List[dict]:
+        """Wait until a full batch is queued or the flush interval has passed"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self, limit: int) -> List[dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[dict]):
+        """Insert a batch, retrying with backoff; rows that keep failing are spooled"""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                self._insert(batch)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                error = e
+        self.failures += 1
+        logger.warning("Audit batch of %d entries failed after %d attempts: %s", len(batch), self.retries + 1, error)
+
+        # One bad row must not sink the rest of the batch
+        failed = []
+        for entry in batch:
+            try:
+                self._insert([entry])
+                self.written += 1
+            except Exception as e:
+                logger.error("Audit entry %r could not be written: %s", entry, e)
+                failed.append(entry)
+        if failed:
+            self._spool(failed)
+
+    def _insert(self, entries: List[dict]):
+        db = self.session_factory()
+        try:
+            # executemany of a single INSERT is sent as multi-row VALUES batches
+            db.execute(insert(AuditLog), entries)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _spool(self, entries: List[dict]):
+        with self._spool_lock:
+            with open(self.spool_path, "a") as spool:
+                for entry in entries:
+                    spool.write(json.dumps({**entry, "timestamp": entry["timestamp"].isoformat()}) + "\n")
+        self.spooled += len(entries)
+        logger.error("Spooled %d audit entries to %s", len(entries), self.spool_path)
+
+    def replay_spool(self):
+        """Write the entries spooled by earlier failures; any that still fail are spooled again"""
+        replaying = self.spool_path + ".replay"
+        with self._spool_lock:
+            # A leftover .replay file is from a replay that was interrupted; finish it first
+            if not os.path.exists(replaying):
+                if not os.path.exists(self.spool_path):
+                    return
+                os.replace(self.spool_path, replaying)
+        with open(replaying) as spool:
+            entries = [json.loads(line) for line in spool if line.strip()]
+        for entry in entries:
+            entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+        for start in range(0, len(entries), self.batch_size):
+            self._write(entries[start:start + self.batch_size])
+        os.remove(replaying)
+        logger.info("Replayed %d spooled audit entries", len(entries))
+
+
+audit_sink = AuditSink(SessionLocal, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_QUEUE_SIZE)
+
+
+def use_sink() -> bool:
+    """Whether audit entries should be deferred to the sink"""
+    return AUDIT_MODE == "async" and audit_sink.running
+
+
+def stage(db: Session, entry: dict):
+    """Stage an entry to be queued once the session's transaction commits"""
+    entry.setdefault("timestamp", datetime.now())
+    db.info.setdefault(PENDING_KEY, []).append(entry)
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_committed(session: Session):
+    entries = session.info.pop(PENDING_KEY, None)
+    if entries:
+        audit_sink.submit(entries)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session):
+    session.info.pop(PENDING_KEY, None)
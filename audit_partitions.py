@@ -0,0 +1,213 @@
+"""
+Monthly range partitions for audit_logs (PostgreSQL only).
+
+audit_logs is partitioned by RANGE (timestamp) into audit_logs_YYYY_MM
+tables. ensure_partitions() creates the partitions for the retention window
+plus the upcoming months, and archive_partitions() exports partitions older
+than the retention window to gzipped CSV files before detaching and dropping
+them. A default partition catches rows outside every monthly range; when a
+month is created later, its rows are moved out of the default partition.
+
+Usage:
+    python audit_partitions.py ensure
+    python audit_partitions.py archive [--dry-run]
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from datetime import date, datetime
+from typing import List, Tuple
+import argparse
+import gzip
+import os
+import re
+import threading
+
+AUDIT_PARTITION_MONTHS_AHEAD = int(os.getenv("AUDIT_PARTITION_MONTHS_AHEAD", "3"))
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "24"))
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR", "archive/audit_logs")
+AUDIT_ARCHIVE_ENABLED = os.getenv("AUDIT_ARCHIVE_ENABLED", "false").lower() == "true"
+AUDIT_MAINTENANCE_INTERVAL = float(os.getenv("AUDIT_MAINTENANCE_INTERVAL", "86400"))
+
+PARENT_TABLE = "audit_logs"
+DEFAULT_PARTITION = "audit_logs_default"
+PARTITION_PATTERN = re.compile(r"^audit_logs_(\d{4})_(\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_{month.year:04d}_{month.month:02d}"
+
+
+def list_partitions(conn) -> List[Tuple[str, date, bool]]:
+    """All monthly audit log tables as (name, month, attached), oldest first"""
+    rows = conn.execute(text("""
+        SELECT c.relname, i.inhrelid IS NOT NULL AS attached
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+        WHERE n.nspname = current_schema()
+          AND c.relkind = 'r'
+          AND c.relname LIKE 'audit\\_logs\\_%'
+    """)).all()
+    partitions = []
+    for name, attached in rows:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1), attached))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def ensure_partitions(
+    engine: Engine,
+    months_back: int = AUDIT_RETENTION_MONTHS,
+    months_ahead: int = AUDIT_PARTITION_MONTHS_AHEAD
+) -> List[str]:
+    """Create any missing monthly partitions in the retention window and ahead of today"""
+    current = month_start(date.today())
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+        existing = {name for name, _, _ in list_partitions(conn)}
+    created = []
+    # One transaction per month, so a month that fails does not hold back the others
+    for offset in range(-months_back, months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        try:
+            moved = create_partition(engine, month)
+        except Exception as e:
+            print(f"Failed to create audit log partition {name}: {e}")
+            continue
+        if moved:
+            print(f"Moved {moved} audit log rows from {DEFAULT_PARTITION} to {name}")
+        created.append(name)
+    return created
+
+
+def create_partition(engine: Engine, month: date) -> int:
+    """Create the partition for `month`; returns how many rows it took over from the default partition"""
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    bounds = f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    in_range = f"timestamp >= '{start}' AND timestamp < '{end}'"
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        if not conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})")):
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} {bounds}"))
+            return 0
+        # PostgreSQL refuses a partition whose range has rows in the default
+        # partition (e.g. after the job missed a month): take the default out,
+        # create the month, move its rows across and put the default back
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} {bounds}"))
+        moved = conn.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING *) "
+            f"INSERT INTO {PARENT_TABLE} SELECT * FROM moved"
+        )).rowcount
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    return moved
+
+
+def archive_partitions(
+    engine: Engine,
+    retention_months: int = AUDIT_RETENTION_MONTHS,
+    archive_dir: str = AUDIT_ARCHIVE_DIR,
+    dry_run: bool = False
+) -> List[str]:
+    """Export partitions older than the retention window to gzipped CSV, then drop them"""
+    cutoff = add_months(month_start(date.today()), -retention_months)
+    with engine.connect() as conn:
+        expired = [p for p in list_partitions(conn) if p[1] < cutoff]
+    if dry_run:
+        return [name for name, _, _ in expired]
+
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = []
+    for name, _, attached in expired:
+        path = os.path.join(archive_dir, f"{name}.csv.gz")
+        # Export while still attached; a crash before the DROP only means re-exporting next run
+        raw = engine.raw_connection()
+        try:
+            with raw.cursor() as cursor, gzip.open(path, "wt", encoding="utf-8") as out:
+                cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", out)
+            raw.commit()
+        finally:
+            raw.close()
+
+        with engine.begin() as conn:
+            # DETACH locks the parent, so give up quickly rather than queue behind writers
+            conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+            if attached:
+                conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+        archived.append(path)
+    return archived
+
+
+class PartitionMaintenance:
+    """Background thread that keeps upcoming partitions created and, optionally, archives old ones"""
+
+    def __init__(self, engine: Engine, interval: float = AUDIT_MAINTENANCE_INTERVAL, archive: bool = AUDIT_ARCHIVE_ENABLED):
+        self.engine = engine
+        self.interval = interval
+        self.archive = archive
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-partitions", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def run_once(self):
+        created = ensure_partitions(self.engine)
+        if created:
+            print(f"Created audit log partitions: {', '.join(created)}")
+        if self.archive:
+            archived = archive_partitions(self.engine)
+            if archived:
+                print(f"Archived audit log partitions: {', '.join(archived)}")
+        self.last_run = datetime.now()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Audit partition maintenance failed: {e}")
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Manage audit_logs partitions")
+    parser.add_argument("command", choices=["ensure", "archive"])
+    parser.add_argument("--dry-run", action="store_true", help="List expired partitions without archiving them")
+    args = parser.parse_args()
+
+    if args.command == "ensure":
+        created = ensure_partitions(engine)
+        print(f"Created {len(created)} partitions: {', '.join(created) or '-'}")
+    else:
+        result = archive_partitions(engine, dry_run=args.dry_run)
+        action = "Would archive" if args.dry_run else "Archived"
+        print(f"{action} {len(result)} partitions: {', '.join(result) or '-'}")
@@ -1,4 +1,6 @@
 import bcrypt
+import hashlib
+import secrets
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
@@ -12,6 +14,7 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -50,3 +53,13 @@ def decode_access_token(token: str) -> Optional[dict]:
         return payload
     except JWTError:
         return None
+
+
+def generate_refresh_token() -> str:
+    """Create a random opaque refresh token"""
+    return secrets.token_urlsafe(32)
+
+
+def hash_refresh_token(token: str) -> str:
+    """Hash a refresh token for storage and lookup"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
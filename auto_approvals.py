@@ -0,0 +1,206 @@
+"""
+Rule-based auto-approval of pending leaves.
+
+An AutoApprovalRule approves a pending leave when every condition it sets
+holds: the leave type, the employee's team, at most max_days working days,
+at least min_remaining days left on the balance once the leave is booked,
+and at most max_team_absent team members out on any day of the leave, this
+leave included. Rules only ever approve; leaves no rule matches wait for a
+manager, and leaves claimed by a manager are left to them.
+
+A sweep walks the pending queue in id order, AUTO_APPROVAL_BATCH leaves at a
+time. Each batch costs a fixed handful of queries: one matches the leaves
+against every enabled rule, one reads the team_day_absences counters, and
+the matches are approved through
+crud.decide_leaves, the same path as POST /approvals/bulk, before the batch
+commits. Leaves approved earlier in a batch count towards the coverage of
+later ones. When one employee's matches do not all fit their balance, they
+are approved in id order while they fit and the rest wait for a manager.
+
+Usage:
+    python auto_approvals.py run
+"""
+from sqlalchemy import and_, exists, or_, select
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional, Tuple
+import argparse
+import os
+import threading
+import time
+
+from models import AutoApprovalRule, Employee, Leave, LeaveBalance
+import crud
+
+AUTO_APPROVAL_ENABLED = os.getenv("AUTO_APPROVAL_ENABLED", "false").lower() == "true"
+AUTO_APPROVAL_INTERVAL = float(os.getenv("AUTO_APPROVAL_INTERVAL", "300"))
+AUTO_APPROVAL_BATCH = int(os.getenv("AUTO_APPROVAL_BATCH", "1000"))
+
+
+def matching_rules_query(leave_ids: list):
+    """One row per (pending leave, enabled rule it satisfies), coverage aside"""
+    return (
+        select(
+            Leave.id.label("leave_id"),
+            Employee.team_id,
+            Leave.start_time,
+            Leave.end_time,
+            AutoApprovalRule.id.label("rule_id"),
+            AutoApprovalRule.approver_id,
+            AutoApprovalRule.max_team_absent
+        )
+        .join(Employee, Employee.id == Leave.employee_id)
+        .join(LeaveBalance, (LeaveBalance.employee_id == Leave.employee_id) & (LeaveBalance.type_id == Leave.type_id))
+        .join(AutoApprovalRule, and_(
+            AutoApprovalRule.enabled,
+            or_(AutoApprovalRule.type_id.is_(None), AutoApprovalRule.type_id == Leave.type_id),
+            or_(AutoApprovalRule.team_id.is_(None), AutoApprovalRule.team_id == Employee.team_id),
+            or_(AutoApprovalRule.max_days.is_(None), Leave.days <= AutoApprovalRule.max_days),
+            or_(
+                AutoApprovalRule.min_remaining.is_(None),
+                LeaveBalance.total_allocated - LeaveBalance.total_used - Leave.days >= AutoApprovalRule.min_remaining
+            ),
+            # A coverage limit needs a team to count against
+            or_(AutoApprovalRule.max_team_absent.is_(None), Employee.team_id.is_not(None))
+        ))
+        .where(
+            Leave.id.in_(leave_ids),
+            Leave.status == "pending",
+            # Leaves filed before reservations were recorded have no day count to judge
+            Leave.days.is_not(None),
+            or_(Leave.claimed_by.is_(None), Leave.claim_expires_at < datetime.now())
+        )
+        .order_by(Leave.id, AutoApprovalRule.id)
+    )
+
+
+def sweep_batch(db: Session, after_id: int, batch_size: int = AUTO_APPROVAL_BATCH) -> Tuple[Optional[int], dict]:
+    """Auto-approve matching leaves among the next batch_size pending ones and commit; returns (last id, stats)"""
+    leave_ids = db.scalars(
+        select(Leave.id).where(Leave.status == "pending", Leave.id > after_id).order_by(Leave.id).limit(batch_size)
+    ).all()
+    if not leave_ids:
+        return None, {}
+
+    candidates = {}
+    for row in db.execute(matching_rules_query(leave_ids)):
+        candidates.setdefault(row.leave_id, []).append(row)
+    stats = {"scanned": len(leave_ids), "matched": len(candidates), "approved": 0, "failed": 0}
+
+    absent = {}
+    limited = [rows[0] for rows in candidates.values() if any(r.max_team_absent is not None for r in rows)]
+    if limited:
+        absent = crud.get_team_absences(
+            db,
+            (r.team_id for r in limited),
+            min(r.start_time for r in limited).date(),
+            max(r.end_time for r in limited).date()
+        )
+
+    # rule_id -> (approver_id, leave ids it approves)
+    by_rule = {}
+    for leave_id, rows in candidates.items():
+        team_id = rows[0].team_id
+        days = crud.leave_dates(rows[0])
+        peak = max((absent.get((team_id, day), 0) for day in days), default=0)
+        rule = next((r for r in rows if r.max_team_absent is None or peak < r.max_team_absent), None)
+        if rule is None:
+            continue
+        by_rule.setdefault(rule.rule_id, (rule.approver_id, []))[1].append(leave_id)
+        if team_id is not None:
+            for day in days:
+                absent[(team_id, day)] = absent.get((team_id, day), 0) + 1
+
+    for rule_id, (approver_id, rule_leave_ids) in by_rule.items():
+        results = crud.decide_leaves(
+            db,
+            approver_id,
+            [(leave_id, "approved") for leave_id in rule_leave_ids],
+            source=f"auto-approval rule {rule_id}"
+        )
+        approved = sum(1 for r in results if r["approval_id"] is not None)
+        stats["approved"] += approved
+        stats["failed"] += len(results) - approved
+    db.commit()
+    return leave_ids[-1], stats
+
+
+def sweep(db: Session, batch_size: int = AUTO_APPROVAL_BATCH) -> dict:
+    """Run every enabled rule over the whole pending queue; returns the totals"""
+    started = time.monotonic()
+    report = {"batches": 0, "scanned": 0, "matched": 0, "approved": 0, "failed": 0, "elapsed_seconds": 0.0}
+    if db.scalar(select(exists().where(AutoApprovalRule.enabled))):
+        after_id = 0
+        while True:
+            last_id, stats = sweep_batch(db, after_id, batch_size)
+            if last_id is None:
+                break
+            report["batches"] += 1
+            for key, value in stats.items():
+                report[key] += value
+            after_id = last_id
+    db.rollback()
+    report["elapsed_seconds"] = round(time.monotonic() - started, 3)
+    return report
+
+
+class AutoApprover:
+    """Background thread that sweeps the pending queue with the auto-approval rules"""
+
+    def __init__(self, session_factory, interval: float = AUTO_APPROVAL_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="auto-approvals", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def run_once(self):
+        db = self.session_factory()
+        try:
+            report = sweep(db)
+        finally:
+            db.close()
+        if report["approved"]:
+            print(f"Auto-approved {report['approved']} of {report['scanned']} pending leaves in {report['elapsed_seconds']}s")
+        self.last_run = datetime.now()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Auto-approval sweep failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Approve pending leaves that match an auto-approval rule")
+    parser.add_argument("command", choices=["run"])
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = sweep(db)
+    finally:
+        db.close()
+    print(
+        f"Scanned {report['scanned']} pending leaves in {report['batches']} batches ({report['elapsed_seconds']}s): "
+        f"{report['matched']} matched, {report['approved']} approved, {report['failed']} failed"
+    )
@@ -0,0 +1,196 @@
+"""
+Year-end carry-forward and expiry.
+
+For every balance whose leave type has a carry_forward_cap, days left over
+beyond the cap expire when the year closes: the balance restarts with
+total_allocated = what was kept plus the new year's credits, total_used = the
+days of leaves approved on or after January 1st, and the expired days are
+posted to the ledger as an `expiry` entry dated January 1st. The cap applies
+to the balance as it stood at the rollover, so days credited or approved in
+the new year before the job runs change neither what expires nor what is
+kept, unless those approvals already spent days over the cap: expiry never
+takes more than remaining - reserved at the time of the run, so the balance
+cannot go negative. Days held by pending leaves never expire.
+
+The job walks leave_balance in id ranges of CARRY_FORWARD_CHUNK rows. Each
+chunk is one short transaction of set-based statements (lock, ledger insert,
+update) plus one summary audit record, and stamps carried_over_year, so a
+re-run skips finished balances and an interrupted run resumes where it
+stopped. --dry-run only reports the projected changes.
+
+Usage:
+    python carry_forward.py [--year YYYY] [--dry-run]
+"""
+from sqlalchemy import case, delete, func, insert, literal, or_, select, tuple_, update
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+from typing import Optional
+import argparse
+import os
+
+from models import Approval, Leave, LeaveBalance, LeaveBalanceSnapshot, LeaveLedgerEntry, LeaveType
+import crud
+import response_cache
+
+CARRY_FORWARD_CHUNK = int(os.getenv("CARRY_FORWARD_CHUNK", "5000"))
+
+
+def carry_forward_terms(year: int):
+    """SQL expressions for the days that expire, the days kept, the new year's credits and its usage on each balance"""
+    rollover = date(year + 1, 1, 1)
+    fresh = select(func.coalesce(func.sum(LeaveLedgerEntry.days), 0)).where(
+        LeaveLedgerEntry.employee_id == LeaveBalance.employee_id,
+        LeaveLedgerEntry.type_id == LeaveBalance.type_id,
+        LeaveLedgerEntry.entry_type.in_(("allocation", "accrual")),
+        LeaveLedgerEntry.effective_date >= rollover
+    ).scalar_subquery()
+    # Days of leaves approved from the rollover on, which stay in total_used
+    used = select(func.coalesce(func.sum(Leave.days), 0)).join(
+        Approval, (Approval.leave_id == Leave.id) & (Approval.decision == "approved")
+    ).where(
+        Leave.employee_id == LeaveBalance.employee_id,
+        Leave.type_id == LeaveBalance.type_id,
+        Leave.status == "approved",
+        Approval.approved_at >= rollover
+    ).scalar_subquery()
+    cap = select(LeaveType.carry_forward_cap).where(LeaveType.id == LeaveBalance.type_id).scalar_subquery()
+    # Remaining as of the rollover
+    closing = LeaveBalance.remaining + used - fresh
+    excess = closing - LeaveBalance.reserved - cap
+    # Days already spent in the new year cannot expire: never take more than is free now
+    headroom = LeaveBalance.remaining - LeaveBalance.reserved
+    capped = case((excess < headroom, excess), else_=headroom)
+    expired = case((capped > 0, capped), else_=0)
+    return expired, closing - expired, fresh, used
+
+
+def pending_filter(year: int):
+    """Balances with a capped leave type that have not been carried forward for `year`"""
+    return (
+        LeaveBalance.type_id.in_(select(LeaveType.id).where(LeaveType.carry_forward_cap.is_not(None))),
+        or_(LeaveBalance.carried_over_year.is_(None), LeaveBalance.carried_over_year < year)
+    )
+
+
+def summarize(db: Session, year: int, *filters) -> dict:
+    """Per leave type: balances affected, days expiring and days kept"""
+    expired, kept, _, _ = carry_forward_terms(year)
+    rows = db.execute(
+        select(LeaveBalance.type_id, func.count(), func.sum(expired), func.sum(kept))
+        .where(*pending_filter(year), *filters)
+        .group_by(LeaveBalance.type_id)
+    ).all()
+    return {type_id: [count, int(expired or 0), int(kept or 0)] for type_id, count, expired, kept in rows}
+
+
+def carry_forward_chunk(db: Session, year: int, low: int, high: int) -> dict:
+    """Apply the carry-forward to balances with ids in [low, high) and commit"""
+    in_chunk = (LeaveBalance.id >= low, LeaveBalance.id < high, *pending_filter(year))
+    # Lock the chunk first so the ledger entries and the update see the same counters
+    locked = db.scalars(select(LeaveBalance.id).where(*in_chunk).with_for_update()).all()
+    if not locked:
+        db.rollback()
+        return {}
+
+    summary = summarize(db, year, LeaveBalance.id >= low, LeaveBalance.id < high)
+    expired, kept, fresh, used = carry_forward_terms(year)
+    rollover = date(year + 1, 1, 1)
+    db.execute(insert(LeaveLedgerEntry).from_select(
+        ["employee_id", "type_id", "entry_type", "days", "effective_date", "note", "created_at"],
+        select(
+            LeaveBalance.employee_id,
+            LeaveBalance.type_id,
+            literal("expiry"),
+            -expired,
+            literal(rollover),
+            literal(f"{year} carry-forward"),
+            literal(datetime.now())
+        ).where(*in_chunk, expired > 0)
+    ))
+    # Snapshots from the new year no longer match the ledger
+    db.execute(delete(LeaveBalanceSnapshot).where(
+        LeaveBalanceSnapshot.as_of >= rollover,
+        tuple_(LeaveBalanceSnapshot.employee_id, LeaveBalanceSnapshot.type_id).in_(
+            select(LeaveBalance.employee_id, LeaveBalance.type_id).where(*in_chunk)
+        )
+    ))
+    db.execute(
+        update(LeaveBalance)
+        .where(*in_chunk)
+        .values(
+            total_allocated=kept + fresh,
+            total_used=used,
+            remaining=kept + fresh - used,
+            carried_over_year=year
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    response_cache.mark_all_changed(db, response_cache.BALANCES)
+
+    balances = sum(s[0] for s in summary.values())
+    expired_days = sum(s[1] for s in summary.values())
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,
+        action=f"{year} carry-forward: {balances} balances (ids {low}-{high - 1}), {expired_days} days expired",
+        target_table="leave_balance",
+        target_id=low
+    )
+    db.commit()
+    return summary
+
+
+def carry_forward(db: Session, year: Optional[int] = None, dry_run: bool = False, chunk_size: int = CARRY_FORWARD_CHUNK) -> dict:
+    """Carry forward every capped balance for `year` (default: last year); returns a report"""
+    year = year or date.today().year - 1
+    totals = {}
+    chunks = 0
+    if dry_run:
+        totals = summarize(db, year)
+    else:
+        low, high = db.execute(select(func.min(LeaveBalance.id), func.max(LeaveBalance.id))).one()
+        db.rollback()
+        if low is not None:
+            for start in range(low, high + 1, chunk_size):
+                summary = carry_forward_chunk(db, year, start, start + chunk_size)
+                if summary:
+                    chunks += 1
+                for type_id, values in summary.items():
+                    current = totals.setdefault(type_id, [0, 0, 0])
+                    for i, value in enumerate(values):
+                        current[i] += value
+
+    types = [
+        {"type_id": type_id, "balances": count, "expired_days": expired, "carried_days": kept}
+        for type_id, (count, expired, kept) in sorted(totals.items())
+    ]
+    return {
+        "year": year,
+        "dry_run": dry_run,
+        "chunks": chunks,
+        "balances": sum(t["balances"] for t in types),
+        "expired_days": sum(t["expired_days"] for t in types),
+        "carried_days": sum(t["carried_days"] for t in types),
+        "types": types,
+    }
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Carry forward leave balances at year end")
+    parser.add_argument("--year", type=int, help="Year being closed (default: last year)")
+    parser.add_argument("--dry-run", action="store_true", help="Report the projected changes without applying them")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = carry_forward(db, args.year, args.dry_run)
+    finally:
+        db.close()
+    action = "Would expire" if report["dry_run"] else "Expired"
+    print(f"{report['year']}: {report['balances']} balances in {report['chunks']} chunks")
+    for t in report["types"]:
+        print(f"  type {t['type_id']}: {t['balances']} balances, {action.lower()} {t['expired_days']} days, {t['carried_days']} kept")
+    print(f"{action} {report['expired_days']} days, carried {report['carried_days']}")
@@ -0,0 +1,118 @@
+"""
+Carry-forward followed by reconciliation.
+
+Books a leave approved after the closed year, carries the balance forward
+and checks that reconcile.py agrees with the result, so a later
+`reconcile.py --repair` leaves the balance alone:
+
+1. Days allocated in the new year: nothing expires, the approval stays in
+   total_used.
+2. Days allocated in the closed year, above the cap: the excess expires from
+   the balance as it stood at the rollover, the approval stays in total_used.
+3. The new year's approval spends more than the cap left: only the days
+   still available expire and the balance ends at zero, not below it.
+
+Only the balances it creates are carried forward, for last year. Creates its
+own employee, manager and leave type and deletes them afterwards.
+
+Usage:
+    python check_carry_forward.py
+"""
+from datetime import date, datetime, timedelta
+import sys
+import uuid
+
+from database import SessionLocal, init_db
+from auth import get_password_hash
+from models import Leave
+from schemas import LeaveCreate, ApprovalCreate
+from routers import leaves as leaves_router, approvals as approvals_router
+from stress_balances import balance_of, check
+import carry_forward
+import crud
+import reconcile
+
+ALLOCATED = 20
+CAP = 5
+DAYS_PER_LEAVE = 3
+MONDAY = datetime(2030, 1, 7)
+
+
+def scenario(
+    label: str,
+    credited_on: date,
+    expected: tuple,
+    expired: int,
+    allocated: int = ALLOCATED,
+    leave_end: datetime = MONDAY + timedelta(days=DAYS_PER_LEAVE - 1)
+) -> bool:
+    """Allocate, approve one leave, carry forward last year and compare with reconcile"""
+    year = date.today().year - 1
+    tag = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    employee = crud.create_employee(db, f"Carry {tag}", f"carry-{tag}@example.com", get_password_hash("carry"))
+    manager = crud.create_manager(db, f"Carry {tag}", f"carry-mgr-{tag}@example.com", get_password_hash("carry"))
+    leave_type = crud.create_leave_type(db, f"Carry {tag}", carry_forward_cap=CAP)
+    balance = crud.create_leave_balance(db, employee.id, leave_type.id, 0)
+    balance.total_allocated = balance.remaining = allocated
+    crud.post_ledger_entry(db, employee.id, leave_type.id, "allocation", allocated, effective_date=credited_on)
+    db.commit()
+    employee_id, manager_id, type_id, balance_id = employee.id, manager.id, leave_type.id, balance.id
+
+    print(f"{label}")
+    ok = True
+    try:
+        leave = leaves_router.create_leave(
+            LeaveCreate(type_id=type_id, start_time=MONDAY, end_time=leave_end),
+            employee_id,
+            db
+        )
+        approvals_router.create_approval(ApprovalCreate(leave_id=leave.id, decision="approved"), manager_id, db)
+        summary = carry_forward.carry_forward_chunk(db, year, balance_id, balance_id + 1)
+
+        balance = balance_of(employee_id, type_id)
+        ok &= check("carried over", balance.carried_over_year, year)
+        ok &= check("expired", summary.get(type_id, [0, 0, 0])[1], expired)
+        ok &= check(
+            "allocated/used/remaining",
+            (balance.total_allocated, balance.total_used, balance.remaining),
+            expected
+        )
+        usage = db.execute(reconcile.expected_usage_query().where(Leave.employee_id == employee_id)).all()
+        ok &= check("reconciled used", int(usage[0][2]) if usage else 0, balance.total_used)
+    finally:
+        db.rollback()
+        crud.delete_employee(db, employee_id)
+        crud.delete_manager(db, manager_id)
+        crud.delete_leave_type(db, type_id)
+        db.commit()
+        db.close()
+    return ok
+
+
+if __name__ == "__main__":
+    init_db()
+    closed_year = date.today().year - 1
+    passed = scenario(
+        "1. Allocated in the new year",
+        date.today(),
+        (ALLOCATED, DAYS_PER_LEAVE, ALLOCATED - DAYS_PER_LEAVE),
+        0
+    )
+    passed &= scenario(
+        "2. Allocated in the closed year",
+        date(closed_year, 1, 1),
+        (CAP, DAYS_PER_LEAVE, CAP - DAYS_PER_LEAVE),
+        ALLOCATED - CAP
+    )
+    # 10 days at the rollover and an 8-day leave in January, Monday to the next Wednesday
+    passed &= scenario(
+        "3. New-year usage over the cap",
+        date(closed_year, 1, 1),
+        (8, 8, 0),
+        2,
+        allocated=10,
+        leave_end=MONDAY + timedelta(days=9)
+    )
+    print("PASSED" if passed else "FAILED")
+    sys.exit(0 if passed else 1)
@@ -1,20 +1,29 @@
+from sqlalchemy import Integer, case, delete, func, insert, literal, literal_column, or_, select, text, tuple_, union_all, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from models import (
     Admin, Employee, Manager, LeaveType, Leave, 
-    Approval, LeaveBalance, AuditLog
+    Approval, LeaveBalance, AuditLog, RefreshToken, Holiday, LeaveDay,
+    LeaveLedgerEntry, LeaveBalanceSnapshot, AccrualPolicy, AccrualRun, Team, AutoApprovalRule, TeamDayAbsence
 )
-from auth import get_password_hash
-from datetime import datetime
+import audit
+import leave_type_cache
+import principal_cache
+import response_cache
+import workdays
+from datetime import date, datetime, timedelta
+
+# Write functions only flush: the caller owns the transaction and commits
+# once per request, so every write in a request is atomic.
 
 
 # ============== Admin CRUD ==============
-def create_admin(db: Session, name: str, email: str, password: str) -> Admin:
-    hashed_password = get_password_hash(password)
-    admin = Admin(name=name, email=email, password_hash=hashed_password)
+def create_admin(db: Session, name: str, email: str, password_hash: str) -> Admin:
+    admin = Admin(name=name, email=email, password_hash=password_hash)
     db.add(admin)
-    db.commit()
-    db.refresh(admin)
+    db.flush()
     return admin
 
 
@@ -23,20 +32,81 @@ def get_admin_by_email(db: Session, email: str) -> Optional[Admin]:
 
 
 def get_admin_by_id(db: Session, admin_id: int) -> Optional[Admin]:
-    return db.query(Admin).filter(Admin.id == admin_id).first()
+    return db.get(Admin, admin_id)
+
+
+def get_all_admins(db: Session, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Admin]:
+    query = db.query(Admin)
+    if after:
+        query = query.filter(Admin.id > after[0])
+    return query.order_by(Admin.id).offset(skip).limit(limit).all()
+
+
+# ============== Team CRUD ==============
+def create_team(db: Session, name: str, min_present: Optional[int] = None) -> Team:
+    team = Team(name=name, min_present=min_present)
+    db.add(team)
+    db.flush()
+    return team
+
+
+def update_team(
+    db: Session,
+    team_id: int,
+    name: Optional[str] = None,
+    min_present: Optional[int] = None
+) -> Optional[Team]:
+    team = get_team_by_id(db, team_id)
+    if not team:
+        return None
+    
+    if name:
+        team.name = name
+    if min_present is not None:
+        team.min_present = min_present
+    
+    db.flush()
+    return team
+
+
+def get_team_by_id(db: Session, team_id: int) -> Optional[Team]:
+    return db.get(Team, team_id)
+
 
+def get_team_by_name(db: Session, name: str) -> Optional[Team]:
+    return db.query(Team).filter(Team.name == name).first()
 
-def get_all_admins(db: Session, skip: int = 0, limit: int = 100) -> List[Admin]:
-    return db.query(Admin).offset(skip).limit(limit).all()
+
+def get_all_teams(db: Session) -> List[Team]:
+    return db.query(Team).order_by(Team.id).all()
+
+
+def get_team_members(db: Session, team_id: int) -> List[Employee]:
+    return db.query(Employee).filter(Employee.team_id == team_id).order_by(Employee.id).all()
+
+
+def delete_team(db: Session, team_id: int) -> bool:
+    team = get_team_by_id(db, team_id)
+    if not team:
+        return False
+    
+    db.delete(team)
+    db.flush()
+    return True
 
 
 # ============== Employee CRUD ==============
-def create_employee(db: Session, name: str, email: str, password: str) -> Employee:
-    hashed_password = get_password_hash(password)
-    employee = Employee(name=name, email=email, password_hash=hashed_password)
+def create_employee(
+    db: Session,
+    name: str,
+    email: str,
+    password_hash: str,
+    region: str = "default",
+    team_id: Optional[int] = None
+) -> Employee:
+    employee = Employee(name=name, email=email, password_hash=password_hash, region=region, team_id=team_id)
     db.add(employee)
-    db.commit()
-    db.refresh(employee)
+    db.flush()
     return employee
 
 
@@ -45,14 +115,24 @@ def get_employee_by_email(db: Session, email: str) -> Optional[Employee]:
 
 
 def get_employee_by_id(db: Session, employee_id: int) -> Optional[Employee]:
-    return db.query(Employee).filter(Employee.id == employee_id).first()
+    return db.get(Employee, employee_id)
 
 
-def get_all_employees(db: Session, skip: int = 0, limit: int = 100) -> List[Employee]:
-    return db.query(Employee).offset(skip).limit(limit).all()
+def get_all_employees(db: Session, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Employee]:
+    query = db.query(Employee)
+    if after:
+        query = query.filter(Employee.id > after[0])
+    return query.order_by(Employee.id).offset(skip).limit(limit).all()
 
 
-def update_employee(db: Session, employee_id: int, name: Optional[str] = None, email: Optional[str] = None) -> Optional[Employee]:
+def update_employee(
+    db: Session,
+    employee_id: int,
+    name: Optional[str] = None,
+    email: Optional[str] = None,
+    region: Optional[str] = None,
+    team_id: Optional[int] = None
+) -> Optional[Employee]:
     employee = get_employee_by_id(db, employee_id)
     if not employee:
         return None
@@ -61,9 +141,17 @@ def update_employee(db: Session, employee_id: int, name: Optional[str] = None, e
         employee.name = name
     if email:
         employee.email = email
+    if region:
+        employee.region = region
+    if team_id and team_id != employee.team_id:
+        # Approved days move to the new team's counters
+        shift_team_absences(db, -1, LeaveDay.employee_id == employee_id)
+        employee.team_id = team_id
+        db.flush()
+        shift_team_absences(db, 1, LeaveDay.employee_id == employee_id)
     
-    db.commit()
-    db.refresh(employee)
+    db.flush()
+    principal_cache.mark_changed(db, "employee", employee_id)
     return employee
 
 
@@ -72,18 +160,26 @@ def delete_employee(db: Session, employee_id: int) -> bool:
     if not employee:
         return False
     
+    # leave_days go with the employee through ON DELETE CASCADE; their team counts are taken back here
+    shift_team_absences(db, -1, LeaveDay.employee_id == employee_id)
+    # So do their leaves, balances and the approvals of those leaves
+    approvers = db.scalars(
+        select(Approval.approved_by).distinct().join(Leave, Leave.id == Approval.leave_id).where(Leave.employee_id == employee_id)
+    ).all()
     db.delete(employee)
-    db.commit()
+    db.flush()
+    principal_cache.mark_changed(db, "employee", employee_id)
+    response_cache.mark_changed(db, response_cache.LEAVES, employee_id)
+    response_cache.mark_changed(db, response_cache.BALANCES, employee_id)
+    response_cache.mark_changed(db, response_cache.APPROVALS, *approvers)
     return True
 
 
 # ============== Manager CRUD ==============
-def create_manager(db: Session, name: str, email: str, password: str) -> Manager:
-    hashed_password = get_password_hash(password)
-    manager = Manager(name=name, email=email, password_hash=hashed_password)
+def create_manager(db: Session, name: str, email: str, password_hash: str) -> Manager:
+    manager = Manager(name=name, email=email, password_hash=password_hash)
     db.add(manager)
-    db.commit()
-    db.refresh(manager)
+    db.flush()
     return manager
 
 
@@ -92,11 +188,14 @@ def get_manager_by_email(db: Session, email: str) -> Optional[Manager]:
 
 
 def get_manager_by_id(db: Session, manager_id: int) -> Optional[Manager]:
-    return db.query(Manager).filter(Manager.id == manager_id).first()
+    return db.get(Manager, manager_id)
 
 
-def get_all_managers(db: Session, skip: int = 0, limit: int = 100) -> List[Manager]:
-    return db.query(Manager).offset(skip).limit(limit).all()
+def get_all_managers(db: Session, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Manager]:
+    query = db.query(Manager)
+    if after:
+        query = query.filter(Manager.id > after[0])
+    return query.order_by(Manager.id).offset(skip).limit(limit).all()
 
 
 def delete_manager(db: Session, manager_id: int) -> bool:
@@ -104,35 +203,98 @@ def delete_manager(db: Session, manager_id: int) -> bool:
     if not manager:
         return False
     
+    # Leaves the manager had claimed go back to the queue (ON DELETE SET NULL)
+    claimants = db.scalars(select(Leave.employee_id).distinct().where(Leave.claimed_by == manager_id)).all()
     db.delete(manager)
-    db.commit()
+    db.flush()
+    principal_cache.mark_changed(db, "manager", manager_id)
+    response_cache.mark_changed(db, response_cache.APPROVALS, manager_id)
+    response_cache.mark_changed(db, response_cache.LEAVES, *claimants)
+    return True
+
+
+# ============== Holiday CRUD ==============
+def create_holiday(db: Session, region: str, date: date, name: str) -> Holiday:
+    holiday = Holiday(region=region, date=date, name=name)
+    db.add(holiday)
+    db.flush()
+    workdays.mark_changed(db, region)
+    return holiday
+
+
+def get_holiday_by_id(db: Session, holiday_id: int) -> Optional[Holiday]:
+    return db.get(Holiday, holiday_id)
+
+
+def get_holiday_by_date(db: Session, region: str, date: date) -> Optional[Holiday]:
+    return db.query(Holiday).filter(Holiday.region == region, Holiday.date == date).first()
+
+
+def get_holidays_by_region(db: Session, region: str) -> List[Holiday]:
+    return db.query(Holiday).filter(Holiday.region == region).order_by(Holiday.date).all()
+
+
+def delete_holiday(db: Session, holiday_id: int) -> bool:
+    holiday = get_holiday_by_id(db, holiday_id)
+    if not holiday:
+        return False
+    
+    db.delete(holiday)
+    db.flush()
+    workdays.mark_changed(db, holiday.region)
     return True
 
 
 # ============== Leave Type CRUD ==============
-def create_leave_type(db: Session, name: str) -> LeaveType:
-    leave_type = LeaveType(name=name)
+def create_leave_type(db: Session, name: str, carry_forward_cap: Optional[int] = None) -> LeaveType:
+    leave_type = LeaveType(name=name, carry_forward_cap=carry_forward_cap)
     db.add(leave_type)
-    db.commit()
-    db.refresh(leave_type)
+    db.flush()
+    leave_type_cache.mark_changed(db)
     return leave_type
 
 
-def get_leave_type_by_id(db: Session, type_id: int) -> Optional[LeaveType]:
-    return db.query(LeaveType).filter(LeaveType.id == type_id).first()
+def update_leave_type(
+    db: Session,
+    type_id: int,
+    name: Optional[str] = None,
+    carry_forward_cap: Optional[int] = None
+) -> Optional[LeaveType]:
+    leave_type = db.get(LeaveType, type_id)
+    if not leave_type:
+        return None
+    
+    if name:
+        leave_type.name = name
+    if carry_forward_cap is not None:
+        leave_type.carry_forward_cap = carry_forward_cap
+    
+    db.flush()
+    leave_type_cache.mark_changed(db)
+    return leave_type
+
+
+def get_leave_type_by_id(db: Session, type_id: int) -> Optional[leave_type_cache.CachedLeaveType]:
+    """Read-only copy from the leave-type cache; load the LeaveType itself to modify it"""
+    return leave_type_cache.leave_type_cache.get(db, type_id)
 
 
-def get_all_leave_types(db: Session) -> List[LeaveType]:
-    return db.query(LeaveType).all()
+def get_all_leave_types(db: Session) -> List[leave_type_cache.CachedLeaveType]:
+    types, _ = leave_type_cache.leave_type_cache.snapshot(db)
+    return list(types)
 
 
 def delete_leave_type(db: Session, type_id: int) -> bool:
-    leave_type = get_leave_type_by_id(db, type_id)
+    leave_type = db.get(LeaveType, type_id)
     if not leave_type:
         return False
     
     db.delete(leave_type)
-    db.commit()
+    db.flush()
+    leave_type_cache.mark_changed(db)
+    # Its leaves, balances and approvals go with it through ON DELETE CASCADE
+    for kind in (response_cache.LEAVES, response_cache.BALANCES, response_cache.APPROVALS):
+        response_cache.mark_all_changed(db, kind)
     return True
 
 
@@ -143,7 +305,8 @@ def create_leave(
     type_id: int, 
     start_time: datetime, 
     end_time: datetime, 
-    reason: Optional[str] = None
+    reason: Optional[str] = None,
+    days: Optional[int] = None
 ) -> Leave:
     leave = Leave(
         employee_id=employee_id,
@@ -151,28 +314,107 @@ def create_leave(
         start_time=start_time,
         end_time=end_time,
         reason=reason,
-        status="pending"
+        status="pending",
+        days=days
     )
     db.add(leave)
-    db.commit()
-    db.refresh(leave)
+    db.flush()
+    response_cache.mark_changed(db, response_cache.LEAVES, employee_id)
     return leave
 
 
+def get_leave_context(
+    db: Session,
+    employee_id: int,
+    type_id: int,
+    start_time: datetime,
+    end_time: datetime
+):
+    """Everything create_leave validates, in one round trip.
+
+    Returns None if the employee does not exist, otherwise a row of
+    (employee, leave_type, leave_balance, conflict_id) where the last three
+    may be None.
+    """
+    conflict_id = leave_overlap_filter(
+        select(Leave.id), db.get_bind().dialect.name, employee_id, start_time, end_time
+    ).limit(1).scalar_subquery()
+    return db.query(Employee, LeaveType, LeaveBalance, conflict_id.label("conflict_id")).select_from(
+        Employee
+    ).outerjoin(
+        LeaveType, LeaveType.id == type_id
+    ).outerjoin(
+        LeaveBalance, (LeaveBalance.employee_id == Employee.id) & (LeaveBalance.type_id == type_id)
+    ).filter(Employee.id == employee_id).first()
+
+
 def get_leave_by_id(db: Session, leave_id: int) -> Optional[Leave]:
-    return db.query(Leave).filter(Leave.id == leave_id).first()
+    return db.get(Leave, leave_id)
+
+
+def get_leave_for_update(db: Session, leave_id: int) -> Optional[Leave]:
+    # Serializes concurrent decisions on the same leave
+    return db.get(Leave, leave_id, with_for_update=True)
+
+
+def get_leaves_by_employee(db: Session, employee_id: int, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Leave]:
+    query = db.query(Leave).filter(Leave.employee_id == employee_id)
+    if after:
+        query = query.filter(Leave.id > after[0])
+    return query.order_by(Leave.id).offset(skip).limit(limit).all()
+
+
+def get_all_leaves(db: Session, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Leave]:
+    query = db.query(Leave)
+    if after:
+        query = query.filter(Leave.id > after[0])
+    return query.order_by(Leave.id).offset(skip).limit(limit).all()
+
+
+def get_pending_leaves(db: Session, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Leave]:
+    query = db.query(Leave).filter(Leave.status == "pending")
+    if after:
+        query = query.filter(Leave.id > after[0])
+    return query.order_by(Leave.id).offset(skip).limit(limit).all()
 
 
-def get_leaves_by_employee(db: Session, employee_id: int, skip: int = 0, limit: int = 100) -> List[Leave]:
-    return db.query(Leave).filter(Leave.employee_id == employee_id).offset(skip).limit(limit).all()
+# Leaves in these states hold their dates and may not overlap
+ACTIVE_LEAVE_STATUSES = ("pending", "approved")
 
 
-def get_all_leaves(db: Session, skip: int = 0, limit: int = 100) -> List[Leave]:
-    return db.query(Leave).offset(skip).limit(limit).all()
+def leave_overlap_filter(query, dialect_name: str, employee_id: int, start_time: datetime, end_time: datetime):
+    """Restrict a Leave query to the employee's active leaves overlapping [start_time, end_time]"""
+    query = query.filter(Leave.employee_id == employee_id, Leave.status.in_(ACTIVE_LEAVE_STATUSES))
+    if dialect_name == "postgresql":
+        # Same expression as the excl_leaves_overlap constraint, so its GiST index is used
+        period = func.tsrange(Leave.start_time, Leave.end_time, literal_column("'[]'"))
+        wanted = func.tsrange(start_time, end_time, literal_column("'[]'"))
+        return query.filter(period.op("&&")(wanted))
+    
+    # Active leaves never overlap each other, so only the latest one starting
+    # before start_time can reach into the window; everything else that
+    # overlaps starts inside it. Both are range scans on idx_leaves_active_period.
+    latest_before = select(func.max(Leave.start_time)).where(
+        Leave.employee_id == employee_id,
+        Leave.status.in_(ACTIVE_LEAVE_STATUSES),
+        Leave.start_time <= start_time
+    ).scalar_subquery()
+    return query.filter(
+        Leave.start_time >= func.coalesce(latest_before, start_time),
+        Leave.start_time <= end_time,
+        Leave.end_time >= start_time
+    )
 
 
-def get_pending_leaves(db: Session, skip: int = 0, limit: int = 100) -> List[Leave]:
-    return db.query(Leave).filter(Leave.status == "pending").offset(skip).limit(limit).all()
+def find_overlapping_leaves(
+    db: Session,
+    employee_id: int,
+    start_time: datetime,
+    end_time: datetime,
+    limit: int = 100
+) -> List[Leave]:
+    query = leave_overlap_filter(db.query(Leave), db.get_bind().dialect.name, employee_id, start_time, end_time)
+    return query.order_by(Leave.start_time).limit(limit).all()
 
 
 def update_leave_status(db: Session, leave_id: int, status: str) -> Optional[Leave]:
@@ -180,22 +422,189 @@ def update_leave_status(db: Session, leave_id: int, status: str) -> Optional[Lea
     if not leave:
         return None
     
+    previous = leave.status
     leave.status = status
-    db.commit()
-    db.refresh(leave)
+    if status != "pending":
+        # A decided leave leaves the work queue
+        leave.claimed_by = None
+        leave.claim_expires_at = None
+    db.flush()
+    response_cache.mark_changed(db, response_cache.LEAVES, leave.employee_id)
+    
+    # Keep the occupancy calendar in step with approvals
+    if status == "approved" and previous != "approved":
+        add_leave_days(db, leave)
+    elif previous == "approved" and status != "approved":
+        remove_leave_days(db, leave_id)
     return leave
 
 
+def claim_pending_leaves(db: Session, manager_id: int, n: int, lease_seconds: int) -> List[Leave]:
+    """Lease up to n unclaimed (or expired) pending leaves to a manager, oldest first"""
+    now = datetime.now()
+    # SKIP LOCKED: concurrent claimers take the next free rows instead of queueing on each other's
+    candidates = (
+        select(Leave.id)
+        .where(
+            Leave.status == "pending",
+            or_(Leave.claimed_by.is_(None), Leave.claim_expires_at < now)
+        )
+        .order_by(Leave.id)
+        .limit(n)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = db.scalars(
+        update(Leave)
+        .where(Leave.id.in_(candidates))
+        .values(claimed_by=manager_id, claim_expires_at=now + timedelta(seconds=lease_seconds))
+        .returning(Leave)
+    ).all()
+    response_cache.mark_changed(db, response_cache.LEAVES, *{leave.employee_id for leave in claimed})
+    return sorted(claimed, key=lambda leave: leave.id)
+
+
+def get_claimed_leaves(db: Session, manager_id: int) -> List[Leave]:
+    return db.query(Leave).filter(
+        Leave.claimed_by == manager_id,
+        Leave.status == "pending",
+        Leave.claim_expires_at >= datetime.now()
+    ).order_by(Leave.id).all()
+
+
+def release_claims(db: Session, manager_id: int, leave_ids: Optional[List[int]] = None) -> int:
+    """Hand a manager's claimed leaves (all, or just leave_ids) back to the queue"""
+    query = update(Leave).where(Leave.claimed_by == manager_id, Leave.status == "pending")
+    if leave_ids is not None:
+        query = query.where(Leave.id.in_(leave_ids))
+    released = db.scalars(query.values(claimed_by=None, claim_expires_at=None).returning(Leave.employee_id)).all()
+    response_cache.mark_changed(db, response_cache.LEAVES, *set(released))
+    return len(released)
+
+
 def delete_leave(db: Session, leave_id: int) -> bool:
     leave = get_leave_by_id(db, leave_id)
     if not leave:
         return False
     
+    remove_leave_days(db, leave_id)
+    approvers = {approval.approved_by for approval in leave.approvals}
     db.delete(leave)
-    db.commit()
+    db.flush()
+    response_cache.mark_changed(db, response_cache.LEAVES, leave.employee_id)
+    response_cache.mark_changed(db, response_cache.APPROVALS, *approvers)
     return True
 
 
+# ============== Leave Day (occupancy) CRUD ==============
+def leave_dates(leave: Leave) -> List[date]:
+    first, last = leave.start_time.date(), leave.end_time.date()
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def leave_day_rows(leave: Leave) -> List[dict]:
+    return [
+        {"day": day, "employee_id": leave.employee_id, "leave_id": leave.id, "type_id": leave.type_id}
+        for day in leave_dates(leave)
+    ]
+
+
+def add_leave_days(db: Session, leave: Leave) -> int:
+    rows = leave_day_rows(leave)
+    db.execute(insert(LeaveDay), rows)
+    shift_team_absences(db, 1, LeaveDay.leave_id == leave.id)
+    return len(rows)
+
+
+def remove_leave_days(db: Session, leave_id: int) -> int:
+    shift_team_absences(db, -1, LeaveDay.leave_id == leave_id)
+    return db.execute(delete(LeaveDay).where(LeaveDay.leave_id == leave_id)).rowcount
+
+
+def shift_team_absences(db: Session, sign: int, *filters):
+    """Add (sign 1) or take away (sign -1) the leave_days rows matching filters in team_day_absences"""
+    counts = (
+        select(Employee.team_id, LeaveDay.day, func.count() * sign)
+        .join(Employee, Employee.id == LeaveDay.employee_id)
+        .where(Employee.team_id.is_not(None), *filters)
+        .group_by(Employee.team_id, LeaveDay.day)
+    )
+    upsert = (postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert)(TeamDayAbsence)
+    upsert = upsert.from_select(["team_id", "day", "absent"], counts)
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=["team_id", "day"],
+        set_={"absent": TeamDayAbsence.absent + upsert.excluded.absent}
+    ))
+
+
+# ============== Team Coverage ==============
+def get_team_absences(db: Session, team_ids, start: date, end: date) -> dict:
+    """{(team_id, day): members out on approved leave} for the window; days nobody is out are left out"""
+    rows = db.execute(
+        select(TeamDayAbsence.team_id, TeamDayAbsence.day, TeamDayAbsence.absent)
+        .where(
+            TeamDayAbsence.team_id.in_(set(team_ids)),
+            TeamDayAbsence.day >= start,
+            TeamDayAbsence.day <= end,
+            TeamDayAbsence.absent > 0
+        )
+    ).all()
+    return {(team_id, day): absent for team_id, day, absent in rows}
+
+
+def coverage_conflicts(db: Session, leaves: List[Leave]) -> dict:
+    """Why approving each leave would take its team below min_present, keyed by leave id; leaves that fit are absent"""
+    members = select(func.count()).where(Employee.team_id == Team.id).correlate(Team).scalar_subquery()
+    # Locks the teams with a policy until commit, so concurrent approvals cannot both take the last free slot
+    policies = {
+        employee_id: (team_id, name, count, min_present)
+        for employee_id, team_id, name, count, min_present in db.execute(
+            select(Employee.id, Team.id, Team.name, members, Team.min_present)
+            .join(Team, Team.id == Employee.team_id)
+            .where(Employee.id.in_({leave.employee_id for leave in leaves}), Team.min_present.is_not(None))
+            .order_by(Team.id)
+            .with_for_update(of=Team)
+        )
+    }
+    covered = [leave for leave in leaves if leave.employee_id in policies]
+    if not covered:
+        return {}
+
+    # One range query over the counters for every team and day involved
+    absent = get_team_absences(
+        db,
+        (policies[leave.employee_id][0] for leave in covered),
+        min(leave.start_time for leave in covered).date(),
+        max(leave.end_time for leave in covered).date()
+    )
+    conflicts = {}
+    for leave in covered:
+        team_id, name, count, min_present = policies[leave.employee_id]
+        days = leave_dates(leave)
+        short = next((day for day in days if count - absent.get((team_id, day), 0) - 1 < min_present), None)
+        if short is not None:
+            present = count - absent.get((team_id, short), 0) - 1
+            conflicts[leave.id] = (
+                f"Team {name} would have {present} of {count} members present on {short.isoformat()}, "
+                f"below its minimum of {min_present}"
+            )
+            continue
+        # Later leaves in the same call see this one as approved
+        for day in days:
+            absent[(team_id, day)] = absent.get((team_id, day), 0) + 1
+    return conflicts
+
+
+def leave_days_window(query, start: date, end: date, employee_ids: Optional[List[int]] = None):
+    query = query.filter(LeaveDay.day >= start, LeaveDay.day <= end)
+    if employee_ids:
+        query = query.filter(LeaveDay.employee_id.in_(employee_ids))
+    return query.order_by(LeaveDay.day, LeaveDay.employee_id)
+
+
+def get_leave_days(db: Session, start: date, end: date, employee_ids: Optional[List[int]] = None) -> List[LeaveDay]:
+    return leave_days_window(db.query(LeaveDay), start, end, employee_ids).all()
+
+
 # ============== Approval CRUD ==============
 def create_approval(db: Session, leave_id: int, manager_id: int, decision: str) -> Approval:
     approval = Approval(
@@ -205,20 +614,209 @@ def create_approval(db: Session, leave_id: int, manager_id: int, decision: str)
     )
     db.add(approval)
     
-    # Update leave status
+    # Update leave status - flushed together with the approval INSERT
     update_leave_status(db, leave_id, decision)
-    
-    db.commit()
-    db.refresh(approval)
+    response_cache.mark_changed(db, response_cache.APPROVALS, manager_id)
     return approval
 
 
+def decide_leaves(
+    db: Session,
+    manager_id: int,
+    decisions: List[Tuple[int, str]],
+    source: Optional[str] = None
+) -> List[dict]:
+    """Approve or reject many leaves with set-based statements; one result per (leave_id, decision), in order"""
+    now = datetime.now()
+    # One locking read for the whole batch, in id order so overlapping batches cannot deadlock
+    leaves = {
+        leave.id: leave
+        for leave in db.scalars(
+            select(Leave).where(Leave.id.in_({leave_id for leave_id, _ in decisions})).order_by(Leave.id).with_for_update()
+        )
+    }
+
+    results = []
+    accepted = []
+    seen = set()
+    for leave_id, decision in decisions:
+        result = {"leave_id": leave_id, "decision": decision, "status_code": 201, "approval_id": None, "detail": None}
+        results.append(result)
+        leave = leaves.get(leave_id)
+        if leave_id in seen:
+            result.update(status_code=400, detail="Leave request appears more than once in the batch")
+        elif leave is None:
+            result.update(status_code=404, detail="Leave request not found")
+        elif leave.status != "pending":
+            result.update(status_code=400, detail="Leave request has already been processed")
+        elif leave.claimed_by not in (None, manager_id) and leave.claim_expires_at > now:
+            result.update(status_code=409, detail="Leave request is claimed by another manager")
+        else:
+            accepted.append((result, leave))
+        seen.add(leave_id)
+
+    conflicts = coverage_conflicts(db, [leave for result, leave in accepted if result["decision"] == "approved"])
+    for result, leave in accepted:
+        if leave.id in conflicts:
+            result.update(status_code=409, detail=conflicts[leave.id])
+    accepted = [(result, leave) for result, leave in accepted if leave.id not in conflicts]
+
+    # Days booked per approval; leaves filed before reservations were recorded are counted now
+    uncounted = [leave for result, leave in accepted if result["decision"] == "approved" and leave.days is None]
+    counted = dict(zip((leave.id for leave in uncounted), workdays.leave_days_batch(db, uncounted)))
+
+    keys = {(leave.employee_id, leave.type_id) for _, leave in accepted}
+    available = {}
+    if keys:
+        available = {
+            (employee_id, type_id): allocated - used
+            for employee_id, type_id, allocated, used in db.execute(
+                select(LeaveBalance.employee_id, LeaveBalance.type_id, LeaveBalance.total_allocated, LeaveBalance.total_used)
+                .where(tuple_(LeaveBalance.employee_id, LeaveBalance.type_id).in_(list(keys)))
+                .order_by(LeaveBalance.id)
+                .with_for_update()
+            )
+        }
+    # Approvals are admitted in leave id order while they fit; the ones that do not stay pending
+    unfit = set()
+    for result, leave in sorted(accepted, key=lambda item: item[1].id):
+        if result["decision"] != "approved":
+            continue
+        key = (leave.employee_id, leave.type_id)
+        days = counted.get(leave.id, leave.days)
+        if key in available and days <= available[key]:
+            available[key] -= days
+        else:
+            unfit.add(leave.id)
+
+    # (employee_id, type_id) -> [days used, reserved days released, of which by rejections, has approvals]
+    groups = {}
+    for result, leave in accepted:
+        if leave.id in unfit:
+            continue
+        group = groups.setdefault((leave.employee_id, leave.type_id), [0, 0, 0, False])
+        reserved = leave.days or 0
+        group[1] += reserved
+        if result["decision"] == "approved":
+            group[0] += counted.get(leave.id, leave.days)
+            group[3] = True
+        else:
+            group[2] += reserved
+
+    booked = set()
+    if groups:
+        # One grouped UPDATE; the check still guards against a balance read without a row lock (SQLite)
+        booked = _apply_decided_days(db, {key: (used, released) for key, (used, released, _, _) in groups.items()}, check=True)
+    short = {key for key, group in groups.items() if group[3] and key not in booked}
+    # Rejections in a group that could not be booked still release their reservation
+    refunds = {key: (0, groups[key][2]) for key in short if groups[key][2]}
+    if refunds:
+        _apply_decided_days(db, refunds, check=False)
+    response_cache.mark_changed(db, response_cache.BALANCES, *{employee_id for employee_id, _ in booked | set(refunds)})
+
+    decided = []
+    for result, leave in accepted:
+        if result["decision"] == "approved" and (leave.id in unfit or (leave.employee_id, leave.type_id) in short):
+            result.update(status_code=400, detail="Insufficient leave balance to approve this request")
+        else:
+            decided.append((result, leave))
+    if not decided:
+        return results
+
+    approvals = db.execute(
+        insert(Approval).returning(Approval.id, sort_by_parameter_order=True),
+        [{"leave_id": leave.id, "approved_by": manager_id, "decision": result["decision"]} for result, leave in decided]
+    ).scalars().all()
+    for (result, _), approval_id in zip(decided, approvals):
+        result["approval_id"] = approval_id
+
+    approved = [leave for result, leave in decided if result["decision"] == "approved"]
+    for decision in ("approved", "rejected"):
+        leave_ids = [leave.id for result, leave in decided if result["decision"] == decision]
+        if leave_ids:
+            db.execute(
+                update(Leave)
+                .where(Leave.id.in_(leave_ids))
+                .values(status=decision, claimed_by=None, claim_expires_at=None)
+            )
+    response_cache.mark_changed(db, response_cache.LEAVES, *{leave.employee_id for _, leave in decided})
+    response_cache.mark_changed(db, response_cache.APPROVALS, manager_id)
+    if approved:
+        db.execute(insert(LeaveDay), [row for leave in approved for row in leave_day_rows(leave)])
+        shift_team_absences(db, 1, LeaveDay.leave_id.in_([leave.id for leave in approved]))
+        db.execute(insert(LeaveLedgerEntry), [
+            {"employee_id": leave.employee_id, "type_id": leave.type_id, "entry_type": "consumption",
+             "days": -counted.get(leave.id, leave.days), "effective_date": now.date(), "leave_id": leave.id}
+            for leave in approved
+        ])
+
+    for result, _ in decided:
+        create_audit_log(
+            db,
+            actor_type="manager",
+            actor_id=manager_id,
+            action=f"{result['decision'].capitalize()} leave request" + (f" ({source})" if source else ""),
+            target_table="approvals",
+            target_id=result["approval_id"]
+        )
+    return results
+
+
+def _apply_decided_days(db: Session, days: dict, check: bool) -> set:
+    """Book and release {(employee_id, type_id): (used, released)} in one UPDATE; returns the keys updated"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Four array parameters however many balances; a large literal derived table is slow to compile
+        (employee_ids, type_ids), (used, released) = zip(*days), zip(*days.values())
+        rows = db.execute(text(f"""
+            UPDATE leave_balance SET
+                total_used = leave_balance.total_used + d.used,
+                remaining = leave_balance.total_allocated - (leave_balance.total_used + d.used),
+                reserved = leave_balance.reserved - d.released
+            FROM unnest(CAST(:employee_ids AS int[]), CAST(:type_ids AS int[]), CAST(:used AS int[]), CAST(:released AS int[]))
+                AS d(employee_id, type_id, used, released)
+            WHERE leave_balance.employee_id = d.employee_id AND leave_balance.type_id = d.type_id
+            {"AND leave_balance.total_allocated - leave_balance.total_used >= d.used" if check else ""}
+            RETURNING leave_balance.employee_id, leave_balance.type_id
+        """), {
+            "employee_ids": list(employee_ids), "type_ids": list(type_ids), "used": list(used), "released": list(released)
+        }).all()
+        return {tuple(row) for row in rows}
+
+    decided = union_all(*[
+        select(
+            literal(employee_id, Integer).label("employee_id"),
+            literal(type_id, Integer).label("type_id"),
+            literal(used, Integer).label("used"),
+            literal(released, Integer).label("released")
+        )
+        for (employee_id, type_id), (used, released) in days.items()
+    ]).subquery("decided")
+    query = update(LeaveBalance).where(
+        LeaveBalance.employee_id == decided.c.employee_id,
+        LeaveBalance.type_id == decided.c.type_id
+    )
+    if check:
+        query = query.where(LeaveBalance.total_allocated - LeaveBalance.total_used >= decided.c.used)
+    rows = db.execute(
+        query.values(
+            total_used=LeaveBalance.total_used + decided.c.used,
+            remaining=LeaveBalance.total_allocated - (LeaveBalance.total_used + decided.c.used),
+            reserved=LeaveBalance.reserved - decided.c.released
+        ).returning(LeaveBalance.employee_id, LeaveBalance.type_id),
+        execution_options={"synchronize_session": False}
+    ).all()
+    return {tuple(row) for row in rows}
+
+
 def get_approval_by_leave_id(db: Session, leave_id: int) -> Optional[Approval]:
     return db.query(Approval).filter(Approval.leave_id == leave_id).first()
 
 
-def get_approvals_by_manager(db: Session, manager_id: int, skip: int = 0, limit: int = 100) -> List[Approval]:
-    return db.query(Approval).filter(Approval.approved_by == manager_id).offset(skip).limit(limit).all()
+def get_approvals_by_manager(db: Session, manager_id: int, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Approval]:
+    query = db.query(Approval).filter(Approval.approved_by == manager_id)
+    if after:
+        query = query.filter(Approval.id > after[0])
+    return query.order_by(Approval.id).offset(skip).limit(limit).all()
 
 
 # ============== Leave Balance CRUD ==============
@@ -236,13 +834,15 @@ def create_leave_balance(
         remaining=total_allocated
     )
     db.add(leave_balance)
-    db.commit()
-    db.refresh(leave_balance)
+    db.flush()
+    if total_allocated:
+        post_ledger_entry(db, employee_id, type_id, "allocation", total_allocated)
+    response_cache.mark_changed(db, response_cache.BALANCES, employee_id)
     return leave_balance
 
 
 def get_leave_balance_by_id(db: Session, balance_id: int) -> Optional[LeaveBalance]:
-    return db.query(LeaveBalance).filter(LeaveBalance.id == balance_id).first()
+    return db.get(LeaveBalance, balance_id)
 
 
 def get_leave_balances_by_employee(db: Session, employee_id: int) -> List[LeaveBalance]:
@@ -253,22 +853,279 @@ def update_leave_balance(
     db: Session, 
     employee_id: int, 
     type_id: int, 
-    days_used: int
+    days_used: int,
+    release_reserved: int = 0,
+    leave_id: Optional[int] = None
 ) -> Optional[LeaveBalance]:
-    leave_balance = db.query(LeaveBalance).filter(
-        LeaveBalance.employee_id == employee_id,
-        LeaveBalance.type_id == type_id
+    """Book used days (and release their reservation); None if missing or it would go negative"""
+    # One set-based statement: no lost updates between concurrent approvals,
+    # and the remaining >= 0 check happens under the row lock
+    leave_balance = db.scalars(
+        update(LeaveBalance)
+        .where(
+            LeaveBalance.employee_id == employee_id,
+            LeaveBalance.type_id == type_id,
+            LeaveBalance.total_allocated - LeaveBalance.total_used >= days_used
+        )
+        .values(
+            total_used=LeaveBalance.total_used + days_used,
+            remaining=LeaveBalance.total_allocated - (LeaveBalance.total_used + days_used),
+            reserved=LeaveBalance.reserved - release_reserved
+        )
+        .returning(LeaveBalance)
+    ).first()
+    if leave_balance:
+        post_ledger_entry(db, employee_id, type_id, "consumption", -days_used, leave_id=leave_id)
+        response_cache.mark_changed(db, response_cache.BALANCES, employee_id)
+    return leave_balance
+
+
+def reserve_leave_days(db: Session, employee_id: int, type_id: int, days: int) -> Optional[LeaveBalance]:
+    """Hold days for a pending leave; None if the available balance is too small"""
+    # Check and increment in one statement, so concurrent requests cannot both pass
+    leave_balance = db.scalars(
+        update(LeaveBalance)
+        .where(
+            LeaveBalance.employee_id == employee_id,
+            LeaveBalance.type_id == type_id,
+            LeaveBalance.remaining - LeaveBalance.reserved >= days
+        )
+        .values(reserved=LeaveBalance.reserved + days)
+        .returning(LeaveBalance)
+    ).first()
+    if leave_balance:
+        response_cache.mark_changed(db, response_cache.BALANCES, employee_id)
+    return leave_balance
+
+
+def release_leave_days(db: Session, employee_id: int, type_id: int, days: int) -> Optional[LeaveBalance]:
+    """Give back days held by a pending leave that was rejected, approved or deleted; None if not held"""
+    leave_balance = db.scalars(
+        update(LeaveBalance)
+        .where(
+            LeaveBalance.employee_id == employee_id,
+            LeaveBalance.type_id == type_id,
+            # A second release of the same days must not drive the counter negative
+            LeaveBalance.reserved >= days
+        )
+        .values(reserved=LeaveBalance.reserved - days)
+        .returning(LeaveBalance)
     ).first()
+    if leave_balance:
+        response_cache.mark_changed(db, response_cache.BALANCES, employee_id)
+    return leave_balance
+
+
+# ============== Leave Ledger CRUD ==============
+LEDGER_ENTRY_TYPES = ("allocation", "accrual", "consumption", "reversal", "carry_forward", "expiry", "adjustment")
+# Entry types that count towards days used rather than days credited
+USAGE_ENTRY_TYPES = ("consumption", "reversal")
+
+
+def post_ledger_entry(
+    db: Session,
+    employee_id: int,
+    type_id: int,
+    entry_type: str,
+    days: int,
+    effective_date: Optional[date] = None,
+    leave_id: Optional[int] = None,
+    note: Optional[str] = None
+) -> LeaveLedgerEntry:
+    effective_date = effective_date or date.today()
+    if effective_date < date.today():
+        # Backdated: snapshots covering that date are stale until the next compaction
+        db.execute(delete(LeaveBalanceSnapshot).where(
+            LeaveBalanceSnapshot.employee_id == employee_id,
+            LeaveBalanceSnapshot.type_id == type_id,
+            LeaveBalanceSnapshot.as_of >= effective_date
+        ))
+    entry = LeaveLedgerEntry(
+        employee_id=employee_id,
+        type_id=type_id,
+        entry_type=entry_type,
+        days=days,
+        effective_date=effective_date,
+        leave_id=leave_id,
+        note=note
+    )
+    # Insert-only, flushed with the caller's commit. Callers that change a balance still hold its
+    # row lock here, so this does not remove contention on the balance (see ledger.py)
+    db.add(entry)
+    return entry
+
+
+def get_ledger_entries(
+    db: Session,
+    employee_id: int,
+    type_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None
+) -> List[LeaveLedgerEntry]:
+    query = db.query(LeaveLedgerEntry).filter(LeaveLedgerEntry.employee_id == employee_id)
+    if type_id is not None:
+        query = query.filter(LeaveLedgerEntry.type_id == type_id)
+    if after:
+        query = query.filter(LeaveLedgerEntry.id > after[0])
+    return query.order_by(LeaveLedgerEntry.id).offset(skip).limit(limit).all()
+
+
+def ledger_sums(*filters):
+    """(employee_id, type_id, credited, used) per balance over the ledger rows matching filters"""
+    usage = LeaveLedgerEntry.entry_type.in_(USAGE_ENTRY_TYPES)
+    return select(
+        LeaveLedgerEntry.employee_id,
+        LeaveLedgerEntry.type_id,
+        func.coalesce(func.sum(case((usage, 0), else_=LeaveLedgerEntry.days)), 0).label("credited"),
+        func.coalesce(func.sum(case((usage, -LeaveLedgerEntry.days), else_=0)), 0).label("used")
+    ).where(*filters).group_by(LeaveLedgerEntry.employee_id, LeaveLedgerEntry.type_id)
+
+
+def balance_totals(db: Session, as_of: date, employee_id: Optional[int] = None) -> dict:
+    """(employee_id, type_id) -> [credited, used] at the end of as_of: newest snapshot plus the ledger tail"""
+    snapshot_filters = [LeaveBalanceSnapshot.as_of <= as_of]
+    ledger_filters = [LeaveLedgerEntry.effective_date <= as_of]
+    if employee_id is not None:
+        snapshot_filters.append(LeaveBalanceSnapshot.employee_id == employee_id)
+        ledger_filters.append(LeaveLedgerEntry.employee_id == employee_id)
+    newest = select(
+        LeaveBalanceSnapshot.employee_id,
+        LeaveBalanceSnapshot.type_id,
+        func.max(LeaveBalanceSnapshot.as_of).label("as_of")
+    ).where(*snapshot_filters).group_by(
+        LeaveBalanceSnapshot.employee_id, LeaveBalanceSnapshot.type_id
+    ).subquery()
+    
+    snapshots = db.scalars(select(LeaveBalanceSnapshot).join(
+        newest,
+        (LeaveBalanceSnapshot.employee_id == newest.c.employee_id)
+        & (LeaveBalanceSnapshot.type_id == newest.c.type_id)
+        & (LeaveBalanceSnapshot.as_of == newest.c.as_of)
+    ))
+    totals = {(s.employee_id, s.type_id): [s.credited, s.used] for s in snapshots}
     
-    if not leave_balance:
+    # Only entries after each balance's snapshot; balances without one are summed from the start
+    tail = ledger_sums(
+        *ledger_filters,
+        newest.c.as_of.is_(None) | (LeaveLedgerEntry.effective_date > newest.c.as_of)
+    ).outerjoin(
+        newest,
+        (LeaveLedgerEntry.employee_id == newest.c.employee_id)
+        & (LeaveLedgerEntry.type_id == newest.c.type_id)
+    )
+    for employee, type_id, credited, used in db.execute(tail):
+        current = totals.setdefault((employee, type_id), [0, 0])
+        current[0] += credited
+        current[1] += used
+    return totals
+
+
+def get_balances_as_of(db: Session, employee_id: int, as_of: date) -> List[dict]:
+    """Credited, used and remaining days per leave type at the end of as_of"""
+    totals = balance_totals(db, as_of, employee_id)
+    return [
+        {"type_id": type_id, "as_of": as_of, "credited": credited, "used": used, "remaining": credited - used}
+        for (_, type_id), (credited, used) in sorted(totals.items())
+    ]
+
+
+# ============== Accrual Policy CRUD ==============
+def create_accrual_policy(db: Session, type_id: int, frequency: str, days_per_period: int, prorate: bool = True) -> AccrualPolicy:
+    policy = AccrualPolicy(type_id=type_id, frequency=frequency, days_per_period=days_per_period, prorate=prorate)
+    db.add(policy)
+    db.flush()
+    return policy
+
+
+def get_accrual_policy_by_id(db: Session, policy_id: int) -> Optional[AccrualPolicy]:
+    return db.get(AccrualPolicy, policy_id)
+
+
+def get_accrual_policy_by_type(db: Session, type_id: int) -> Optional[AccrualPolicy]:
+    return db.query(AccrualPolicy).filter(AccrualPolicy.type_id == type_id).first()
+
+
+def get_accrual_policies(db: Session) -> List[AccrualPolicy]:
+    return db.query(AccrualPolicy).order_by(AccrualPolicy.id).all()
+
+
+def delete_accrual_policy(db: Session, policy_id: int) -> bool:
+    policy = get_accrual_policy_by_id(db, policy_id)
+    if not policy:
+        return False
+    
+    db.delete(policy)
+    db.flush()
+    return True
+
+
+def get_accrual_runs(
+    db: Session,
+    policy_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None
+) -> List[AccrualRun]:
+    query = db.query(AccrualRun)
+    if policy_id is not None:
+        query = query.filter(AccrualRun.policy_id == policy_id)
+    if after:
+        query = query.filter(AccrualRun.id > after[0])
+    return query.order_by(AccrualRun.id).offset(skip).limit(limit).all()
+
+
+# ============== Auto-Approval Rule CRUD ==============
+def create_auto_approval_rule(
+    db: Session,
+    approver_id: int,
+    type_id: Optional[int] = None,
+    team_id: Optional[int] = None,
+    max_days: Optional[int] = None,
+    min_remaining: Optional[int] = None,
+    max_team_absent: Optional[int] = None,
+    enabled: bool = True
+) -> AutoApprovalRule:
+    rule = AutoApprovalRule(
+        approver_id=approver_id,
+        type_id=type_id,
+        team_id=team_id,
+        max_days=max_days,
+        min_remaining=min_remaining,
+        max_team_absent=max_team_absent,
+        enabled=enabled
+    )
+    db.add(rule)
+    db.flush()
+    return rule
+
+
+def get_auto_approval_rule_by_id(db: Session, rule_id: int) -> Optional[AutoApprovalRule]:
+    return db.get(AutoApprovalRule, rule_id)
+
+
+def get_auto_approval_rules(db: Session) -> List[AutoApprovalRule]:
+    return db.query(AutoApprovalRule).order_by(AutoApprovalRule.id).all()
+
+
+def set_auto_approval_rule_enabled(db: Session, rule_id: int, enabled: bool) -> Optional[AutoApprovalRule]:
+    rule = get_auto_approval_rule_by_id(db, rule_id)
+    if not rule:
         return None
     
-    leave_balance.total_used += days_used
-    leave_balance.remaining = leave_balance.total_allocated - leave_balance.total_used
+    rule.enabled = enabled
+    db.flush()
+    return rule
+
+
+def delete_auto_approval_rule(db: Session, rule_id: int) -> bool:
+    rule = get_auto_approval_rule_by_id(db, rule_id)
+    if not rule:
+        return False
     
-    db.commit()
-    db.refresh(leave_balance)
-    return leave_balance
+    db.delete(rule)
+    db.flush()
+    return True
 
 
 # ============== Audit Log CRUD ==============
@@ -279,26 +1136,100 @@ def create_audit_log(
     action: str,
     target_table: str,
     target_id: int
-) -> AuditLog:
-    audit_log = AuditLog(
+) -> Optional[AuditLog]:
+    entry = dict(
         actor_type=actor_type,
         actor_id=actor_id,
         action=action,
         target_table=target_table,
         target_id=target_id
     )
+    if audit.use_sink():
+        # Written in a batch by the audit sink once the caller commits
+        audit.stage(db, entry)
+        return None
+    
+    # Not flushed on its own - the INSERT goes out with the caller's commit
+    audit_log = AuditLog(**entry)
     db.add(audit_log)
-    db.commit()
-    db.refresh(audit_log)
     return audit_log
 
 
-def get_audit_logs(db: Session, skip: int = 0, limit: int = 100) -> List[AuditLog]:
-    return db.query(AuditLog).order_by(AuditLog.timestamp.desc()).offset(skip).limit(limit).all()
+def audit_log_window(query, after: Optional[tuple], start: Optional[datetime], end: Optional[datetime]):
+    # Plain timestamp bounds let PostgreSQL prune audit_logs partitions;
+    # the row comparison alone would scan every partition's index
+    if after:
+        query = query.filter(
+            AuditLog.timestamp <= after[0],
+            tuple_(AuditLog.timestamp, AuditLog.id) < tuple_(*after)
+        )
+    if start:
+        query = query.filter(AuditLog.timestamp >= start)
+    if end:
+        query = query.filter(AuditLog.timestamp < end)
+    return query
+
+
+def get_audit_logs(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> List[AuditLog]:
+    query = audit_log_window(db.query(AuditLog), after, start, end)
+    return query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).offset(skip).limit(limit).all()
 
 
-def get_audit_logs_by_actor(db: Session, actor_type: str, actor_id: int, skip: int = 0, limit: int = 100) -> List[AuditLog]:
-    return db.query(AuditLog).filter(
+def get_audit_logs_by_actor(
+    db: Session,
+    actor_type: str,
+    actor_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> List[AuditLog]:
+    query = db.query(AuditLog).filter(
         AuditLog.actor_type == actor_type,
         AuditLog.actor_id == actor_id
-    ).order_by(AuditLog.timestamp.desc()).offset(skip).limit(limit).all()
+    )
+    query = audit_log_window(query, after, start, end)
+    return query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).offset(skip).limit(limit).all()
+
+
+# ============== Refresh Token CRUD ==============
+def create_refresh_token(
+    db: Session,
+    token_hash: str,
+    user_type: str,
+    user_id: int,
+    email: str,
+    family_id: str,
+    expires_at: datetime
+) -> RefreshToken:
+    refresh_token = RefreshToken(
+        token_hash=token_hash,
+        user_type=user_type,
+        user_id=user_id,
+        email=email,
+        family_id=family_id,
+        expires_at=expires_at
+    )
+    db.add(refresh_token)
+    db.flush()
+    return refresh_token
+
+
+def get_refresh_token_for_update(db: Session, token_hash: str) -> Optional[RefreshToken]:
+    # Row lock so two concurrent refreshes of one token cannot both rotate it
+    return db.query(RefreshToken).filter(RefreshToken.token_hash == token_hash).with_for_update().first()
+
+
+def revoke_refresh_token_family(db: Session, family_id: str) -> int:
+    return db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.now()}, synchronize_session=False)
@@ -0,0 +1,147 @@
+"""
+Async read queries for the hot routers (DB_MODE=async).
+
+Writes are not duplicated here: the async handlers run the same sync write
+path through AsyncSession.run_sync, which drives the async driver from a
+greenlet instead of holding a threadpool thread.
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List
+from datetime import date, datetime
+from models import Leave, LeaveDay, Approval, LeaveBalance, LeaveLedgerEntry, AuditLog
+from crud import audit_log_window, leave_overlap_filter, leave_days_window
+
+
+# ============== Leave ==============
+async def get_leave_by_id(db: AsyncSession, leave_id: int) -> Optional[Leave]:
+    return await db.scalar(select(Leave).where(Leave.id == leave_id))
+
+
+async def get_leaves_by_employee(db: AsyncSession, employee_id: int, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Leave]:
+    query = select(Leave).where(Leave.employee_id == employee_id)
+    if after:
+        query = query.where(Leave.id > after[0])
+    result = await db.scalars(query.order_by(Leave.id).offset(skip).limit(limit))
+    return list(result)
+
+
+async def get_all_leaves(db: AsyncSession, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Leave]:
+    query = select(Leave)
+    if after:
+        query = query.where(Leave.id > after[0])
+    result = await db.scalars(query.order_by(Leave.id).offset(skip).limit(limit))
+    return list(result)
+
+
+async def get_pending_leaves(db: AsyncSession, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Leave]:
+    query = select(Leave).where(Leave.status == "pending")
+    if after:
+        query = query.where(Leave.id > after[0])
+    result = await db.scalars(query.order_by(Leave.id).offset(skip).limit(limit))
+    return list(result)
+
+
+async def get_claimed_leaves(db: AsyncSession, manager_id: int) -> List[Leave]:
+    result = await db.scalars(
+        select(Leave)
+        .where(Leave.claimed_by == manager_id, Leave.status == "pending", Leave.claim_expires_at >= datetime.now())
+        .order_by(Leave.id)
+    )
+    return list(result)
+
+
+async def find_overlapping_leaves(
+    db: AsyncSession,
+    employee_id: int,
+    start_time: datetime,
+    end_time: datetime,
+    limit: int = 100
+) -> List[Leave]:
+    query = leave_overlap_filter(select(Leave), db.bind.dialect.name, employee_id, start_time, end_time)
+    result = await db.scalars(query.order_by(Leave.start_time).limit(limit))
+    return list(result)
+
+
+# ============== Leave Day (occupancy) ==============
+async def get_leave_days(db: AsyncSession, start: date, end: date, employee_ids: Optional[List[int]] = None) -> List[LeaveDay]:
+    result = await db.scalars(leave_days_window(select(LeaveDay), start, end, employee_ids))
+    return list(result)
+
+
+# ============== Approval ==============
+async def get_approval_by_leave_id(db: AsyncSession, leave_id: int) -> Optional[Approval]:
+    return await db.scalar(select(Approval).where(Approval.leave_id == leave_id))
+
+
+async def get_approvals_by_manager(db: AsyncSession, manager_id: int, skip: int = 0, limit: int = 100, after: Optional[tuple] = None) -> List[Approval]:
+    query = select(Approval).where(Approval.approved_by == manager_id)
+    if after:
+        query = query.where(Approval.id > after[0])
+    result = await db.scalars(query.order_by(Approval.id).offset(skip).limit(limit))
+    return list(result)
+
+
+# ============== Leave Balance ==============
+async def get_leave_balance_by_id(db: AsyncSession, balance_id: int) -> Optional[LeaveBalance]:
+    return await db.scalar(select(LeaveBalance).where(LeaveBalance.id == balance_id))
+
+
+async def get_leave_balances_by_employee(db: AsyncSession, employee_id: int) -> List[LeaveBalance]:
+    result = await db.scalars(select(LeaveBalance).where(LeaveBalance.employee_id == employee_id))
+    return list(result)
+
+
+# ============== Leave Ledger ==============
+async def get_ledger_entries(
+    db: AsyncSession,
+    employee_id: int,
+    type_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None
+) -> List[LeaveLedgerEntry]:
+    query = select(LeaveLedgerEntry).where(LeaveLedgerEntry.employee_id == employee_id)
+    if type_id is not None:
+        query = query.where(LeaveLedgerEntry.type_id == type_id)
+    if after:
+        query = query.where(LeaveLedgerEntry.id > after[0])
+    result = await db.scalars(query.order_by(LeaveLedgerEntry.id).offset(skip).limit(limit))
+    return list(result)
+
+
+# ============== Audit Log ==============
+async def get_audit_logs(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> List[AuditLog]:
+    query = audit_log_window(select(AuditLog), after, start, end)
+    result = await db.scalars(
+        query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).offset(skip).limit(limit)
+    )
+    return list(result)
+
+
+async def get_audit_logs_by_actor(
+    db: AsyncSession,
+    actor_type: str,
+    actor_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> List[AuditLog]:
+    query = select(AuditLog).where(
+        AuditLog.actor_type == actor_type,
+        AuditLog.actor_id == actor_id
+    )
+    query = audit_log_window(query, after, start, end)
+    result = await db.scalars(
+        query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).offset(skip).limit(limit)
+    )
+    return list(result)
@@ -0,0 +1,69 @@
+"""
+Shared FastAPI dependencies.
+"""
+from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from typing import Optional
+import os
+
+from auth import decode_access_token
+from database import SessionLocal
+from principal_cache import Principal, principal_cache
+import crud
+
+ADMIN_EMAIL = os.getenv("EMAIL", "").strip('"')
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def load_principal(claims: dict) -> Optional[Principal]:
+    """Resolve token claims to the current account, or None if it no longer exists"""
+    user_type = claims.get("user_type")
+    user_id = claims.get("user_id")
+    if user_type == "admin":
+        if claims.get("sub") != ADMIN_EMAIL:
+            return None
+        return Principal("admin", 1, ADMIN_EMAIL, "System Admin")
+
+    db = SessionLocal()
+    try:
+        if user_type == "employee":
+            user = crud.get_employee_by_id(db, user_id)
+        elif user_type == "manager":
+            user = crud.get_manager_by_id(db, user_id)
+        else:
+            return None
+        if not user:
+            return None
+        return Principal(user_type, user.id, user.email, user.name)
+    finally:
+        db.close()
+
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> Principal:
+    """Authenticate the bearer token, serving repeat tokens from the principal cache"""
+    unauthorized = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+    if credentials is None:
+        raise unauthorized
+
+    token = credentials.credentials
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    claims = decode_access_token(token)
+    if not claims or "exp" not in claims:
+        raise unauthorized
+    principal = await run_in_threadpool(load_principal, claims)
+    if principal is None:
+        raise unauthorized
+
+    principal_cache.put(token, principal, claims["exp"])
+    return principal
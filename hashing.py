@@ -0,0 +1,120 @@
+"""
+Process pool for bcrypt work.
+
+bcrypt is deliberately slow, and running it inline in request handlers ties
+up the shared threadpool so that unrelated endpoints queue behind a burst of
+logins. PasswordHasher runs hashing and verification in a small dedicated
+process pool instead. HASH_WORKERS bounds how many run at once; callers beyond
+that wait in the pool's queue, and once HASH_MAX_QUEUE are waiting new
+requests are refused with HashingBusy rather than queued without limit.
+"""
+from fastapi import HTTPException, status
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
+import os
+import time
+
+from auth import get_password_hash, verify_password
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "64"))
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool and tracks queue depth"""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._total_ms = 0.0
+        self.max_ms = 0.0
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    def start(self):
+        if self._executor is None:
+            # spawn, not fork: forking a process that already holds DB connections and threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    async def _submit(self, fn, *args):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HashingBusy()
+        self.start()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.in_flight -= 1
+            self.completed += 1
+            self._total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "peak_in_flight": self.peak_in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_avg_ms": round(self._total_ms / self.completed, 2) if self.completed else 0.0,
+            "latency_max_ms": round(self.max_ms, 2),
+        }
+
+
+password_hasher = PasswordHasher(HASH_WORKERS, HASH_MAX_QUEUE)
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Password hashing is busy, try again shortly",
+        headers={"Retry-After": "1"}
+    )
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password in the pool, answering 503 when it is saturated"""
+    try:
+        return await password_hasher.hash(password)
+    except HashingBusy:
+        raise _busy()
+
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the pool, answering 503 when it is saturated"""
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except HashingBusy:
+        raise _busy()
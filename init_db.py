@@ -2,6 +2,7 @@
 Database initialization script to create and populate initial data
 """
 from database import init_db, get_db
+from auth import get_password_hash
 import crud
 
 def seed_data():
@@ -23,27 +24,33 @@ def seed_data():
     for lt_name in leave_types:
         try:
             crud.create_leave_type(db, lt_name)
+            db.commit()
             print(f"Created leave type: {lt_name}")
         except Exception as e:
+            db.rollback()
             print(f"Error creating {lt_name}: {e}")
     
     # Create a sample admin
     try:
-        admin = crud.create_admin(db, "Admin User", "admin@example.com", "admin123")
+        admin = crud.create_admin(db, "Admin User", "admin@example.com", get_password_hash("admin123"))
+        db.commit()
         print(f"Created admin: {admin.email}")
     except Exception as e:
+        db.rollback()
         print(f"Error creating admin: {e}")
     
     # Create a sample manager
     try:
-        manager = crud.create_manager(db, "Manager User", "manager@example.com", "manager123")
+        manager = crud.create_manager(db, "Manager User", "manager@example.com", get_password_hash("manager123"))
+        db.commit()
         print(f"Created manager: {manager.email}")
     except Exception as e:
+        db.rollback()
         print(f"Error creating manager: {e}")
     
     # Create a sample employee
     try:
-        employee = crud.create_employee(db, "Employee User", "employee@example.com", "employee123")
+        employee = crud.create_employee(db, "Employee User", "employee@example.com", get_password_hash("employee123"))
         print(f"Created employee: {employee.email}")
         
         # Create leave balances for the employee
@@ -52,9 +59,11 @@ def seed_data():
         
         crud.create_leave_balance(db, employee.id, leave_type_casual.id, 12)
         crud.create_leave_balance(db, employee.id, leave_type_annual.id, 20)
+        db.commit()
         print(f"Created leave balances for employee")
         
     except Exception as e:
+        db.rollback()
         print(f"Error creating employee: {e}")
     
     db.close()
@@ -0,0 +1,149 @@
+"""
+In-process cache of the leave types.
+
+leave_types is a handful of rows read on almost every request (balance and
+policy validation, the leave-type picker), so each worker keeps the whole
+table in memory as immutable snapshots. crud bumps the `leave_types` row of
+cache_versions in the same transaction as every leave-type change. This
+process drops its copy once that transaction commits; other workers compare
+their version with the stored one at most every LEAVE_TYPE_CACHE_CHECK
+seconds and reload when it moved.
+"""
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from typing import NamedTuple, Optional, Tuple
+import hashlib
+import os
+import threading
+import time
+
+from models import CacheVersion, LeaveType
+
+LEAVE_TYPE_CACHE_CHECK = float(os.getenv("LEAVE_TYPE_CACHE_CHECK", "5"))
+
+# cache_versions row bumped by every leave-type change
+VERSION_NAME = "leave_types"
+# Session.info flag set when the current transaction changed leave types
+CHANGED_KEY = "changed_leave_types"
+
+
+class CachedLeaveType(NamedTuple):
+    """Read-only copy of a LeaveType row"""
+    id: int
+    name: str
+    carry_forward_cap: Optional[int]
+
+
+class LeaveTypeCache:
+    """All leave types, the cache_versions version they were loaded at, and their ETag"""
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._types = None
+        self._by_id = {}
+        self._version = None
+        self._etag = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.loads = 0
+        self.checks = 0
+
+    def snapshot(self, db: Session) -> Tuple[Tuple[CachedLeaveType, ...], str]:
+        """All leave types ordered by id, and an ETag that changes whenever they do"""
+        if db.info.get(CHANGED_KEY):
+            # This transaction changed leave types: read them, but keep them out of the cache
+            types = _load_types(db)
+            return types, _etag(types)
+        with self._lock:
+            now = time.monotonic()
+            if self._types is not None and now - self._checked_at < self.check_interval:
+                self.hits += 1
+                return self._types, self._etag
+        # Read the version before the rows: a change committed in between then
+        # only costs an extra reload, never a stale copy under a new version
+        version = current_version(db)
+        with self._lock:
+            self.checks += 1
+            if self._types is not None and version == self._version:
+                self._checked_at = now
+                self.hits += 1
+                return self._types, self._etag
+        types = _load_types(db)
+        etag = _etag(types)
+        with self._lock:
+            self.loads += 1
+            self._types = types
+            self._by_id = {t.id: t for t in types}
+            self._version = version
+            self._etag = etag
+            self._checked_at = now
+        return types, etag
+
+    def get(self, db: Session, type_id: int) -> Optional[CachedLeaveType]:
+        types, _ = self.snapshot(db)
+        if types is self._types:
+            return self._by_id.get(type_id)
+        return next((t for t in types if t.id == type_id), None)
+
+    def invalidate(self):
+        with self._lock:
+            self._types = None
+            self._by_id = {}
+            self._version = None
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._types or ()),
+            "version": self._version,
+            "check_interval": self.check_interval,
+            "hits": self.hits,
+            "checks": self.checks,
+            "loads": self.loads,
+        }
+
+
+def _load_types(db: Session) -> Tuple[CachedLeaveType, ...]:
+    rows = db.execute(
+        select(LeaveType.id, LeaveType.name, LeaveType.carry_forward_cap).order_by(LeaveType.id)
+    ).all()
+    return tuple(CachedLeaveType(*row) for row in rows)
+
+
+def _etag(types: Tuple[CachedLeaveType, ...]) -> str:
+    # Hashed from the contents rather than the version, so every worker hands
+    # out the same tag for the same list
+    return '"' + hashlib.sha256(repr(types).encode()).hexdigest()[:32] + '"'
+
+
+def current_version(db: Session) -> int:
+    version = db.scalar(select(CacheVersion.version).where(CacheVersion.name == VERSION_NAME))
+    return version or 0
+
+
+leave_type_cache = LeaveTypeCache(LEAVE_TYPE_CACHE_CHECK)
+
+
+def mark_changed(db: Session):
+    """Bump the leave-type version in this transaction and drop the cached copy after it ends"""
+    upsert = (postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert)(CacheVersion)
+    upsert = upsert.values(name=VERSION_NAME, version=1)
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"version": CacheVersion.version + 1}
+    ))
+    leave_type_cache.invalidate()
+    db.info[CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session):
+    if session.info.pop(CHANGED_KEY, None):
+        leave_type_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session):
+    session.info.pop(CHANGED_KEY, None)
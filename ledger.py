@@ -0,0 +1,145 @@
+"""
+Snapshot compaction for the leave ledger.
+
+leave_ledger is append-only: every allocation, consumption and adjustment of
+a balance is a signed row. Reading a balance "as of" a date sums the newest
+snapshot on or before that date plus the ledger rows after it, so
+compact_snapshots() writes one snapshot per balance at the end of each closed
+month to keep that tail short. A backdated entry deletes the snapshots it
+invalidates (see crud.post_ledger_entry) and the next compaction rebuilds
+them.
+
+Hot-row contention is not addressed. Admission still runs as one
+conditional UPDATE of the leave_balance row (crud.update_leave_balance,
+reserve_leave_days), and the ledger entry is inserted under that row lock,
+so approvals for the same balance still queue on it, just as before the
+ledger existed. Admitting from the ledger alone would need the same
+serialization per balance (an advisory lock, or SERIALIZABLE retries over
+snapshot + tail) to keep two concurrent inserts from both passing the
+check. It would also make every admission a sum over the tail instead of
+a single-row read. The ledger adds history and as-of reads; it does not
+change who waits. Different balances never block each other.
+
+backfill_opening_entries() seeds the ledger for balances created before it
+existed, from their current counters.
+
+Usage:
+    python ledger.py compact [--through YYYY-MM-DD]
+    python ledger.py backfill
+"""
+from sqlalchemy import and_, exists, insert, literal, select, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from typing import Optional
+import argparse
+import os
+import threading
+
+from models import LeaveBalance, LeaveBalanceSnapshot, LeaveLedgerEntry
+import crud
+
+LEDGER_COMPACTION_INTERVAL = float(os.getenv("LEDGER_COMPACTION_INTERVAL", "86400"))
+LEDGER_SNAPSHOT_BATCH = int(os.getenv("LEDGER_SNAPSHOT_BATCH", "5000"))
+
+
+def last_closed_month_end(today: Optional[date] = None) -> date:
+    today = today or date.today()
+    return date(today.year, today.month, 1) - timedelta(days=1)
+
+
+def compact_snapshots(engine: Engine, through: Optional[date] = None) -> int:
+    """Write the missing snapshots at `through` (default: end of last month); returns rows written"""
+    through = through or last_closed_month_end()
+    with Session(engine) as db:
+        totals = crud.balance_totals(db, through)
+        done = set(db.execute(
+            select(LeaveBalanceSnapshot.employee_id, LeaveBalanceSnapshot.type_id)
+            .where(LeaveBalanceSnapshot.as_of == through)
+        ).all())
+        rows = [
+            {"employee_id": employee_id, "type_id": type_id, "as_of": through, "credited": credited, "used": used}
+            for (employee_id, type_id), (credited, used) in totals.items()
+            if (employee_id, type_id) not in done
+        ]
+        for i in range(0, len(rows), LEDGER_SNAPSHOT_BATCH):
+            db.execute(insert(LeaveBalanceSnapshot), rows[i:i + LEDGER_SNAPSHOT_BATCH])
+        db.commit()
+    return len(rows)
+
+
+def backfill_opening_entries(engine: Engine) -> int:
+    """Post opening allocation and consumption entries for balances with no ledger rows"""
+    today = date.today()
+    untracked = ~exists().where(and_(
+        LeaveLedgerEntry.employee_id == LeaveBalance.employee_id,
+        LeaveLedgerEntry.type_id == LeaveBalance.type_id
+    ))
+    columns = ["employee_id", "type_id", "entry_type", "days", "effective_date", "note", "created_at"]
+    opening = union_all(*[
+        select(
+            LeaveBalance.employee_id,
+            LeaveBalance.type_id,
+            literal(entry_type),
+            days,
+            literal(today),
+            literal("opening balance"),
+            literal(datetime.now())
+        ).where(untracked, days != 0)
+        for entry_type, days in (("allocation", LeaveBalance.total_allocated), ("consumption", -LeaveBalance.total_used))
+    ])
+    # One statement, so both halves see the balances as still untracked
+    with engine.begin() as conn:
+        return conn.execute(insert(LeaveLedgerEntry).from_select(columns, opening)).rowcount
+
+
+class SnapshotCompaction:
+    """Background thread that snapshots balances once a month has closed"""
+
+    def __init__(self, engine: Engine, interval: float = LEDGER_COMPACTION_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ledger-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def run_once(self):
+        written = compact_snapshots(self.engine)
+        if written:
+            print(f"Wrote {written} leave balance snapshots")
+        self.last_run = datetime.now()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Ledger snapshot compaction failed: {e}")
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Maintain the leave ledger")
+    parser.add_argument("command", choices=["compact", "backfill"])
+    parser.add_argument("--through", type=date.fromisoformat, help="Snapshot date (default: end of last month)")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        print(f"Wrote {compact_snapshots(engine, args.through)} snapshots")
+    else:
+        print(f"Posted {backfill_opening_entries(engine)} opening entries")
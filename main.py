@@ -1,4 +1,4 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
@@ -7,11 +7,22 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-from database import init_db
+from database import init_db, get_pool_stats, DB_MODE, engine, SessionLocal
+from audit import audit_sink
+from hashing import password_hasher
+from dependencies import get_current_user
+from principal_cache import principal_cache
+from leave_type_cache import leave_type_cache
+from response_cache import response_cache
+from audit_partitions import PartitionMaintenance
+from ledger import SnapshotCompaction
+from accruals import ACCRUAL_SCHEDULER_ENABLED, AccrualScheduler
+from auto_approvals import AUTO_APPROVAL_ENABLED, AutoApprover
 from routers import (
     auth, admins, employees, managers, 
     leaves, approvals, leave_types, 
-    leave_balances, audit_logs
+    leave_balances, audit_logs, holidays, team_calendar, accruals,
+    teams, auto_approvals
 )
 
 app = FastAPI(
@@ -46,16 +57,38 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Creates upcoming audit_logs partitions (and archives old ones if enabled)
+partition_maintenance = PartitionMaintenance(engine)
+
+# Snapshots leave balances at each month end so "as of" reads stay short
+snapshot_compaction = SnapshotCompaction(engine)
+
+# Applies accrual policies for the current period (ACCRUAL_SCHEDULER_ENABLED=true)
+accrual_scheduler = AccrualScheduler(SessionLocal)
+
+# Sweeps the pending queue with the auto-approval rules (AUTO_APPROVAL_ENABLED=true)
+auto_approver = AutoApprover(SessionLocal)
+
+# Hot routers have an async variant, selected with DB_MODE=async
+hot_routers = [leaves, approvals, leave_balances, audit_logs, team_calendar]
+print(f"Database mode: {DB_MODE}")
+
+# REQUIRE_AUTH=true puts every router except /auth behind a bearer token
+REQUIRE_AUTH = os.getenv("REQUIRE_AUTH", "false").lower() == "true"
+protected = [Depends(get_current_user)] if REQUIRE_AUTH else []
+
 # Include routers
 app.include_router(auth.router)
-app.include_router(admins.router)
-app.include_router(employees.router)
-app.include_router(managers.router)
-app.include_router(leaves.router)
-app.include_router(approvals.router)
-app.include_router(leave_types.router)
-app.include_router(leave_balances.router)
-app.include_router(audit_logs.router)
+app.include_router(admins.router, dependencies=protected)
+app.include_router(employees.router, dependencies=protected)
+app.include_router(managers.router, dependencies=protected)
+app.include_router(leave_types.router, dependencies=protected)
+app.include_router(holidays.router, dependencies=protected)
+app.include_router(accruals.router, dependencies=protected)
+app.include_router(teams.router, dependencies=protected)
+app.include_router(auto_approvals.router, dependencies=protected)
+for module in hot_routers:
+    app.include_router(module.async_router if DB_MODE == "async" else module.router, dependencies=protected)
 
 
 @app.get("/")
@@ -73,12 +106,68 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/health/pool")
+def pool_stats():
+    """Database connection pool occupancy and checkout wait-time histogram"""
+    return get_pool_stats()
+
+
+@app.get("/health/audit")
+def audit_stats():
+    """Audit sink queue depth and write counters"""
+    return audit_sink.stats()
+
+
+@app.get("/health/hashing")
+def hashing_stats():
+    """Password hashing pool concurrency, queue depth and latency"""
+    return password_hasher.stats()
+
+
+@app.get("/health/auth")
+def auth_stats():
+    """Principal cache size and hit rate"""
+    return principal_cache.stats()
+
+
+@app.get("/health/leave-types")
+def leave_type_cache_stats():
+    """Leave-type cache version, reloads and hit counts"""
+    return leave_type_cache.stats()
+
+
+@app.get("/health/response-cache")
+def response_cache_stats():
+    """Response cache hit and miss ratios per endpoint, size and invalidations"""
+    return response_cache.stats()
+
+
 @app.on_event("startup")
 def startup_event():
     """Initialize database on startup"""
     print("Initializing database...")
     init_db()
     print("Database initialized successfully!")
+    audit_sink.start()
+    password_hasher.start()
+    if engine.dialect.name == "postgresql":
+        partition_maintenance.start()
+    snapshot_compaction.start()
+    if ACCRUAL_SCHEDULER_ENABLED:
+        accrual_scheduler.start()
+    if AUTO_APPROVAL_ENABLED:
+        auto_approver.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Flush queued audit log entries and stop background workers before exiting"""
+    audit_sink.stop()
+    partition_maintenance.stop()
+    snapshot_compaction.stop()
+    accrual_scheduler.stop()
+    auto_approver.stop()
+    password_hasher.stop()
 
 
 if __name__ == "__main__":
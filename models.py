@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Text, func
+from sqlalchemy import Column, Boolean, Integer, String, ForeignKey, Date, DateTime, Enum, Text, Index, PrimaryKeyConstraint, UniqueConstraint, DDL, event, func, true
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 import enum
 
 Base = declarative_base()
 
+# Models with server-generated timestamps set eager_defaults, so a flush
+# fetches them with RETURNING instead of needing a refresh SELECT
+
 class LeaveStatus(enum.Enum):
     pending = "pending"
     approved = "approved"
@@ -22,6 +25,7 @@ class ActorType(enum.Enum):
 
 class Admin(Base):
     __tablename__ = "admins"
+    __mapper_args__ = {"eager_defaults": True}
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100), nullable=False)
     email = Column(String(100), unique=True, nullable=False, index=True)
@@ -29,21 +33,39 @@ class Admin(Base):
     created_at = Column(DateTime, default=func.now(), nullable=False)
 
 
+class Team(Base):
+    __tablename__ = "teams"
+    __mapper_args__ = {"eager_defaults": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(100), nullable=False, unique=True)
+    # Coverage policy: members who must be at work on every day; NULL means no minimum
+    min_present = Column(Integer)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+    employees = relationship("Employee", back_populates="team")
+
+
 class Employee(Base):
     __tablename__ = "employees"
+    __mapper_args__ = {"eager_defaults": True}
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100), nullable=False)
     email = Column(String(100), unique=True, nullable=False, index=True)
     password_hash = Column(Text, nullable=False)
+    # Selects the holiday calendar used to count working days
+    region = Column(String(50), nullable=False, default="default", server_default="default")
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="SET NULL"), index=True)
     created_at = Column(DateTime, default=func.now(), nullable=False)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
     
+    team = relationship("Team", back_populates="employees")
     leaves = relationship("Leave", back_populates="employee", cascade="all, delete-orphan")
     leave_balances = relationship("LeaveBalance", back_populates="employee", cascade="all, delete-orphan")
 
 
 class Manager(Base):
     __tablename__ = "managers"
+    __mapper_args__ = {"eager_defaults": True}
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100), nullable=False)
     email = Column(String(100), unique=True, nullable=False, index=True)
@@ -53,10 +75,24 @@ class Manager(Base):
     approvals = relationship("Approval", back_populates="manager", cascade="all, delete-orphan")
 
 
+class Holiday(Base):
+    __tablename__ = "holidays"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    region = Column(String(50), nullable=False)
+    date = Column(Date, nullable=False)
+    name = Column(String(100), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("region", "date", name="uq_holidays_region_date"),
+    )
+
+
 class LeaveType(Base):
     __tablename__ = "leave_types"
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(50), nullable=False, unique=True)
+    # Days of remaining balance kept at year end; NULL leaves balances untouched
+    carry_forward_cap = Column(Integer)
     
     leaves = relationship("Leave", back_populates="leave_type")
     leave_balances = relationship("LeaveBalance", back_populates="leave_type")
@@ -64,6 +100,7 @@ class LeaveType(Base):
 
 class Leave(Base):
     __tablename__ = "leaves"
+    __mapper_args__ = {"eager_defaults": True}
     id = Column(Integer, primary_key=True, autoincrement=True)
     employee_id = Column(Integer, ForeignKey("employees.id", ondelete="CASCADE"), nullable=False)
     type_id = Column(Integer, ForeignKey("leave_types.id", ondelete="CASCADE"), nullable=False)
@@ -71,15 +108,71 @@ class Leave(Base):
     end_time = Column(DateTime, nullable=False)
     reason = Column(Text)
     status = Column(String(20), default="pending", nullable=False)
+    # Working days reserved against the balance when the leave was filed
+    days = Column(Integer)
+    # Manager holding this pending leave in their work queue, until claim_expires_at
+    claimed_by = Column(Integer, ForeignKey("managers.id", ondelete="SET NULL"))
+    claim_expires_at = Column(DateTime)
     created_at = Column(DateTime, default=func.now(), nullable=False)
     
     employee = relationship("Employee", back_populates="leaves")
     leave_type = relationship("LeaveType", back_populates="leaves")
     approvals = relationship("Approval", back_populates="leave", cascade="all, delete-orphan")
 
+    # Keyset pagination indexes: every list is ordered by id within its filter
+    __table_args__ = (
+        Index("idx_leaves_employee_id", "employee_id", "id"),
+        Index("idx_leaves_status", "status", "id"),
+        # Overlap checks on backends without range types; PostgreSQL uses
+        # the GiST exclusion constraint below instead
+        Index(
+            "idx_leaves_active_period", "employee_id", "start_time", "end_time",
+            sqlite_where=status.in_(("pending", "approved"))
+        ).ddl_if(callable_=lambda ddl, target, bind, **kw: bind.dialect.name != "postgresql"),
+    )
+
+
+# Pending and approved leaves of one employee may not overlap. The exclusion
+# constraint's GiST index also serves crud.find_overlapping_leaves.
+event.listen(
+    Leave.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql")
+)
+event.listen(
+    Leave.__table__, "after_create",
+    DDL(
+        "ALTER TABLE leaves ADD CONSTRAINT excl_leaves_overlap EXCLUDE USING gist "
+        "(employee_id WITH =, tsrange(start_time, end_time, '[]') WITH &&) "
+        "WHERE (status IN ('pending', 'approved'))"
+    ).execute_if(dialect="postgresql")
+)
+
+
+class LeaveDay(Base):
+    """One row per calendar day covered by an approved leave"""
+    __tablename__ = "leave_days"
+    day = Column(Date, primary_key=True)
+    employee_id = Column(Integer, ForeignKey("employees.id", ondelete="CASCADE"), primary_key=True)
+    leave_id = Column(Integer, ForeignKey("leaves.id", ondelete="CASCADE"), primary_key=True)
+    type_id = Column(Integer, ForeignKey("leave_types.id", ondelete="CASCADE"), nullable=False)
+
+    # The primary key serves window scans by day; this one serves cascades and removal by leave
+    __table_args__ = (
+        Index("idx_leave_days_leave_id", "leave_id"),
+    )
+
+
+class TeamDayAbsence(Base):
+    """Members of a team out on approved leave on a day, kept in step with leave_days"""
+    __tablename__ = "team_day_absences"
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    absent = Column(Integer, nullable=False)
+
 
 class Approval(Base):
     __tablename__ = "approvals"
+    __mapper_args__ = {"eager_defaults": True}
     id = Column(Integer, primary_key=True, autoincrement=True)
     leave_id = Column(Integer, ForeignKey("leaves.id", ondelete="CASCADE"), nullable=False)
     approved_by = Column(Integer, ForeignKey("managers.id", ondelete="CASCADE"), nullable=False)
@@ -89,6 +182,11 @@ class Approval(Base):
     leave = relationship("Leave", back_populates="approvals")
     manager = relationship("Manager", back_populates="approvals")
 
+    __table_args__ = (
+        Index("idx_approvals_leave_id", "leave_id"),
+        Index("idx_approvals_manager_id", "approved_by", "id"),
+    )
+
 
 class LeaveBalance(Base):
     __tablename__ = "leave_balance"
@@ -98,13 +196,111 @@ class LeaveBalance(Base):
     total_allocated = Column(Integer, nullable=False, default=0)
     total_used = Column(Integer, nullable=False, default=0)
     remaining = Column(Integer, nullable=False, default=0)
+    # Days held by pending leaves; requests are admitted against remaining - reserved
+    reserved = Column(Integer, nullable=False, default=0, server_default="0")
+    # Last year whose carry-forward has been applied
+    carried_over_year = Column(Integer)
     
     employee = relationship("Employee", back_populates="leave_balances")
     leave_type = relationship("LeaveType", back_populates="leave_balances")
 
+    # Also the conflict target for accrual upserts
+    __table_args__ = (
+        UniqueConstraint("employee_id", "type_id", name="unique_employee_leave_type"),
+    )
+
+
+class LeaveLedgerEntry(Base):
+    """Append-only signed day movement on an employee's balance for a leave type"""
+    __tablename__ = "leave_ledger"
+    __mapper_args__ = {"eager_defaults": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    employee_id = Column(Integer, ForeignKey("employees.id", ondelete="CASCADE"), nullable=False)
+    type_id = Column(Integer, ForeignKey("leave_types.id", ondelete="CASCADE"), nullable=False)
+    # allocation, accrual, consumption, reversal, carry_forward or adjustment
+    entry_type = Column(String(20), nullable=False)
+    days = Column(Integer, nullable=False)
+    effective_date = Column(Date, nullable=False)
+    leave_id = Column(Integer, ForeignKey("leaves.id", ondelete="SET NULL"))
+    note = Column(Text)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+    # "As of" sums walk one balance's entries by date; the ledger listing pages by id
+    __table_args__ = (
+        Index("idx_leave_ledger_balance", "employee_id", "type_id", "effective_date"),
+        Index("idx_leave_ledger_employee", "employee_id", "id"),
+        # Accrual runs look up who already accrued a period
+        Index(
+            "idx_leave_ledger_accruals", "type_id", "effective_date",
+            postgresql_where=entry_type == "accrual",
+            sqlite_where=entry_type == "accrual"
+        ),
+    )
+
+
+class LeaveBalanceSnapshot(Base):
+    """Ledger totals for one balance through the end of as_of, written by ledger.compact_snapshots"""
+    __tablename__ = "leave_balance_snapshots"
+    employee_id = Column(Integer, ForeignKey("employees.id", ondelete="CASCADE"), primary_key=True)
+    type_id = Column(Integer, ForeignKey("leave_types.id", ondelete="CASCADE"), primary_key=True)
+    as_of = Column(Date, primary_key=True)
+    credited = Column(Integer, nullable=False)
+    used = Column(Integer, nullable=False)
+
+
+class AccrualPolicy(Base):
+    """How many days of a leave type every employee accrues per month or year"""
+    __tablename__ = "accrual_policies"
+    __mapper_args__ = {"eager_defaults": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    type_id = Column(Integer, ForeignKey("leave_types.id", ondelete="CASCADE"), unique=True, nullable=False)
+    # monthly or annual
+    frequency = Column(String(20), nullable=False)
+    days_per_period = Column(Integer, nullable=False)
+    # Employees who join mid-period get the share of the period left after their join date
+    prorate = Column(Boolean, nullable=False, default=True, server_default=true())
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+
+class AccrualRun(Base):
+    """One application of a policy to a period, written in the same transaction as its accruals"""
+    __tablename__ = "accrual_runs"
+    __mapper_args__ = {"eager_defaults": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    policy_id = Column(Integer, ForeignKey("accrual_policies.id", ondelete="CASCADE"), nullable=False)
+    period_start = Column(Date, nullable=False)
+    employees = Column(Integer, nullable=False)
+    days = Column(Integer, nullable=False)
+    ran_at = Column(DateTime, default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("idx_accrual_runs_policy", "policy_id", "period_start"),
+    )
+
+
+class AutoApprovalRule(Base):
+    """Pending leaves matching every set condition are approved by the auto-approval worker"""
+    __tablename__ = "auto_approval_rules"
+    __mapper_args__ = {"eager_defaults": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # NULL matches every leave type / every team
+    type_id = Column(Integer, ForeignKey("leave_types.id", ondelete="CASCADE"))
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"))
+    # Longest leave approved, in working days
+    max_days = Column(Integer)
+    # Days that must be left on the balance once the leave is booked
+    min_remaining = Column(Integer)
+    # Most team members out on any day of the leave, this leave included
+    max_team_absent = Column(Integer)
+    # Manager the approvals are recorded under
+    approver_id = Column(Integer, ForeignKey("managers.id", ondelete="CASCADE"), nullable=False)
+    enabled = Column(Boolean, nullable=False, default=True, server_default=true())
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __mapper_args__ = {"eager_defaults": True}
     id = Column(Integer, primary_key=True, autoincrement=True)
     actor_type = Column(String(20), nullable=False)
     actor_id = Column(Integer, nullable=False)
@@ -112,3 +308,47 @@ class AuditLog(Base):
     target_table = Column(String(50), nullable=False)
     target_id = Column(Integer, nullable=False)
     timestamp = Column(DateTime, default=func.now(), nullable=False)
+
+    # Keyset pagination walks (timestamp, id) newest first; on PostgreSQL the
+    # table is split into monthly partitions managed by audit_partitions.py
+    __table_args__ = (
+        # PostgreSQL gets (id, timestamp) below instead, since every unique
+        # constraint of a partitioned table must include the partition key
+        PrimaryKeyConstraint("id").ddl_if(
+            callable_=lambda ddl, target, bind, dialect, **kw: dialect.name != "postgresql"
+        ),
+        Index("idx_audit_logs_actor", "actor_type", "actor_id", timestamp.desc(), id.desc()),
+        Index("idx_audit_logs_timestamp", timestamp.desc(), id.desc()),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+
+event.listen(
+    AuditLog.__table__, "after_create",
+    DDL("ALTER TABLE audit_logs ADD PRIMARY KEY (id, timestamp)").execute_if(dialect="postgresql")
+)
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    __mapper_args__ = {"eager_defaults": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # SHA-256 of the token; the token itself is random, so a slow hash adds nothing
+    token_hash = Column(String(64), unique=True, nullable=False)
+    user_type = Column(String(20), nullable=False)
+    user_id = Column(Integer, nullable=False)
+    email = Column(String(100), nullable=False)
+    # Every token rotated from the same login shares a family; reuse of a
+    # rotated token revokes the whole family
+    family_id = Column(String(32), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime)
+    replaced_by_id = Column(Integer, ForeignKey("refresh_tokens.id", ondelete="SET NULL"))
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+
+class CacheVersion(Base):
+    """Change counter per cached table, bumped in the same transaction as the change it announces"""
+    __tablename__ = "cache_versions"
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False)
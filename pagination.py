@@ -0,0 +1,76 @@
+"""
+Keyset (cursor) pagination helpers.
+
+List endpoints return the cursor for the next page in the X-Next-Cursor
+response header; passing it back as ?cursor= continues after the last row
+of the previous page using an indexed range predicate instead of OFFSET.
+"""
+from fastapi import HTTPException, Query, Response, status
+from datetime import datetime
+from typing import Callable, Optional, Sequence
+import base64
+import json
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """Encode the sort key of the last row into an opaque token"""
+    payload = [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, types: Sequence[type]) -> tuple:
+    """Decode a cursor token, checking it matches the expected key types"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Malformed cursor") from e
+
+    if not isinstance(payload, list) or len(payload) != len(types):
+        raise ValueError("Malformed cursor")
+
+    values = []
+    for value, expected in zip(payload, types):
+        if expected is datetime:
+            if not isinstance(value, dict) or not isinstance(value.get("dt"), str):
+                raise ValueError("Malformed cursor")
+            values.append(datetime.fromisoformat(value["dt"]))
+        elif isinstance(value, expected) and not isinstance(value, bool):
+            values.append(value)
+        else:
+            raise ValueError("Malformed cursor")
+    return tuple(values)
+
+
+def keyset_cursor(*types: type) -> Callable[[Optional[str]], Optional[tuple]]:
+    """Build a dependency that decodes ?cursor= into a key tuple of the given types"""
+    def dependency(
+        cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header")
+    ) -> Optional[tuple]:
+        if cursor is None:
+            return None
+        try:
+            return decode_cursor(cursor, types)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid pagination cursor"
+            )
+    return dependency
+
+
+def set_next_cursor(response: Response, items: list, limit: int, key: Callable[[object], tuple]) -> None:
+    """Set the next-page cursor header when the page came back full"""
+    if items and len(items) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(items[-1]))
+
+
+def id_key(row) -> tuple:
+    return (row.id,)
+
+
+def timestamp_id_key(row) -> tuple:
+    return (row.timestamp, row.id)
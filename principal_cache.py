@@ -0,0 +1,107 @@
+"""
+Cache of authenticated principals keyed by access token.
+
+A hit skips both the JWT signature check and the user lookup. Entries expire
+at the token's `exp` (capped at PRINCIPAL_CACHE_TTL seconds, which bounds how
+long another worker process can serve a user deleted elsewhere). Within this
+process, crud marks employees and managers that are updated or deleted, and
+their entries are dropped again once the transaction commits.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from typing import Optional
+import os
+import threading
+import time
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+
+# Session.info key holding (user_type, user_id) pairs changed by the current transaction
+CHANGED_KEY = "changed_principals"
+
+
+class Principal:
+    """The authenticated caller"""
+
+    def __init__(self, user_type: str, user_id: int, email: str, name: str):
+        self.user_type = user_type
+        self.user_id = user_id
+        self.email = email
+        self.name = name
+
+
+class PrincipalCache:
+    """Bounded LRU of token -> (principal, expiry)"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, principal: Principal, exp: float):
+        expires_at = min(exp, time.time() + self.ttl)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_type: str, user_id: int):
+        with self._lock:
+            stale = [
+                token for token, (principal, _) in self._entries.items()
+                if principal.user_type == user_type and principal.user_id == user_id
+            ]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+def mark_changed(db: Session, user_type: str, user_id: int):
+    """Drop a user's cached principals now and again after the session commits"""
+    # Dropping now covers requests in this process; the post-commit pass catches
+    # entries re-cached from the old row before the change became visible
+    principal_cache.invalidate_user(user_type, user_id)
+    db.info.setdefault(CHANGED_KEY, set()).add((user_type, user_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session):
+    for user_type, user_id in session.info.pop(CHANGED_KEY, ()):
+        principal_cache.invalidate_user(user_type, user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session):
+    session.info.pop(CHANGED_KEY, None)
@@ -0,0 +1,221 @@
+"""
+Leave balance reconciliation.
+
+Recomputes the days each balance should have used from its approved leaves
+(one grouped aggregate over leaves and approvals; after a carry-forward only
+leaves approved after the closed year count, which is what carry_forward.py
+leaves in total_used) and compares it with
+leave_balance.total_used. Both result sets are streamed in
+(employee_id, type_id) order with server-side cursors and merged, so memory
+stays flat however many balances there are.
+
+With repair on, each chunk of drifted balances is fixed in its own short
+transaction. A repair only applies if total_used still holds the value that
+was read, so a concurrent approval is never overwritten, and it posts the
+difference to the ledger so the ledger keeps matching the counters. Balances
+with leaves filed before `days` was recorded, or whose recomputed usage
+exceeds the allocation, are reported but not touched.
+
+Usage:
+    python reconcile.py [--repair]
+"""
+from sqlalchemy import extract, func, or_, select, update
+from sqlalchemy.orm import Session
+from typing import Iterator, Optional, Tuple
+import argparse
+import os
+import time
+
+from models import Approval, Leave, LeaveBalance
+import crud
+import response_cache
+
+RECONCILE_CHUNK = int(os.getenv("RECONCILE_CHUNK", "5000"))
+# Drifted balances listed in the report; all of them are counted
+RECONCILE_REPORT_LIMIT = int(os.getenv("RECONCILE_REPORT_LIMIT", "100"))
+
+
+def expected_usage_query():
+    """Approved days per (employee_id, type_id), plus how many of those leaves lack a day count"""
+    return (
+        select(
+            Leave.employee_id,
+            Leave.type_id,
+            func.coalesce(func.sum(Leave.days), 0),
+            func.count(),
+            func.count() - func.count(Leave.days)
+        )
+        .join(Approval, (Approval.leave_id == Leave.id) & (Approval.decision == "approved"))
+        .join(LeaveBalance, (LeaveBalance.employee_id == Leave.employee_id) & (LeaveBalance.type_id == Leave.type_id))
+        .where(
+            Leave.status == "approved",
+            # A carry-forward keeps only the usage approved after the closed year
+            or_(
+                LeaveBalance.carried_over_year.is_(None),
+                extract("year", Approval.approved_at) > LeaveBalance.carried_over_year
+            )
+        )
+        .group_by(Leave.employee_id, Leave.type_id)
+        .order_by(Leave.employee_id, Leave.type_id)
+    )
+
+
+def balances_query():
+    return select(
+        LeaveBalance.employee_id,
+        LeaveBalance.type_id,
+        LeaveBalance.id,
+        LeaveBalance.total_allocated,
+        LeaveBalance.total_used,
+        LeaveBalance.reserved
+    ).order_by(LeaveBalance.employee_id, LeaveBalance.type_id)
+
+
+def merge_usage(balances, usage) -> Iterator[Tuple[tuple, Optional[tuple]]]:
+    """Pair each balance row with its usage row; both streams are sorted by (employee_id, type_id)"""
+    pending = next(usage, None)
+    for balance in balances:
+        key = (balance[0], balance[1])
+        # Usage rows always have a balance (inner join), so none are skipped here
+        while pending is not None and (pending[0], pending[1]) < key:
+            pending = next(usage, None)
+        if pending is not None and (pending[0], pending[1]) == key:
+            yield balance, pending
+            pending = next(usage, None)
+        else:
+            yield balance, None
+
+
+def repair_balance(db: Session, drift: dict) -> bool:
+    """Set total_used to the recomputed value unless the balance changed since it was read"""
+    balance = db.scalars(
+        update(LeaveBalance)
+        .where(
+            LeaveBalance.id == drift["balance_id"],
+            LeaveBalance.total_used == drift["recorded_used"],
+            LeaveBalance.total_allocated - drift["expected_used"] >= LeaveBalance.reserved
+        )
+        .values(
+            total_used=drift["expected_used"],
+            remaining=LeaveBalance.total_allocated - drift["expected_used"]
+        )
+        .returning(LeaveBalance)
+    ).first()
+    if balance is None:
+        return False
+    # Consumption books more usage, reversal gives days back; either way days = recorded - expected
+    difference = drift["recorded_used"] - drift["expected_used"]
+    crud.post_ledger_entry(
+        db,
+        drift["employee_id"],
+        drift["type_id"],
+        "consumption" if difference < 0 else "reversal",
+        difference,
+        note="reconciliation"
+    )
+    response_cache.mark_changed(db, response_cache.BALANCES, drift["employee_id"])
+    return True
+
+
+def reconcile(db: Session, repair: bool = False, chunk_size: int = RECONCILE_CHUNK) -> dict:
+    """Compare every balance's total_used with its approved leaves; returns the report"""
+    started = time.monotonic()
+    report = {
+        "repair": repair,
+        "balances_scanned": 0,
+        "leaves_scanned": 0,
+        "drifted": 0,
+        "repaired": 0,
+        "skipped": 0,
+        "elapsed_seconds": 0.0,
+        "drift": [],
+    }
+
+    engine = db.get_bind()
+    options = {"stream_results": True, "yield_per": chunk_size}
+    if engine.dialect.name == "postgresql":
+        # Both streams read the same snapshot
+        options["isolation_level"] = "REPEATABLE READ"
+    with engine.connect().execution_options(**options) as conn:
+        usage = iter(conn.execute(expected_usage_query()))
+        balances = conn.execute(balances_query())
+
+        chunk = []
+        for balance, used in merge_usage(balances, usage):
+            employee_id, type_id, balance_id, allocated, recorded, reserved = balance
+            expected, leaves, undetermined = used[2:] if used else (0, 0, 0)
+            report["balances_scanned"] += 1
+            report["leaves_scanned"] += leaves
+            if undetermined:
+                # Leaves without a day count: the expected figure is a lower bound only
+                report["skipped"] += 1
+                continue
+            if expected == recorded:
+                continue
+
+            drift = {
+                "balance_id": balance_id,
+                "employee_id": employee_id,
+                "type_id": type_id,
+                "recorded_used": recorded,
+                "expected_used": int(expected),
+                "repaired": False,
+            }
+            report["drifted"] += 1
+            if len(report["drift"]) < RECONCILE_REPORT_LIMIT:
+                report["drift"].append(drift)
+            if allocated - expected < reserved:
+                report["skipped"] += 1
+            elif repair:
+                chunk.append(drift)
+            if len(chunk) >= chunk_size:
+                report["repaired"] += _repair_chunk(db, chunk)
+                chunk = []
+        if chunk:
+            report["repaired"] += _repair_chunk(db, chunk)
+
+    report["elapsed_seconds"] = round(time.monotonic() - started, 3)
+    return report
+
+
+def _repair_chunk(db: Session, chunk: list) -> int:
+    repaired = 0
+    for drift in chunk:
+        if repair_balance(db, drift):
+            drift["repaired"] = True
+            repaired += 1
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,
+        action=f"Reconciled {repaired} of {len(chunk)} drifted leave balances",
+        target_table="leave_balance",
+        target_id=chunk[0]["balance_id"]
+    )
+    db.commit()
+    return repaired
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Reconcile leave balances with approved leaves")
+    parser.add_argument("--repair", action="store_true", help="Fix drifted balances instead of only reporting them")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = reconcile(db, repair=args.repair)
+    finally:
+        db.close()
+    for drift in report["drift"]:
+        print(
+            f"  balance {drift['balance_id']} (employee {drift['employee_id']}, type {drift['type_id']}): "
+            f"used {drift['recorded_used']}, approved leaves say {drift['expected_used']}"
+            + (" - repaired" if drift["repaired"] else "")
+        )
+    print(
+        f"Scanned {report['balances_scanned']} balances and {report['leaves_scanned']} leaves in "
+        f"{report['elapsed_seconds']}s: {report['drifted']} drifted, {report['repaired']} repaired, "
+        f"{report['skipped']} skipped"
+    )
@@ -0,0 +1,399 @@
+"""
+Write-invalidated cache of hot read responses.
+
+The dashboards poll GET /leaves/employee/{id}, /leave-balances/employee/{id}
+and /approvals/manager/{id}, so their serialized responses are cached under
+the request path and query string. Every entry depends on two tags: its
+kind (leaves, balances or approvals) and its owner within that kind, e.g.
+`leaves:42`. Each tag has a random token stored alongside the entries. An
+entry records the tokens it was built under and is a hit only while they
+are all unchanged. crud marks the tags a transaction touches, and their
+tokens are replaced once it commits; bulk jobs replace a whole kind.
+
+Tokens are read before the database is, so a response built from data a
+concurrent write was about to change is stored under the old token and
+never served. A token that expires or is evicted only causes misses.
+
+The store is pluggable: an in-process LRU bounded by entry count and bytes
+(per worker, so writes made by other workers show up within
+RESPONSE_CACHE_TTL seconds), or any server speaking the Redis protocol,
+shared by all workers. A backend is any object with get_many, set_many and
+stats; backend failures fall back to the database.
+"""
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import unquote, urlencode, urlparse
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_REDIS_TIMEOUT = float(os.getenv("RESPONSE_CACHE_REDIS_TIMEOUT", "0.5"))
+RESPONSE_CACHE_REDIS_POOL = int(os.getenv("RESPONSE_CACHE_REDIS_POOL", "16"))
+RESPONSE_CACHE_PREFIX = os.getenv("RESPONSE_CACHE_PREFIX", "elm:")
+
+# Kinds of cached response, each owned by one employee or manager
+LEAVES = "leaves"
+BALANCES = "balances"
+APPROVALS = "approvals"
+
+# Session.info key holding the tags changed by the current transaction
+CHANGED_KEY = "changed_response_tags"
+CACHE_HEADER = "X-Cache"
+
+
+class CacheBackendError(Exception):
+    """The cache server answered with an error or broke the protocol"""
+
+
+class MemoryBackend:
+    """Thread-safe LRU bounded by entry count and total bytes, with per-entry expiry"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] <= now:
+                    self._discard(key)
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                values.append(entry[0] if entry else None)
+        return values
+
+    def set_many(self, values: Dict[str, bytes], ttl: float, only_if_missing: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            for key, value in values.items():
+                existing = self._entries.get(key)
+                if existing is not None:
+                    if only_if_missing and existing[1] > now:
+                        continue
+                    self._discard(key)
+                self._entries[key] = (value, now + ttl)
+                self._bytes += len(key) + len(value)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, key: str):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(key) + len(value)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "max_size": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class RedisBackend:
+    """Minimal Redis-protocol (RESP2) client with a connection pool; only MGET and SET are used"""
+
+    def __init__(self, url: str, timeout: float, pool_size: int):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.database = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return self._execute([["MGET", *keys]])[0]
+
+    def set_many(self, values: Dict[str, bytes], ttl: float, only_if_missing: bool = False):
+        milliseconds = max(1, int(ttl * 1000))
+        flags = ["NX"] if only_if_missing else []
+        self._execute([["SET", key, value, "PX", milliseconds, *flags] for key, value in values.items()])
+
+    def _execute(self, commands: list) -> list:
+        """Send the commands in one pipeline and return their replies"""
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            connection = self._connect()
+        try:
+            connection[0].sendall(b"".join(_pack(command) for command in commands))
+            replies = [_read_reply(connection[1]) for _ in commands]
+        except Exception:
+            connection[0].close()
+            raise
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(connection)
+                connection = None
+        if connection is not None:
+            connection[0].close()
+        for reply in replies:
+            if isinstance(reply, CacheBackendError):
+                raise reply
+        return replies
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = (sock, sock.makefile("rb"))
+        setup = []
+        if self.password:
+            setup.append(["AUTH", self.password])
+        if self.database:
+            setup.append(["SELECT", self.database])
+        try:
+            if setup:
+                sock.sendall(b"".join(_pack(command) for command in setup))
+                for _ in setup:
+                    reply = _read_reply(connection[1])
+                    if isinstance(reply, CacheBackendError):
+                        raise reply
+        except Exception:
+            sock.close()
+            raise
+        return connection
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "server": f"{self.host}:{self.port}/{self.database}",
+            "idle_connections": len(self._idle),
+        }
+
+
+def _pack(command: list) -> bytes:
+    parts = [b"*%d\r\n" % len(command)]
+    for arg in command:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def _read_reply(stream):
+    line = stream.readline()
+    if not line.endswith(b"\r\n"):
+        raise CacheBackendError("Connection closed by cache server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        # Returned rather than raised, so the rest of the pipeline is still read
+        return CacheBackendError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        if len(data) != length + 2:
+            raise CacheBackendError("Connection closed by cache server")
+        return data[:-2]
+    if kind == b"*":
+        count = int(payload)
+        return None if count < 0 else [_read_reply(stream) for _ in range(count)]
+    raise CacheBackendError(f"Unexpected reply from cache server: {line!r}")
+
+
+def make_backend(name: str):
+    if name == "memory":
+        return MemoryBackend(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_MAX_BYTES)
+    if name == "redis":
+        return RedisBackend(RESPONSE_CACHE_REDIS_URL, RESPONSE_CACHE_REDIS_TIMEOUT, RESPONSE_CACHE_REDIS_POOL)
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND {name!r}: use memory, redis or none")
+
+
+class ResponseCache:
+    """Serves cached JSON responses and replaces tag tokens on invalidation"""
+
+    def __init__(self, backend, ttl: float, prefix: str):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # kind -> [hits, misses]
+        self._counters = {}
+        self.stores = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def serve(
+        self,
+        request: Request,
+        response: Response,
+        kind: str,
+        owner_id: int,
+        adapter: TypeAdapter,
+        load: Callable[[], object]
+    ):
+        """Return the cached response, or call load() and cache its result serialized with adapter"""
+        if self.backend is None:
+            return load()
+        key, tags = self._key(request), self._tags(kind, owner_id)
+        cached, tokens = self._lookup(kind, key, tags)
+        if cached is not None:
+            return cached
+        return self._store(key, tokens, adapter, load(), response)
+
+    async def serve_async(
+        self,
+        request: Request,
+        response: Response,
+        kind: str,
+        owner_id: int,
+        adapter: TypeAdapter,
+        load: Callable[[], Awaitable[object]]
+    ):
+        """serve() for async routes; backend calls run in the threadpool"""
+        if self.backend is None:
+            return await load()
+        key, tags = self._key(request), self._tags(kind, owner_id)
+        cached, tokens = await run_in_threadpool(self._lookup, kind, key, tags)
+        if cached is not None:
+            return cached
+        content = await load()
+        return await run_in_threadpool(self._store, key, tokens, adapter, content, response)
+
+    def _key(self, request: Request) -> str:
+        query = urlencode(sorted(request.query_params.multi_items()))
+        return f"{self.prefix}response:{request.url.path}?{query}"
+
+    def _tags(self, kind: str, owner_id: Optional[int] = None) -> List[str]:
+        tags = [f"{self.prefix}tag:{kind}"]
+        if owner_id is not None:
+            tags.append(f"{self.prefix}tag:{kind}:{owner_id}")
+        return tags
+
+    def _lookup(self, kind: str, key: str, tags: List[str]):
+        """(cached response or None, current tag tokens to store a fresh response under)"""
+        tokens = None
+        try:
+            values = self.backend.get_many([key, *tags])
+            entry, tokens = values[0], values[1:]
+            if entry is not None and None not in tokens:
+                meta, body = entry.split(b"\n", 1)
+                meta = json.loads(meta)
+                if meta["tokens"] == [token.decode() for token in tokens]:
+                    self._count(kind, hit=True)
+                    headers = dict(meta["headers"], **{CACHE_HEADER: "HIT"})
+                    return Response(content=body, media_type="application/json", headers=headers), tokens
+            missing = {tag: secrets.token_hex(8).encode() for tag, token in zip(tags, tokens) if token is None}
+            if missing:
+                # First read of a tag: give it a token, keeping one a concurrent reader set first
+                self.backend.set_many(missing, self.ttl, only_if_missing=True)
+                tokens = self.backend.get_many(tags)
+        except (OSError, CacheBackendError, ValueError):
+            self._count_error()
+            tokens = None
+        self._count(kind, hit=False)
+        return None, tokens
+
+    def _store(self, key: str, tokens: Optional[list], adapter: TypeAdapter, content, response: Response) -> Response:
+        body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+        headers = dict(response.headers.items())
+        if tokens and None not in tokens:
+            meta = json.dumps({"tokens": [token.decode() for token in tokens], "headers": headers})
+            try:
+                self.backend.set_many({key: meta.encode() + b"\n" + body}, self.ttl)
+                with self._lock:
+                    self.stores += 1
+            except (OSError, CacheBackendError):
+                self._count_error()
+        headers[CACHE_HEADER] = "MISS"
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def invalidate(self, changes):
+        """Replace the tokens of the (kind, owner_id) tags; owner_id None covers the whole kind"""
+        if self.backend is None:
+            return
+        fresh = {self._tags(kind, owner_id)[-1]: secrets.token_hex(8).encode() for kind, owner_id in changes}
+        try:
+            self.backend.set_many(fresh, self.ttl)
+            with self._lock:
+                self.invalidations += len(fresh)
+        except (OSError, CacheBackendError) as e:
+            # Entries under the old tokens stay servable until they expire
+            self._count_error()
+            print(f"Response cache invalidation failed: {e}")
+
+    def _count(self, kind: str, hit: bool):
+        with self._lock:
+            self._counters.setdefault(kind, [0, 0])[0 if hit else 1] += 1
+
+    def _count_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            kinds = {
+                kind: {"hits": hits, "misses": misses, "hit_ratio": round(hits / (hits + misses), 4)}
+                for kind, (hits, misses) in self._counters.items()
+            }
+        hits = sum(k["hits"] for k in kinds.values())
+        misses = sum(k["misses"] for k in kinds.values())
+        return {
+            **(self.backend.stats() if self.backend is not None else {"backend": "none"}),
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "kinds": kinds,
+        }
+
+
+response_cache = ResponseCache(make_backend(RESPONSE_CACHE_BACKEND), RESPONSE_CACHE_TTL, RESPONSE_CACHE_PREFIX)
+
+
+def mark_changed(db: Session, kind: str, *owner_ids: int):
+    """Invalidate these owners' cached responses of a kind after the session commits"""
+    db.info.setdefault(CHANGED_KEY, set()).update((kind, owner_id) for owner_id in owner_ids)
+
+
+def mark_all_changed(db: Session, kind: str):
+    """Invalidate every cached response of a kind after the session commits, for bulk writes"""
+    db.info.setdefault(CHANGED_KEY, set()).add((kind, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session):
+    changed = session.info.pop(CHANGED_KEY, None)
+    if changed:
+        response_cache.invalidate(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session):
+    session.info.pop(CHANGED_KEY, None)
@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+
+from database import get_db
+from schemas import AccrualPolicyCreate, AccrualPolicyResponse, AccrualRunResponse
+from pagination import keyset_cursor, set_next_cursor, id_key
+from accruals import run_accruals
+import crud
+
+router = APIRouter(prefix="/accruals", tags=["Accruals"])
+
+
+@router.post("/policies", response_model=AccrualPolicyResponse, status_code=status.HTTP_201_CREATED)
+def create_accrual_policy(policy: AccrualPolicyCreate, db: Session = Depends(get_db)):
+    """Create the accrual policy for a leave type"""
+    if not crud.get_leave_type_by_id(db, policy.type_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Leave type not found"
+        )
+    if crud.get_accrual_policy_by_type(db, policy.type_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Leave type already has an accrual policy"
+        )
+
+    new_policy = crud.create_accrual_policy(
+        db,
+        type_id=policy.type_id,
+        frequency=policy.frequency,
+        days_per_period=policy.days_per_period,
+        prorate=policy.prorate
+    )
+
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action="Created accrual policy",
+        target_table="accrual_policies",
+        target_id=new_policy.id
+    )
+
+    db.commit()
+    return new_policy
+
+
+@router.get("/policies", response_model=List[AccrualPolicyResponse])
+def get_accrual_policies(db: Session = Depends(get_db)):
+    """Get all accrual policies"""
+    return crud.get_accrual_policies(db)
+
+
+@router.delete("/policies/{policy_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_accrual_policy(policy_id: int, db: Session = Depends(get_db)):
+    """Delete an accrual policy; days already accrued are kept"""
+    if not crud.delete_accrual_policy(db, policy_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Accrual policy not found"
+        )
+
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action="Deleted accrual policy",
+        target_table="accrual_policies",
+        target_id=policy_id
+    )
+
+    db.commit()
+    return None
+
+
+@router.post("/run", response_model=List[AccrualRunResponse])
+def run_accrual_policies(
+    on: Optional[date] = None,
+    policy_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Accrue the period containing `on` (default today) for every policy, or just one"""
+    if policy_id is not None and not crud.get_accrual_policy_by_id(db, policy_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Accrual policy not found"
+        )
+
+    runs = run_accruals(db, on, [policy_id] if policy_id is not None else None)
+
+    for run in runs:
+        # Create audit log
+        crud.create_audit_log(
+            db,
+            actor_type="admin",
+            actor_id=1,  # This should come from authenticated admin
+            action="Ran leave accrual",
+            target_table="accrual_runs",
+            target_id=run.id
+        )
+
+    db.commit()
+    return runs
+
+
+@router.get("/runs", response_model=List[AccrualRunResponse])
+def get_accrual_runs(
+    response: Response,
+    policy_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: Session = Depends(get_db)
+):
+    """Get past accrual runs, oldest first"""
+    runs = crud.get_accrual_runs(db, policy_id=policy_id, skip=skip, limit=limit, after=after)
+    set_next_cursor(response, runs, limit, id_key)
+    return runs
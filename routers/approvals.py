@@ -1,13 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+import os
 
-from database import get_db
-from schemas import ApprovalCreate, ApprovalResponse
+from database import get_db, get_async_db
+from schemas import (
+    ApprovalCreate, ApprovalResponse, BulkDecisionRequest, BulkDecisionResponse, ClaimRelease, ClaimReleaseResponse, LeaveResponse
+)
+from pagination import keyset_cursor, set_next_cursor, id_key
+from response_cache import APPROVALS, response_cache
+from workdays import working_days
 import crud
+import crud_async
 
 router = APIRouter(prefix="/approvals", tags=["Approvals"])
 
+# Same routes served from the async engine (DB_MODE=async)
+async_router = APIRouter(prefix="/approvals", tags=["Approvals"])
+
+approval_list = TypeAdapter(List[ApprovalResponse])
+
+# How long a claimed leave stays reserved for one manager
+CLAIM_LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", "900"))
+
 
 @router.post("/", response_model=ApprovalResponse, status_code=status.HTTP_201_CREATED)
 def create_approval(approval: ApprovalCreate, manager_id: int, db: Session = Depends(get_db)):
@@ -20,8 +38,8 @@ def create_approval(approval: ApprovalCreate, manager_id: int, db: Session = Dep
             detail="Manager not found"
         )
     
-    # Verify leave exists
-    leave = crud.get_leave_by_id(db, approval.leave_id)
+    # Verify leave exists, locking it until this decision commits
+    leave = crud.get_leave_for_update(db, approval.leave_id)
     if not leave:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -35,6 +53,13 @@ def create_approval(approval: ApprovalCreate, manager_id: int, db: Session = Dep
             detail="Leave request has already been processed"
         )
     
+    # Leaves leased to another manager's queue are theirs until the lease runs out
+    if leave.claimed_by not in (None, manager_id) and leave.claim_expires_at > datetime.now():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Leave request is claimed by another manager"
+        )
+    
     # Validate decision
     if approval.decision not in ["approved", "rejected"]:
         raise HTTPException(
@@ -42,6 +67,16 @@ def create_approval(approval: ApprovalCreate, manager_id: int, db: Session = Dep
             detail="Decision must be 'approved' or 'rejected'"
         )
     
+    # Teams with a coverage policy must keep min_present members at work every day
+    if approval.decision == "approved":
+        conflicts = crud.coverage_conflicts(db, [leave])
+        if conflicts:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=conflicts[leave.id]
+            )
+    
     # Create approval
     new_approval = crud.create_approval(
         db,
@@ -50,10 +85,22 @@ def create_approval(approval: ApprovalCreate, manager_id: int, db: Session = Dep
         decision=approval.decision
     )
     
-    # If approved, update leave balance
+    # The decision settles the days reserved when the leave was filed
+    reserved = leave.days or 0
     if approval.decision == "approved":
-        days = (leave.end_time - leave.start_time).days + 1
-        crud.update_leave_balance(db, leave.employee_id, leave.type_id, days)
+        days = leave.days
+        if days is None:
+            # Filed before reservations were recorded
+            employee = crud.get_employee_by_id(db, leave.employee_id)
+            days = working_days(db, employee.region, leave.start_time, leave.end_time)
+        if not crud.update_leave_balance(db, leave.employee_id, leave.type_id, days, release_reserved=reserved, leave_id=leave.id):
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient leave balance to approve this request"
+            )
+    elif reserved:
+        crud.release_leave_days(db, leave.employee_id, leave.type_id, reserved)
     
     # Create audit log
     crud.create_audit_log(
@@ -65,14 +112,74 @@ def create_approval(approval: ApprovalCreate, manager_id: int, db: Session = Dep
         target_id=new_approval.id
     )
     
+    db.commit()
     return new_approval
 
 
+@router.post("/bulk", response_model=BulkDecisionResponse)
+def create_approvals_bulk(bulk: BulkDecisionRequest, manager_id: int, db: Session = Depends(get_db)):
+    """Approve or reject many leave requests at once; each item reports its own outcome"""
+    if not crud.get_manager_by_id(db, manager_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Manager not found"
+        )
+    
+    results = crud.decide_leaves(db, manager_id, [(d.leave_id, d.decision) for d in bulk.decisions])
+    db.commit()
+    decided = [r for r in results if r["approval_id"] is not None]
+    return {
+        "approved": sum(1 for r in decided if r["decision"] == "approved"),
+        "rejected": sum(1 for r in decided if r["decision"] == "rejected"),
+        "failed": len(results) - len(decided),
+        "results": results,
+    }
+
+
+@router.post("/claim", response_model=List[LeaveResponse])
+def claim_leaves(manager_id: int, n: int = Query(20, ge=1, le=100), db: Session = Depends(get_db)):
+    """Lease up to n pending leaves to the manager's work queue"""
+    if not crud.get_manager_by_id(db, manager_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Manager not found"
+        )
+    
+    leaves = crud.claim_pending_leaves(db, manager_id, n, CLAIM_LEASE_SECONDS)
+    db.commit()
+    return leaves
+
+
+@router.get("/claimed", response_model=List[LeaveResponse])
+def get_claimed_leaves(manager_id: int, db: Session = Depends(get_db)):
+    """Get the pending leaves currently leased to a manager"""
+    return crud.get_claimed_leaves(db, manager_id)
+
+
+@router.post("/release", response_model=ClaimReleaseResponse)
+def release_leaves(manager_id: int, release: Optional[ClaimRelease] = None, db: Session = Depends(get_db)):
+    """Hand claimed leaves back to the queue"""
+    released = crud.release_claims(db, manager_id, release.leave_ids if release else None)
+    db.commit()
+    return {"released": released}
+
+
 @router.get("/manager/{manager_id}", response_model=List[ApprovalResponse])
-def get_manager_approvals(manager_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_manager_approvals(
+    manager_id: int,
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: Session = Depends(get_db)
+):
     """Get all approvals made by a specific manager"""
-    approvals = crud.get_approvals_by_manager(db, manager_id, skip=skip, limit=limit)
-    return approvals
+    def load():
+        approvals = crud.get_approvals_by_manager(db, manager_id, skip=skip, limit=limit, after=after)
+        set_next_cursor(response, approvals, limit, id_key)
+        return approvals
+    return response_cache.serve(request, response, APPROVALS, manager_id, approval_list, load)
 
 
 @router.get("/leave/{leave_id}", response_model=ApprovalResponse)
@@ -85,3 +192,64 @@ def get_leave_approval(leave_id: int, db: Session = Depends(get_db)):
             detail="No approval found for this leave request"
         )
     return approval
+
+
+# ============== Async Routes ==============
+@async_router.post("/", response_model=ApprovalResponse, status_code=status.HTTP_201_CREATED)
+async def create_approval_async(approval: ApprovalCreate, manager_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Create an approval decision for a leave request"""
+    return await db.run_sync(lambda session: create_approval(approval, manager_id, session))
+
+
+@async_router.post("/bulk", response_model=BulkDecisionResponse)
+async def create_approvals_bulk_async(bulk: BulkDecisionRequest, manager_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Approve or reject many leave requests at once; each item reports its own outcome"""
+    return await db.run_sync(lambda session: create_approvals_bulk(bulk, manager_id, session))
+
+
+@async_router.post("/claim", response_model=List[LeaveResponse])
+async def claim_leaves_async(manager_id: int, n: int = Query(20, ge=1, le=100), db: AsyncSession = Depends(get_async_db)):
+    """Lease up to n pending leaves to the manager's work queue"""
+    return await db.run_sync(lambda session: claim_leaves(manager_id, n, session))
+
+
+@async_router.get("/claimed", response_model=List[LeaveResponse])
+async def get_claimed_leaves_async(manager_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get the pending leaves currently leased to a manager"""
+    return await crud_async.get_claimed_leaves(db, manager_id)
+
+
+@async_router.post("/release", response_model=ClaimReleaseResponse)
+async def release_leaves_async(manager_id: int, release: Optional[ClaimRelease] = None, db: AsyncSession = Depends(get_async_db)):
+    """Hand claimed leaves back to the queue"""
+    return await db.run_sync(lambda session: release_leaves(manager_id, release, session))
+
+
+@async_router.get("/manager/{manager_id}", response_model=List[ApprovalResponse])
+async def get_manager_approvals_async(
+    manager_id: int,
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all approvals made by a specific manager"""
+    async def load():
+        approvals = await crud_async.get_approvals_by_manager(db, manager_id, skip=skip, limit=limit, after=after)
+        set_next_cursor(response, approvals, limit, id_key)
+        return approvals
+    return await response_cache.serve_async(request, response, APPROVALS, manager_id, approval_list, load)
+
+
+@async_router.get("/leave/{leave_id}", response_model=ApprovalResponse)
+async def get_leave_approval_async(leave_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get approval for a specific leave request"""
+    approval = await crud_async.get_approval_by_leave_id(db, leave_id)
+    if not approval:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No approval found for this leave request"
+        )
+    return approval
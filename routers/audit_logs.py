@@ -1,18 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
 
-from database import get_db
+from database import get_db, get_async_db
 from schemas import AuditLogResponse
+from pagination import keyset_cursor, set_next_cursor, timestamp_id_key
 import crud
+import crud_async
 
 router = APIRouter(prefix="/audit-logs", tags=["Audit Logs"])
 
+# Same routes served from the async engine (DB_MODE=async)
+async_router = APIRouter(prefix="/audit-logs", tags=["Audit Logs"])
+
 
 @router.get("/", response_model=List[AuditLogResponse])
-def get_all_audit_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all audit logs"""
-    logs = crud.get_audit_logs(db, skip=skip, limit=limit)
+def get_all_audit_logs(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(datetime, int)),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """Get all audit logs, optionally within a [start, end) time window"""
+    logs = crud.get_audit_logs(db, skip=skip, limit=limit, after=after, start=start, end=end)
+    set_next_cursor(response, logs, limit, timestamp_id_key)
     return logs
 
 
@@ -20,16 +36,62 @@ def get_all_audit_logs(skip: int = 0, limit: int = 100, db: Session = Depends(ge
 def get_audit_logs_by_actor(
     actor_type: str, 
     actor_id: int, 
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
+    after: Optional[tuple] = Depends(keyset_cursor(datetime, int)),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
     db: Session = Depends(get_db)
 ):
-    """Get audit logs for a specific actor"""
+    """Get audit logs for a specific actor, optionally within a [start, end) time window"""
+    if actor_type not in ["admin", "manager", "employee"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid actor type. Must be 'admin', 'manager', or 'employee'"
+        )
+    
+    logs = crud.get_audit_logs_by_actor(db, actor_type, actor_id, skip=skip, limit=limit, after=after, start=start, end=end)
+    set_next_cursor(response, logs, limit, timestamp_id_key)
+    return logs
+
+
+# ============== Async Routes ==============
+@async_router.get("/", response_model=List[AuditLogResponse])
+async def get_all_audit_logs_async(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(datetime, int)),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all audit logs, optionally within a [start, end) time window"""
+    logs = await crud_async.get_audit_logs(db, skip=skip, limit=limit, after=after, start=start, end=end)
+    set_next_cursor(response, logs, limit, timestamp_id_key)
+    return logs
+
+
+@async_router.get("/actor/{actor_type}/{actor_id}", response_model=List[AuditLogResponse])
+async def get_audit_logs_by_actor_async(
+    actor_type: str, 
+    actor_id: int, 
+    response: Response,
+    skip: int = 0, 
+    limit: int = 100, 
+    after: Optional[tuple] = Depends(keyset_cursor(datetime, int)),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get audit logs for a specific actor, optionally within a [start, end) time window"""
     if actor_type not in ["admin", "manager", "employee"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid actor type. Must be 'admin', 'manager', or 'employee'"
         )
     
-    logs = crud.get_audit_logs_by_actor(db, actor_type, actor_id, skip=skip, limit=limit)
+    logs = await crud_async.get_audit_logs_by_actor(db, actor_type, actor_id, skip=skip, limit=limit, after=after, start=start, end=end)
+    set_next_cursor(response, logs, limit, timestamp_id_key)
     return logs
@@ -1,11 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timedelta
 import os
+import uuid
 
 from database import get_db
-from schemas import LoginRequest, Token, AdminCreate, AdminResponse
-from auth import verify_password, create_access_token
+from schemas import LoginRequest, Token, RefreshRequest, CurrentUserResponse, AdminCreate, AdminResponse
+from auth import (
+    create_access_token, generate_refresh_token, hash_refresh_token,
+    REFRESH_TOKEN_EXPIRE_DAYS
+)
+from models import RefreshToken
+from dependencies import get_current_user
+from principal_cache import Principal
+from hashing import check_password
+from throttle import throttle_login
 import crud
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -15,9 +26,49 @@ ADMIN_EMAIL = os.getenv("EMAIL", "").strip('"')
 ADMIN_PASSWORD = os.getenv("PASS", "").strip('"')
 
 
+def issue_tokens(
+    db: Session,
+    user_type: str,
+    user_id: int,
+    email: str,
+    replaces: Optional[RefreshToken] = None
+) -> dict:
+    """Mint an access token and a new refresh token, rotating out `replaces` if given"""
+    refresh_token = generate_refresh_token()
+    stored = crud.create_refresh_token(
+        db,
+        token_hash=hash_refresh_token(refresh_token),
+        user_type=user_type,
+        user_id=user_id,
+        email=email,
+        family_id=replaces.family_id if replaces else uuid.uuid4().hex,
+        expires_at=datetime.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    if replaces:
+        replaces.revoked_at = datetime.now()
+        replaces.replaced_by_id = stored.id
+    db.commit()
+    
+    access_token = create_access_token(
+        data={"sub": email, "user_type": user_type, "user_id": user_id}
+    )
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+def account_exists(db: Session, user_type: str, user_id: int, email: str) -> bool:
+    if user_type == "admin":
+        return email == ADMIN_EMAIL
+    if user_type == "employee":
+        return crud.get_employee_by_id(db, user_id) is not None
+    if user_type == "manager":
+        return crud.get_manager_by_id(db, user_id) is not None
+    return False
+
+
 @router.post("/login/admin", response_model=Token)
-def login_admin(login_data: LoginRequest, db: Session = Depends(get_db)):
+def login_admin(login_data: LoginRequest, request: Request, db: Session = Depends(get_db)):
     """Admin login endpoint - uses credentials from environment variables"""
+    throttle_login(request, login_data.email)
     # Check against environment variables
     if login_data.email != ADMIN_EMAIL or login_data.password != ADMIN_PASSWORD:
         raise HTTPException(
@@ -25,44 +76,74 @@ def login_admin(login_data: LoginRequest, db: Session = Depends(get_db)):
             detail="Incorrect email or password"
         )
     
-    access_token = create_access_token(
-        data={"sub": ADMIN_EMAIL, "user_type": "admin", "user_id": 1}
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_tokens(db, "admin", 1, ADMIN_EMAIL)
 
 
 @router.post("/login/employee", response_model=Token)
-def login_employee(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login_employee(login_data: LoginRequest, request: Request, db: Session = Depends(get_db)):
     """Employee login endpoint"""
-    employee = crud.get_employee_by_email(db, login_data.email)
+    throttle_login(request, login_data.email)
+    employee = await run_in_threadpool(crud.get_employee_by_email, db, login_data.email)
     
-    if not employee or not verify_password(login_data.password, employee.password_hash):
+    if not employee or not await check_password(login_data.password, employee.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
-    access_token = create_access_token(
-        data={"sub": employee.email, "user_type": "employee", "user_id": employee.id}
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await run_in_threadpool(issue_tokens, db, "employee", employee.id, employee.email)
 
 
 @router.post("/login/manager", response_model=Token)
-def login_manager(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login_manager(login_data: LoginRequest, request: Request, db: Session = Depends(get_db)):
     """Manager login endpoint"""
-    manager = crud.get_manager_by_email(db, login_data.email)
+    throttle_login(request, login_data.email)
+    manager = await run_in_threadpool(crud.get_manager_by_email, db, login_data.email)
     
-    if not manager or not verify_password(login_data.password, manager.password_hash):
+    if not manager or not await check_password(login_data.password, manager.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
-    access_token = create_access_token(
-        data={"sub": manager.email, "user_type": "manager", "user_id": manager.id}
+    return await run_in_threadpool(issue_tokens, db, "manager", manager.id, manager.email)
+
+
+@router.post("/refresh", response_model=Token)
+def refresh(refresh_data: RefreshRequest, db: Session = Depends(get_db)):
+    """Exchange a refresh token for a new access token and a rotated refresh token"""
+    stored = crud.get_refresh_token_for_update(db, hash_refresh_token(refresh_data.refresh_token))
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token"
     )
+    if not stored or stored.expires_at <= datetime.now():
+        raise invalid
+    
+    if stored.revoked_at is not None:
+        # A rotated token came back: assume it was stolen and end the whole session
+        crud.revoke_refresh_token_family(db, stored.family_id)
+        db.commit()
+        raise invalid
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    if not account_exists(db, stored.user_type, stored.user_id, stored.email):
+        crud.revoke_refresh_token_family(db, stored.family_id)
+        db.commit()
+        raise invalid
+    
+    return issue_tokens(db, stored.user_type, stored.user_id, stored.email, replaces=stored)
+
+
+@router.post("/revoke", status_code=status.HTTP_204_NO_CONTENT)
+def revoke(refresh_data: RefreshRequest, db: Session = Depends(get_db)):
+    """Revoke a refresh token and every token rotated from the same login"""
+    stored = crud.get_refresh_token_for_update(db, hash_refresh_token(refresh_data.refresh_token))
+    if stored:
+        crud.revoke_refresh_token_family(db, stored.family_id)
+        db.commit()
+
+
+@router.get("/me", response_model=CurrentUserResponse)
+async def read_current_user(current_user: Principal = Depends(get_current_user)):
+    """Get the account behind the bearer token"""
+    return current_user
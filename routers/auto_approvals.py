@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+
+from database import get_db
+from schemas import AutoApprovalRuleCreate, AutoApprovalRuleResponse, AutoApprovalReport
+from auto_approvals import sweep
+import crud
+
+router = APIRouter(prefix="/auto-approvals", tags=["Auto-Approvals"])
+
+
+@router.post("/rules", response_model=AutoApprovalRuleResponse, status_code=status.HTTP_201_CREATED)
+def create_auto_approval_rule(rule: AutoApprovalRuleCreate, db: Session = Depends(get_db)):
+    """Create an auto-approval rule"""
+    if not crud.get_manager_by_id(db, rule.approver_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Manager not found"
+        )
+    if rule.type_id is not None and not crud.get_leave_type_by_id(db, rule.type_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Leave type not found"
+        )
+    if rule.team_id is not None and not crud.get_team_by_id(db, rule.team_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+
+    new_rule = crud.create_auto_approval_rule(db, **rule.model_dump())
+
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action="Created auto-approval rule",
+        target_table="auto_approval_rules",
+        target_id=new_rule.id
+    )
+
+    db.commit()
+    return new_rule
+
+
+@router.get("/rules", response_model=List[AutoApprovalRuleResponse])
+def get_auto_approval_rules(db: Session = Depends(get_db)):
+    """Get all auto-approval rules"""
+    return crud.get_auto_approval_rules(db)
+
+
+@router.put("/rules/{rule_id}", response_model=AutoApprovalRuleResponse)
+def set_auto_approval_rule_enabled(rule_id: int, enabled: bool, db: Session = Depends(get_db)):
+    """Pause or resume an auto-approval rule"""
+    rule = crud.set_auto_approval_rule_enabled(db, rule_id, enabled)
+    if not rule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Auto-approval rule not found"
+        )
+
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action=f"{'Enabled' if enabled else 'Disabled'} auto-approval rule",
+        target_table="auto_approval_rules",
+        target_id=rule_id
+    )
+
+    db.commit()
+    return rule
+
+
+@router.delete("/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_auto_approval_rule(rule_id: int, db: Session = Depends(get_db)):
+    """Delete an auto-approval rule; leaves it approved stay approved"""
+    if not crud.delete_auto_approval_rule(db, rule_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Auto-approval rule not found"
+        )
+
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action="Deleted auto-approval rule",
+        target_table="auto_approval_rules",
+        target_id=rule_id
+    )
+
+    db.commit()
+    return None
+
+
+@router.post("/run", response_model=AutoApprovalReport)
+def run_auto_approvals(db: Session = Depends(get_db)):
+    """Sweep the pending queue with the enabled rules now"""
+    return sweep(db)
@@ -1,26 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from database import get_db
 from schemas import EmployeeCreate, EmployeeUpdate, EmployeeResponse
+from hashing import hash_password
+from pagination import keyset_cursor, set_next_cursor, id_key
 import crud
 
 router = APIRouter(prefix="/employees", tags=["Employees"])
 
 
 @router.post("/", response_model=EmployeeResponse, status_code=status.HTTP_201_CREATED)
-def create_employee(employee: EmployeeCreate, db: Session = Depends(get_db)):
+async def create_employee(employee: EmployeeCreate, db: Session = Depends(get_db)):
     """Create a new employee"""
     # Check if employee already exists
-    existing_employee = crud.get_employee_by_email(db, employee.email)
+    existing_employee = await run_in_threadpool(crud.get_employee_by_email, db, employee.email)
     if existing_employee:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Employee with this email already exists"
         )
+    if employee.team_id is not None and not await run_in_threadpool(crud.get_team_by_id, db, employee.team_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
     
-    new_employee = crud.create_employee(db, employee.name, employee.email, employee.password)
+    # Hash in the process pool, then do the DB work on a threadpool thread
+    password_hash = await hash_password(employee.password)
+    return await run_in_threadpool(_insert_employee, db, employee, password_hash)
+
+
+def _insert_employee(db: Session, employee: EmployeeCreate, password_hash: str):
+    new_employee = crud.create_employee(db, employee.name, employee.email, password_hash, employee.region, employee.team_id)
     
     # Create audit log
     crud.create_audit_log(
@@ -32,13 +46,21 @@ def create_employee(employee: EmployeeCreate, db: Session = Depends(get_db)):
         target_id=new_employee.id
     )
     
+    db.commit()
     return new_employee
 
 
 @router.get("/", response_model=List[EmployeeResponse])
-def get_all_employees(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_all_employees(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: Session = Depends(get_db)
+):
     """Get all employees"""
-    employees = crud.get_all_employees(db, skip=skip, limit=limit)
+    employees = crud.get_all_employees(db, skip=skip, limit=limit, after=after)
+    set_next_cursor(response, employees, limit, id_key)
     return employees
 
 
@@ -57,7 +79,15 @@ def get_employee(employee_id: int, db: Session = Depends(get_db)):
 @router.put("/{employee_id}", response_model=EmployeeResponse)
 def update_employee(employee_id: int, employee_data: EmployeeUpdate, db: Session = Depends(get_db)):
     """Update employee information"""
-    employee = crud.update_employee(db, employee_id, employee_data.name, employee_data.email)
+    if employee_data.team_id is not None and not crud.get_team_by_id(db, employee_data.team_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+    
+    employee = crud.update_employee(
+        db, employee_id, employee_data.name, employee_data.email, employee_data.region, employee_data.team_id
+    )
     
     if not employee:
         raise HTTPException(
@@ -75,6 +105,7 @@ def update_employee(employee_id: int, employee_data: EmployeeUpdate, db: Session
         target_id=employee_id
     )
     
+    db.commit()
     return employee
 
 
@@ -99,4 +130,5 @@ def delete_employee(employee_id: int, db: Session = Depends(get_db)):
         target_id=employee_id
     )
     
+    db.commit()
     return None
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+
+from database import get_db
+from schemas import HolidayCreate, HolidayResponse, WorkingDaysRequest, WorkingDaysResponse
+from workdays import DEFAULT_REGION, working_days_batch
+import crud
+
+router = APIRouter(prefix="/holidays", tags=["Holidays"])
+
+
+@router.post("/", response_model=HolidayResponse, status_code=status.HTTP_201_CREATED)
+def create_holiday(holiday: HolidayCreate, db: Session = Depends(get_db)):
+    """Add a public holiday to a region's calendar"""
+    if crud.get_holiday_by_date(db, holiday.region, holiday.date):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{holiday.region} already has a holiday on {holiday.date}"
+        )
+
+    new_holiday = crud.create_holiday(db, holiday.region, holiday.date, holiday.name)
+
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action="Created holiday",
+        target_table="holidays",
+        target_id=new_holiday.id
+    )
+
+    db.commit()
+    return new_holiday
+
+
+@router.get("/", response_model=List[HolidayResponse])
+def get_holidays(region: str = DEFAULT_REGION, db: Session = Depends(get_db)):
+    """Get a region's holidays"""
+    return crud.get_holidays_by_region(db, region)
+
+
+@router.post("/working-days", response_model=WorkingDaysResponse)
+def count_working_days(request: WorkingDaysRequest, db: Session = Depends(get_db)):
+    """Count working days (start and end inclusive) for a batch of periods"""
+    periods = request.periods
+    days = working_days_batch(
+        db,
+        [p.region for p in periods],
+        [p.start for p in periods],
+        [p.end for p in periods]
+    )
+    return {"days": days.tolist()}
+
+
+@router.delete("/{holiday_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_holiday(holiday_id: int, db: Session = Depends(get_db)):
+    """Remove a holiday"""
+    if not crud.delete_holiday(db, holiday_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Holiday not found"
+        )
+
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action="Deleted holiday",
+        target_table="holidays",
+        target_id=holiday_id
+    )
+
+    db.commit()
+    return None
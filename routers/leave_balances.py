@@ -1,13 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date
 
-from database import get_db
-from schemas import LeaveBalanceCreate, LeaveBalanceResponse, LeaveBalanceUpdate
+from database import get_db, get_async_db
+from schemas import (
+    LeaveBalanceCreate, LeaveBalanceResponse, LeaveBalanceUpdate,
+    LedgerEntryResponse, BalanceAsOfResponse, CarryForwardReport, ReconcileReport
+)
+from pagination import keyset_cursor, set_next_cursor, id_key
+from carry_forward import carry_forward
+from reconcile import reconcile
+from response_cache import BALANCES, response_cache
 import crud
+import crud_async
 
 router = APIRouter(prefix="/leave-balances", tags=["Leave Balances"])
 
+# Same routes served from the async engine (DB_MODE=async)
+async_router = APIRouter(prefix="/leave-balances", tags=["Leave Balances"])
+
+balance_list = TypeAdapter(List[LeaveBalanceResponse])
+
 
 @router.post("/", response_model=LeaveBalanceResponse, status_code=status.HTTP_201_CREATED)
 def create_leave_balance(balance: LeaveBalanceCreate, db: Session = Depends(get_db)):
@@ -45,14 +61,51 @@ def create_leave_balance(balance: LeaveBalanceCreate, db: Session = Depends(get_
         target_id=new_balance.id
     )
     
+    db.commit()
     return new_balance
 
 
 @router.get("/employee/{employee_id}", response_model=List[LeaveBalanceResponse])
-def get_employee_leave_balances(employee_id: int, db: Session = Depends(get_db)):
+def get_employee_leave_balances(employee_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get all leave balances for a specific employee"""
-    balances = crud.get_leave_balances_by_employee(db, employee_id)
-    return balances
+    return response_cache.serve(
+        request, response, BALANCES, employee_id, balance_list,
+        lambda: crud.get_leave_balances_by_employee(db, employee_id)
+    )
+
+
+@router.get("/employee/{employee_id}/ledger", response_model=List[LedgerEntryResponse])
+def get_employee_ledger(
+    employee_id: int,
+    response: Response,
+    type_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: Session = Depends(get_db)
+):
+    """Get an employee's ledger entries, oldest first"""
+    entries = crud.get_ledger_entries(db, employee_id, type_id=type_id, skip=skip, limit=limit, after=after)
+    set_next_cursor(response, entries, limit, id_key)
+    return entries
+
+
+@router.get("/employee/{employee_id}/as-of", response_model=List[BalanceAsOfResponse])
+def get_employee_balances_as_of(employee_id: int, as_of: date, db: Session = Depends(get_db)):
+    """Get an employee's balances as they stood at the end of a given date"""
+    return crud.get_balances_as_of(db, employee_id, as_of)
+
+
+@router.get("/carry-forward/preview", response_model=CarryForwardReport)
+def preview_carry_forward(year: Optional[int] = None, db: Session = Depends(get_db)):
+    """Project the year-end carry-forward without applying it (run it with carry_forward.py)"""
+    return carry_forward(db, year, dry_run=True)
+
+
+@router.post("/reconcile", response_model=ReconcileReport)
+def reconcile_balances(repair: bool = False, db: Session = Depends(get_db)):
+    """Compare every balance's used days with its approved leaves, optionally fixing the drift"""
+    return reconcile(db, repair=repair)
 
 
 @router.get("/{balance_id}", response_model=LeaveBalanceResponse)
@@ -65,3 +118,70 @@ def get_leave_balance(balance_id: int, db: Session = Depends(get_db)):
             detail="Leave balance not found"
         )
     return balance
+
+
+# ============== Async Routes ==============
+@async_router.post("/", response_model=LeaveBalanceResponse, status_code=status.HTTP_201_CREATED)
+async def create_leave_balance_async(balance: LeaveBalanceCreate, db: AsyncSession = Depends(get_async_db)):
+    """Create a new leave balance for an employee"""
+    return await db.run_sync(lambda session: create_leave_balance(balance, session))
+
+
+@async_router.get("/employee/{employee_id}", response_model=List[LeaveBalanceResponse])
+async def get_employee_leave_balances_async(
+    employee_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all leave balances for a specific employee"""
+    return await response_cache.serve_async(
+        request, response, BALANCES, employee_id, balance_list,
+        lambda: crud_async.get_leave_balances_by_employee(db, employee_id)
+    )
+
+
+@async_router.get("/employee/{employee_id}/ledger", response_model=List[LedgerEntryResponse])
+async def get_employee_ledger_async(
+    employee_id: int,
+    response: Response,
+    type_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get an employee's ledger entries, oldest first"""
+    entries = await crud_async.get_ledger_entries(db, employee_id, type_id=type_id, skip=skip, limit=limit, after=after)
+    set_next_cursor(response, entries, limit, id_key)
+    return entries
+
+
+@async_router.get("/employee/{employee_id}/as-of", response_model=List[BalanceAsOfResponse])
+async def get_employee_balances_as_of_async(employee_id: int, as_of: date, db: AsyncSession = Depends(get_async_db)):
+    """Get an employee's balances as they stood at the end of a given date"""
+    return await db.run_sync(lambda session: crud.get_balances_as_of(session, employee_id, as_of))
+
+
+@async_router.get("/carry-forward/preview", response_model=CarryForwardReport)
+async def preview_carry_forward_async(year: Optional[int] = None, db: AsyncSession = Depends(get_async_db)):
+    """Project the year-end carry-forward without applying it (run it with carry_forward.py)"""
+    return await db.run_sync(lambda session: carry_forward(session, year, dry_run=True))
+
+
+@async_router.post("/reconcile", response_model=ReconcileReport)
+async def reconcile_balances_async(repair: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """Compare every balance's used days with its approved leaves, optionally fixing the drift"""
+    return await db.run_sync(lambda session: reconcile(session, repair=repair))
+
+
+@async_router.get("/{balance_id}", response_model=LeaveBalanceResponse)
+async def get_leave_balance_async(balance_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get leave balance by ID"""
+    balance = await crud_async.get_leave_balance_by_id(db, balance_id)
+    if not balance:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Leave balance not found"
+        )
+    return balance
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List
+import os
 
 from database import get_db
-from schemas import LeaveTypeCreate, LeaveTypeResponse
+from leave_type_cache import leave_type_cache
+from schemas import LeaveTypeCreate, LeaveTypeResponse, LeaveTypeUpdate
 import crud
 
+# Seconds clients may reuse the list before revalidating it with If-None-Match
+LEAVE_TYPES_MAX_AGE = int(os.getenv("LEAVE_TYPES_MAX_AGE", "60"))
+
 router = APIRouter(prefix="/leave-types", tags=["Leave Types"])
 
 
@@ -19,7 +24,7 @@ def create_leave_type(leave_type: LeaveTypeCreate, db: Session = Depends(get_db)
             detail="Leave type name cannot be only numbers"
         )
     
-    new_leave_type = crud.create_leave_type(db, leave_type.name)
+    new_leave_type = crud.create_leave_type(db, leave_type.name, leave_type.carry_forward_cap)
     
     # Create audit log
     crud.create_audit_log(
@@ -31,13 +36,19 @@ def create_leave_type(leave_type: LeaveTypeCreate, db: Session = Depends(get_db)
         target_id=new_leave_type.id
     )
     
+    db.commit()
     return new_leave_type
 
 
 @router.get("/", response_model=List[LeaveTypeResponse])
-def get_all_leave_types(db: Session = Depends(get_db)):
-    """Get all leave types"""
-    leave_types = crud.get_all_leave_types(db)
+def get_all_leave_types(request: Request, response: Response, db: Session = Depends(get_db)):
+    """Get all leave types; answers 304 when the client's ETag is still current"""
+    leave_types, etag = leave_type_cache.snapshot(db)
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={LEAVE_TYPES_MAX_AGE}"}
+    client_tags = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in client_tags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
     return leave_types
 
 
@@ -53,6 +64,36 @@ def get_leave_type(type_id: int, db: Session = Depends(get_db)):
     return leave_type
 
 
+@router.put("/{type_id}", response_model=LeaveTypeResponse)
+def update_leave_type(type_id: int, leave_type_data: LeaveTypeUpdate, db: Session = Depends(get_db)):
+    """Rename a leave type or change its carry-forward cap"""
+    if leave_type_data.name and leave_type_data.name.isdigit():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Leave type name cannot be only numbers"
+        )
+    
+    leave_type = crud.update_leave_type(db, type_id, leave_type_data.name, leave_type_data.carry_forward_cap)
+    if not leave_type:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Leave type not found"
+        )
+    
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action="Updated leave type",
+        target_table="leave_types",
+        target_id=type_id
+    )
+    
+    db.commit()
+    return leave_type
+
+
 @router.delete("/{type_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_leave_type(type_id: int, db: Session = Depends(get_db)):
     """Delete a leave type"""
@@ -80,4 +121,5 @@ def delete_leave_type(type_id: int, db: Session = Depends(get_db)):
         target_id=type_id
     )
     
+    db.commit()
     return None
@@ -1,71 +1,106 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
 
-from database import get_db
+from database import get_db, get_async_db
 from schemas import LeaveCreate, LeaveResponse, LeaveUpdate
+from pagination import keyset_cursor, set_next_cursor, id_key
+from response_cache import LEAVES, response_cache
+from workdays import working_days
 import crud
+import crud_async
 
 router = APIRouter(prefix="/leaves", tags=["Leaves"])
 
+# Same routes served from the async engine (DB_MODE=async)
+async_router = APIRouter(prefix="/leaves", tags=["Leaves"])
+
+leave_list = TypeAdapter(List[LeaveResponse])
+
+
+def overlap_error(conflict) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Leave overlaps leave {conflict.id} ({conflict.start_time} to {conflict.end_time}, {conflict.status})"
+    )
+
+
+def check_period(start_time: datetime, end_time: datetime):
+    if start_time >= end_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Start time must be before end time"
+        )
+
 
 @router.post("/", response_model=LeaveResponse, status_code=status.HTTP_201_CREATED)
 def create_leave(leave: LeaveCreate, employee_id: int, db: Session = Depends(get_db)):
     """Create a new leave request"""
-    from models import LeaveBalance
+    # Validate dates first: an inverted range is not a valid tsrange
+    check_period(leave.start_time, leave.end_time)
     
-    # Verify employee exists
-    employee = crud.get_employee_by_id(db, employee_id)
-    if not employee:
+    # Employee, leave type, balance and the first overlapping leave in one query
+    context = crud.get_leave_context(db, employee_id, leave.type_id, leave.start_time, leave.end_time)
+    if not context:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Employee not found"
         )
+    employee, leave_type, leave_balance, conflict_id = context
     
-    # Verify leave type exists
-    leave_type = crud.get_leave_type_by_id(db, leave.type_id)
     if not leave_type:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Leave type not found"
         )
     
-    # Check leave balance
-    leave_balance = db.query(LeaveBalance).filter(
-        LeaveBalance.employee_id == employee_id,
-        LeaveBalance.type_id == leave.type_id
-    ).first()
-    
     if not leave_balance:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"No leave balance found for {leave_type.name}. Please contact HR."
         )
     
-    # Calculate requested days
-    requested_days = (leave.end_time - leave.start_time).days + 1
-    
-    if leave_balance.remaining < requested_days:
+    # Calculate requested working days (holiday calendars are cached in memory)
+    requested_days = working_days(db, employee.region, leave.start_time, leave.end_time)
+    if requested_days == 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Insufficient leave balance. You have {leave_balance.remaining} days remaining for {leave_type.name}, but requested {requested_days} days."
+            detail="Leave period contains no working days"
         )
     
-    # Validate dates
-    if leave.start_time >= leave.end_time:
+    # Reject overlaps with the employee's pending or approved leaves
+    if conflict_id is not None:
+        raise overlap_error(crud.get_leave_by_id(db, conflict_id))
+    
+    # Reserve the days against the balance, net of other pending requests
+    if not crud.reserve_leave_days(db, employee_id, leave.type_id, requested_days):
+        available = leave_balance.remaining - leave_balance.reserved
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Start time must be before end time"
+            detail=f"Insufficient leave balance. You have {max(available, 0)} days available for {leave_type.name}, but requested {requested_days} days."
         )
     
-    new_leave = crud.create_leave(
-        db,
-        employee_id=employee_id,
-        type_id=leave.type_id,
-        start_time=leave.start_time,
-        end_time=leave.end_time,
-        reason=leave.reason
-    )
+    try:
+        new_leave = crud.create_leave(
+            db,
+            employee_id=employee_id,
+            type_id=leave.type_id,
+            start_time=leave.start_time,
+            end_time=leave.end_time,
+            reason=leave.reason,
+            days=requested_days
+        )
+    except IntegrityError:
+        # A concurrent request took the dates first (excl_leaves_overlap on PostgreSQL)
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Leave overlaps an existing pending or approved leave"
+        )
     
     # Create audit log
     crud.create_audit_log(
@@ -77,28 +112,67 @@ def create_leave(leave: LeaveCreate, employee_id: int, db: Session = Depends(get
         target_id=new_leave.id
     )
     
+    db.commit()
     return new_leave
 
 
 @router.get("/", response_model=List[LeaveResponse])
-def get_all_leaves(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_all_leaves(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: Session = Depends(get_db)
+):
     """Get all leave requests"""
-    leaves = crud.get_all_leaves(db, skip=skip, limit=limit)
+    leaves = crud.get_all_leaves(db, skip=skip, limit=limit, after=after)
+    set_next_cursor(response, leaves, limit, id_key)
     return leaves
 
 
 @router.get("/pending", response_model=List[LeaveResponse])
-def get_pending_leaves(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_pending_leaves(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: Session = Depends(get_db)
+):
     """Get all pending leave requests"""
-    leaves = crud.get_pending_leaves(db, skip=skip, limit=limit)
+    leaves = crud.get_pending_leaves(db, skip=skip, limit=limit, after=after)
+    set_next_cursor(response, leaves, limit, id_key)
     return leaves
 
 
+@router.get("/conflicts", response_model=List[LeaveResponse])
+def get_conflicting_leaves(
+    employee_id: int,
+    start_time: datetime,
+    end_time: datetime,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """Get the employee's pending or approved leaves overlapping the given period"""
+    check_period(start_time, end_time)
+    return crud.find_overlapping_leaves(db, employee_id, start_time, end_time, limit=limit)
+
+
 @router.get("/employee/{employee_id}", response_model=List[LeaveResponse])
-def get_employee_leaves(employee_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_employee_leaves(
+    employee_id: int,
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: Session = Depends(get_db)
+):
     """Get all leaves for a specific employee"""
-    leaves = crud.get_leaves_by_employee(db, employee_id, skip=skip, limit=limit)
-    return leaves
+    def load():
+        leaves = crud.get_leaves_by_employee(db, employee_id, skip=skip, limit=limit, after=after)
+        set_next_cursor(response, leaves, limit, id_key)
+        return leaves
+    return response_cache.serve(request, response, LEAVES, employee_id, leave_list, load)
 
 
 @router.get("/{leave_id}", response_model=LeaveResponse)
@@ -116,7 +190,8 @@ def get_leave(leave_id: int, db: Session = Depends(get_db)):
 @router.delete("/{leave_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_leave(leave_id: int, db: Session = Depends(get_db)):
     """Delete a leave request"""
-    leave = crud.get_leave_by_id(db, leave_id)
+    # Locked like an approval, so the status check and the release see the same row
+    leave = crud.get_leave_for_update(db, leave_id)
     if not leave:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -130,6 +205,12 @@ def delete_leave(leave_id: int, db: Session = Depends(get_db)):
             detail="Cannot delete non-pending leave requests"
         )
     
+    if leave.days and not crud.release_leave_days(db, leave.employee_id, leave.type_id, leave.days):
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The days reserved by this leave request have already been released"
+        )
     crud.delete_leave(db, leave_id)
     
     # Create audit log
@@ -142,4 +223,89 @@ def delete_leave(leave_id: int, db: Session = Depends(get_db)):
         target_id=leave_id
     )
     
+    db.commit()
     return None
+
+
+# ============== Async Routes ==============
+@async_router.post("/", response_model=LeaveResponse, status_code=status.HTTP_201_CREATED)
+async def create_leave_async(leave: LeaveCreate, employee_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Create a new leave request"""
+    return await db.run_sync(lambda session: create_leave(leave, employee_id, session))
+
+
+@async_router.get("/", response_model=List[LeaveResponse])
+async def get_all_leaves_async(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all leave requests"""
+    leaves = await crud_async.get_all_leaves(db, skip=skip, limit=limit, after=after)
+    set_next_cursor(response, leaves, limit, id_key)
+    return leaves
+
+
+@async_router.get("/pending", response_model=List[LeaveResponse])
+async def get_pending_leaves_async(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all pending leave requests"""
+    leaves = await crud_async.get_pending_leaves(db, skip=skip, limit=limit, after=after)
+    set_next_cursor(response, leaves, limit, id_key)
+    return leaves
+
+
+@async_router.get("/conflicts", response_model=List[LeaveResponse])
+async def get_conflicting_leaves_async(
+    employee_id: int,
+    start_time: datetime,
+    end_time: datetime,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the employee's pending or approved leaves overlapping the given period"""
+    check_period(start_time, end_time)
+    return await crud_async.find_overlapping_leaves(db, employee_id, start_time, end_time, limit=limit)
+
+
+@async_router.get("/employee/{employee_id}", response_model=List[LeaveResponse])
+async def get_employee_leaves_async(
+    employee_id: int,
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get all leaves for a specific employee"""
+    async def load():
+        leaves = await crud_async.get_leaves_by_employee(db, employee_id, skip=skip, limit=limit, after=after)
+        set_next_cursor(response, leaves, limit, id_key)
+        return leaves
+    return await response_cache.serve_async(request, response, LEAVES, employee_id, leave_list, load)
+
+
+@async_router.get("/{leave_id}", response_model=LeaveResponse)
+async def get_leave_async(leave_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get leave by ID"""
+    leave = await crud_async.get_leave_by_id(db, leave_id)
+    if not leave:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Leave not found"
+        )
+    return leave
+
+
+@async_router.delete("/{leave_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_leave_async(leave_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Delete a leave request"""
+    return await db.run_sync(lambda session: delete_leave(leave_id, session))
@@ -1,26 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from database import get_db
 from schemas import ManagerCreate, ManagerResponse
+from hashing import hash_password
+from pagination import keyset_cursor, set_next_cursor, id_key
 import crud
 
 router = APIRouter(prefix="/managers", tags=["Managers"])
 
 
 @router.post("/", response_model=ManagerResponse, status_code=status.HTTP_201_CREATED)
-def create_manager(manager: ManagerCreate, db: Session = Depends(get_db)):
+async def create_manager(manager: ManagerCreate, db: Session = Depends(get_db)):
     """Create a new manager"""
     # Check if manager already exists
-    existing_manager = crud.get_manager_by_email(db, manager.email)
+    existing_manager = await run_in_threadpool(crud.get_manager_by_email, db, manager.email)
     if existing_manager:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Manager with this email already exists"
         )
     
-    new_manager = crud.create_manager(db, manager.name, manager.email, manager.password)
+    # Hash in the process pool, then do the DB work on a threadpool thread
+    password_hash = await hash_password(manager.password)
+    return await run_in_threadpool(_insert_manager, db, manager, password_hash)
+
+
+def _insert_manager(db: Session, manager: ManagerCreate, password_hash: str):
+    new_manager = crud.create_manager(db, manager.name, manager.email, password_hash)
     
     # Create audit log
     crud.create_audit_log(
@@ -32,13 +41,21 @@ def create_manager(manager: ManagerCreate, db: Session = Depends(get_db)):
         target_id=new_manager.id
     )
     
+    db.commit()
     return new_manager
 
 
 @router.get("/", response_model=List[ManagerResponse])
-def get_all_managers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_all_managers(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(keyset_cursor(int)),
+    db: Session = Depends(get_db)
+):
     """Get all managers"""
-    managers = crud.get_all_managers(db, skip=skip, limit=limit)
+    managers = crud.get_all_managers(db, skip=skip, limit=limit, after=after)
+    set_next_cursor(response, managers, limit, id_key)
     return managers
 
 
@@ -81,4 +98,5 @@ def delete_manager(manager_id: int, db: Session = Depends(get_db)):
         target_id=manager_id
     )
     
+    db.commit()
     return None
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date, timedelta
+import os
+
+from database import get_db, get_async_db
+from schemas import CalendarResponse
+import crud
+import crud_async
+
+router = APIRouter(prefix="/calendar", tags=["Calendar"])
+
+# Same routes served from the async engine (DB_MODE=async)
+async_router = APIRouter(prefix="/calendar", tags=["Calendar"])
+
+CALENDAR_MAX_DAYS = int(os.getenv("CALENDAR_MAX_DAYS", "366"))
+
+
+def check_window(start: date, end: date):
+    if end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="End date must not be before start date"
+        )
+    if (end - start).days + 1 > CALENDAR_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Calendar window is limited to {CALENDAR_MAX_DAYS} days"
+        )
+
+
+def build_calendar(start: date, end: date, leave_days) -> dict:
+    """Group occupancy rows by day, listing every day of the window"""
+    days = {start + timedelta(days=offset): [] for offset in range((end - start).days + 1)}
+    for row in leave_days:
+        days[row.day].append(row)
+    return {
+        "start": start,
+        "end": end,
+        "days": [{"date": day, "out": out} for day, out in days.items()]
+    }
+
+
+@router.get("/", response_model=CalendarResponse)
+def get_calendar(
+    start: date,
+    end: date,
+    employee_id: Optional[List[int]] = Query(None, description="Limit to these employees"),
+    db: Session = Depends(get_db)
+):
+    """Who is out on approved leave on each day of the window"""
+    check_window(start, end)
+    return build_calendar(start, end, crud.get_leave_days(db, start, end, employee_id))
+
+
+# ============== Async Routes ==============
+@async_router.get("/", response_model=CalendarResponse)
+async def get_calendar_async(
+    start: date,
+    end: date,
+    employee_id: Optional[List[int]] = Query(None, description="Limit to these employees"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Who is out on approved leave on each day of the window"""
+    check_window(start, end)
+    return build_calendar(start, end, await crud_async.get_leave_days(db, start, end, employee_id))
@@ -0,0 +1,110 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+
+from database import get_db
+from schemas import TeamCreate, TeamUpdate, TeamResponse, EmployeeResponse
+import crud
+
+router = APIRouter(prefix="/teams", tags=["Teams"])
+
+
+@router.post("/", response_model=TeamResponse, status_code=status.HTTP_201_CREATED)
+def create_team(team: TeamCreate, db: Session = Depends(get_db)):
+    """Create a new team"""
+    if crud.get_team_by_name(db, team.name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Team with this name already exists"
+        )
+    
+    new_team = crud.create_team(db, team.name, team.min_present)
+    
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action="Created team",
+        target_table="teams",
+        target_id=new_team.id
+    )
+    
+    db.commit()
+    return new_team
+
+
+@router.get("/", response_model=List[TeamResponse])
+def get_all_teams(db: Session = Depends(get_db)):
+    """Get all teams"""
+    return crud.get_all_teams(db)
+
+
+@router.get("/{team_id}", response_model=TeamResponse)
+def get_team(team_id: int, db: Session = Depends(get_db)):
+    """Get team by ID"""
+    team = crud.get_team_by_id(db, team_id)
+    if not team:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+    return team
+
+
+@router.put("/{team_id}", response_model=TeamResponse)
+def update_team(team_id: int, team_data: TeamUpdate, db: Session = Depends(get_db)):
+    """Rename a team or change its coverage policy"""
+    team = crud.update_team(db, team_id, team_data.name, team_data.min_present)
+    if not team:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+    
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action="Updated team",
+        target_table="teams",
+        target_id=team_id
+    )
+    
+    db.commit()
+    return team
+
+
+@router.get("/{team_id}/members", response_model=List[EmployeeResponse])
+def get_team_members(team_id: int, db: Session = Depends(get_db)):
+    """Get the employees in a team"""
+    if not crud.get_team_by_id(db, team_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+    return crud.get_team_members(db, team_id)
+
+
+@router.delete("/{team_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_team(team_id: int, db: Session = Depends(get_db)):
+    """Delete a team; its members are kept without a team"""
+    if not crud.delete_team(db, team_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Team not found"
+        )
+    
+    # Create audit log
+    crud.create_audit_log(
+        db,
+        actor_type="admin",
+        actor_id=1,  # This should come from authenticated admin
+        action="Deleted team",
+        target_table="teams",
+        target_id=team_id
+    )
+    
+    db.commit()
+    return None
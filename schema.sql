@@ -1,14 +1,28 @@
 -- Employee Leave Management System Database Schema
 -- PostgreSQL Database Schema
 
+-- btree_gist lets the leave overlap constraint combine employee_id equality with range overlap
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
 -- Drop tables if they exist (in correct order due to foreign keys)
+DROP TABLE IF EXISTS cache_versions CASCADE;
+DROP TABLE IF EXISTS refresh_tokens CASCADE;
+DROP TABLE IF EXISTS auto_approval_rules CASCADE;
+DROP TABLE IF EXISTS accrual_runs CASCADE;
+DROP TABLE IF EXISTS accrual_policies CASCADE;
+DROP TABLE IF EXISTS leave_balance_snapshots CASCADE;
+DROP TABLE IF EXISTS leave_ledger CASCADE;
 DROP TABLE IF EXISTS audit_logs CASCADE;
 DROP TABLE IF EXISTS leave_balance CASCADE;
+DROP TABLE IF EXISTS team_day_absences CASCADE;
+DROP TABLE IF EXISTS leave_days CASCADE;
 DROP TABLE IF EXISTS approvals CASCADE;
 DROP TABLE IF EXISTS leaves CASCADE;
 DROP TABLE IF EXISTS leave_types CASCADE;
+DROP TABLE IF EXISTS holidays CASCADE;
 DROP TABLE IF EXISTS managers CASCADE;
 DROP TABLE IF EXISTS employees CASCADE;
+DROP TABLE IF EXISTS teams CASCADE;
 DROP TABLE IF EXISTS admins CASCADE;
 
 -- Create admins table
@@ -20,12 +34,22 @@ CREATE TABLE admins (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
 );
 
+-- Create teams table
+CREATE TABLE teams (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) UNIQUE NOT NULL,
+    min_present INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
 -- Create employees table
 CREATE TABLE employees (
     id SERIAL PRIMARY KEY,
     name VARCHAR(100) NOT NULL,
     email VARCHAR(100) UNIQUE NOT NULL,
     password_hash TEXT NOT NULL,
+    region VARCHAR(50) DEFAULT 'default' NOT NULL,
+    team_id INT REFERENCES teams(id) ON DELETE SET NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
 );
@@ -39,10 +63,21 @@ CREATE TABLE managers (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
 );
 
+-- Create holidays table (public holidays per regional calendar)
+CREATE TABLE holidays (
+    id SERIAL PRIMARY KEY,
+    region VARCHAR(50) NOT NULL,
+    date DATE NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    CONSTRAINT uq_holidays_region_date UNIQUE (region, date)
+);
+
 -- Create leave_types table
 CREATE TABLE leave_types (
     id SERIAL PRIMARY KEY,
-    name VARCHAR(50) NOT NULL UNIQUE
+    name VARCHAR(50) NOT NULL UNIQUE,
+    -- Days kept at year end (see carry_forward.py); NULL means no rollover
+    carry_forward_cap INT CHECK (carry_forward_cap >= 0)
 );
 
 -- Create leaves table
@@ -54,9 +89,35 @@ CREATE TABLE leaves (
     end_time TIMESTAMP NOT NULL,
     reason TEXT,
     status VARCHAR(20) DEFAULT 'pending' NOT NULL,
+    days INT,
+    -- Manager work queue lease (POST /approvals/claim)
+    claimed_by INT REFERENCES managers(id) ON DELETE SET NULL,
+    claim_expires_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
     CONSTRAINT check_dates CHECK (end_time > start_time),
-    CONSTRAINT check_status CHECK (status IN ('pending', 'approved', 'rejected'))
+    CONSTRAINT check_status CHECK (status IN ('pending', 'approved', 'rejected')),
+    -- Pending and approved leaves of one employee may not overlap
+    CONSTRAINT excl_leaves_overlap EXCLUDE USING gist (
+        employee_id WITH =,
+        tsrange(start_time, end_time, '[]') WITH &&
+    ) WHERE (status IN ('pending', 'approved'))
+);
+
+-- Create leave_days table (one row per day of each approved leave)
+CREATE TABLE leave_days (
+    day DATE NOT NULL,
+    employee_id INT NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    leave_id INT NOT NULL REFERENCES leaves(id) ON DELETE CASCADE,
+    type_id INT NOT NULL REFERENCES leave_types(id) ON DELETE CASCADE,
+    PRIMARY KEY (day, employee_id, leave_id)
+);
+
+-- Create team_day_absences table (leave_days counted per team and day)
+CREATE TABLE team_day_absences (
+    team_id INT NOT NULL REFERENCES teams(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    absent INT NOT NULL,
+    PRIMARY KEY (team_id, day)
 );
 
 -- Create approvals table
@@ -77,32 +138,126 @@ CREATE TABLE leave_balance (
     total_allocated INT NOT NULL DEFAULT 0 CHECK (total_allocated >= 0),
     total_used INT NOT NULL DEFAULT 0 CHECK (total_used >= 0),
     remaining INT NOT NULL DEFAULT 0 CHECK (remaining >= 0),
+    -- Days held by pending leaves
+    reserved INT NOT NULL DEFAULT 0 CHECK (reserved >= 0),
+    -- Last year whose carry-forward has been applied
+    carried_over_year INT,
     CONSTRAINT unique_employee_leave_type UNIQUE (employee_id, type_id)
 );
 
--- Create audit_logs table
-CREATE TABLE audit_logs (
+-- Create leave_ledger table: append-only signed day movements per balance
+CREATE TABLE leave_ledger (
+    id SERIAL PRIMARY KEY,
+    employee_id INT NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    type_id INT NOT NULL REFERENCES leave_types(id) ON DELETE CASCADE,
+    entry_type VARCHAR(20) NOT NULL,
+    days INT NOT NULL,
+    effective_date DATE NOT NULL,
+    leave_id INT REFERENCES leaves(id) ON DELETE SET NULL,
+    note TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Create leave_balance_snapshots table (ledger totals at month ends, written by ledger.py)
+CREATE TABLE leave_balance_snapshots (
+    employee_id INT NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    type_id INT NOT NULL REFERENCES leave_types(id) ON DELETE CASCADE,
+    as_of DATE NOT NULL,
+    credited INT NOT NULL,
+    used INT NOT NULL,
+    PRIMARY KEY (employee_id, type_id, as_of)
+);
+
+-- Create accrual_policies table (at most one policy per leave type)
+CREATE TABLE accrual_policies (
+    id SERIAL PRIMARY KEY,
+    type_id INT UNIQUE NOT NULL REFERENCES leave_types(id) ON DELETE CASCADE,
+    frequency VARCHAR(20) NOT NULL,
+    days_per_period INT NOT NULL,
+    prorate BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    CONSTRAINT check_frequency CHECK (frequency IN ('monthly', 'annual'))
+);
+
+-- Create accrual_runs table (one row per policy run that accrued any days)
+CREATE TABLE accrual_runs (
+    id SERIAL PRIMARY KEY,
+    policy_id INT NOT NULL REFERENCES accrual_policies(id) ON DELETE CASCADE,
+    period_start DATE NOT NULL,
+    employees INT NOT NULL,
+    days INT NOT NULL,
+    ran_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Create auto_approval_rules table (NULL conditions match everything)
+CREATE TABLE auto_approval_rules (
     id SERIAL PRIMARY KEY,
+    type_id INT REFERENCES leave_types(id) ON DELETE CASCADE,
+    team_id INT REFERENCES teams(id) ON DELETE CASCADE,
+    max_days INT,
+    min_remaining INT,
+    max_team_absent INT,
+    approver_id INT NOT NULL REFERENCES managers(id) ON DELETE CASCADE,
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Create audit_logs table, range-partitioned by month on timestamp.
+-- Monthly partitions (audit_logs_YYYY_MM) are created by audit_partitions.py.
+CREATE TABLE audit_logs (
+    id SERIAL,
     actor_type VARCHAR(20) NOT NULL,
     actor_id INT NOT NULL,
     action TEXT NOT NULL,
     target_table VARCHAR(50) NOT NULL,
     target_id INT NOT NULL,
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (id, timestamp),
     CONSTRAINT check_actor_type CHECK (actor_type IN ('admin', 'manager', 'employee'))
+) PARTITION BY RANGE (timestamp);
+
+-- Catches rows outside every monthly partition
+CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT;
+
+-- Create refresh_tokens table (tokens are stored as SHA-256 hashes)
+CREATE TABLE refresh_tokens (
+    id SERIAL PRIMARY KEY,
+    token_hash VARCHAR(64) UNIQUE NOT NULL,
+    user_type VARCHAR(20) NOT NULL,
+    user_id INT NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    family_id VARCHAR(32) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP,
+    replaced_by_id INT REFERENCES refresh_tokens(id) ON DELETE SET NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Create cache_versions table (bumped with each change to a table cached in-process)
+CREATE TABLE cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version INT NOT NULL
 );
 
 -- Create indexes for better query performance
 CREATE INDEX idx_employees_email ON employees(email);
+CREATE INDEX ix_employees_team_id ON employees(team_id);
 CREATE INDEX idx_managers_email ON managers(email);
 CREATE INDEX idx_admins_email ON admins(email);
-CREATE INDEX idx_leaves_employee_id ON leaves(employee_id);
-CREATE INDEX idx_leaves_status ON leaves(status);
+-- List endpoints use keyset pagination, so each index ends with the sort key
+CREATE INDEX idx_leaves_employee_id ON leaves(employee_id, id);
+CREATE INDEX idx_leaves_status ON leaves(status, id);
+CREATE INDEX idx_leave_days_leave_id ON leave_days(leave_id);
 CREATE INDEX idx_approvals_leave_id ON approvals(leave_id);
-CREATE INDEX idx_approvals_manager_id ON approvals(approved_by);
+CREATE INDEX idx_approvals_manager_id ON approvals(approved_by, id);
 CREATE INDEX idx_leave_balance_employee_id ON leave_balance(employee_id);
-CREATE INDEX idx_audit_logs_actor ON audit_logs(actor_type, actor_id);
-CREATE INDEX idx_audit_logs_timestamp ON audit_logs(timestamp DESC);
+CREATE INDEX idx_leave_ledger_balance ON leave_ledger(employee_id, type_id, effective_date);
+CREATE INDEX idx_leave_ledger_employee ON leave_ledger(employee_id, id);
+CREATE INDEX idx_leave_ledger_accruals ON leave_ledger(type_id, effective_date) WHERE entry_type = 'accrual';
+CREATE INDEX idx_accrual_runs_policy ON accrual_runs(policy_id, period_start);
+CREATE INDEX idx_audit_logs_actor ON audit_logs(actor_type, actor_id, timestamp DESC, id DESC);
+CREATE INDEX idx_audit_logs_timestamp ON audit_logs(timestamp DESC, id DESC);
+CREATE INDEX ix_refresh_tokens_family_id ON refresh_tokens(family_id);
 
 -- Insert default leave types
 INSERT INTO leave_types (name) VALUES
@@ -115,10 +270,21 @@ INSERT INTO leave_types (name) VALUES
 
 -- Comments for documentation
 COMMENT ON TABLE admins IS 'Stores admin user accounts';
+COMMENT ON TABLE teams IS 'Teams employees belong to, for coverage rules';
 COMMENT ON TABLE employees IS 'Stores employee user accounts';
 COMMENT ON TABLE managers IS 'Stores manager user accounts';
+COMMENT ON TABLE holidays IS 'Public holidays per region, excluded from leave durations';
 COMMENT ON TABLE leave_types IS 'Defines types of leave available';
 COMMENT ON TABLE leaves IS 'Stores all leave requests';
+COMMENT ON TABLE leave_days IS 'Per-day occupancy of approved leaves, backing the /calendar view';
+COMMENT ON TABLE team_day_absences IS 'Approved absences per team and day, for coverage checks';
 COMMENT ON TABLE approvals IS 'Stores manager approval decisions for leave requests';
 COMMENT ON TABLE leave_balance IS 'Tracks leave balances for each employee by leave type';
+COMMENT ON TABLE leave_ledger IS 'Append-only history of every change to a leave balance';
+COMMENT ON TABLE leave_balance_snapshots IS 'Month-end ledger totals per balance, for as-of balance queries';
+COMMENT ON TABLE accrual_policies IS 'Monthly or annual leave accrual rules per leave type';
+COMMENT ON TABLE accrual_runs IS 'History of accrual runs per policy and period';
+COMMENT ON TABLE auto_approval_rules IS 'Conditions under which pending leaves are approved automatically';
 COMMENT ON TABLE audit_logs IS 'Audit trail of all actions in the system';
+COMMENT ON TABLE refresh_tokens IS 'Hashed, rotating refresh tokens used to renew access tokens';
+COMMENT ON TABLE cache_versions IS 'Change counters that tell worker processes to reload their caches';
@@ -1,12 +1,27 @@
 from pydantic import BaseModel, EmailStr, Field
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Optional
 
 
 # ============== Auth Schemas ==============
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class CurrentUserResponse(BaseModel):
+    user_type: str
+    user_id: int
+    email: str
+    name: str
+
+    class Config:
+        from_attributes = True
 
 
 class TokenData(BaseModel):
@@ -41,6 +56,8 @@ class AdminResponse(AdminBase):
 class EmployeeBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
     email: EmailStr
+    region: str = Field("default", min_length=1, max_length=50)
+    team_id: Optional[int] = None
 
 
 class EmployeeCreate(EmployeeBase):
@@ -50,6 +67,8 @@ class EmployeeCreate(EmployeeBase):
 class EmployeeUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=100)
     email: Optional[EmailStr] = None
+    region: Optional[str] = Field(None, min_length=1, max_length=50)
+    team_id: Optional[int] = None
 
 
 class EmployeeResponse(EmployeeBase):
@@ -61,6 +80,26 @@ class EmployeeResponse(EmployeeBase):
         from_attributes = True
 
 
+# ============== Team Schemas ==============
+class TeamCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    # Members who must be at work on every day; approvals that would break it are refused
+    min_present: Optional[int] = Field(None, ge=0)
+
+
+class TeamUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    min_present: Optional[int] = Field(None, ge=0)
+
+
+class TeamResponse(TeamCreate):
+    id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 # ============== Manager Schemas ==============
 class ManagerBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
@@ -79,9 +118,38 @@ class ManagerResponse(ManagerBase):
         from_attributes = True
 
 
+# ============== Holiday Schemas ==============
+class HolidayCreate(BaseModel):
+    region: str = Field(..., min_length=1, max_length=50)
+    date: date
+    name: str = Field(..., min_length=1, max_length=100)
+
+
+class HolidayResponse(HolidayCreate):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+
+class WorkingDaysPeriod(BaseModel):
+    region: str = Field("default", min_length=1, max_length=50)
+    start: date
+    end: date
+
+
+class WorkingDaysRequest(BaseModel):
+    periods: List[WorkingDaysPeriod] = Field(..., max_length=10000)
+
+
+class WorkingDaysResponse(BaseModel):
+    days: List[int]
+
+
 # ============== Leave Type Schemas ==============
 class LeaveTypeBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=50)
+    carry_forward_cap: Optional[int] = Field(None, ge=0)
 
 
 class LeaveTypeCreate(LeaveTypeBase):
@@ -98,6 +166,11 @@ class LeaveTypeCreate(LeaveTypeBase):
         return v
 
 
+class LeaveTypeUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=50)
+    carry_forward_cap: Optional[int] = Field(None, ge=0)
+
+
 class LeaveTypeResponse(LeaveTypeBase):
     id: int
 
@@ -128,18 +201,68 @@ class LeaveResponse(LeaveBase):
     id: int
     employee_id: int
     status: str
+    days: Optional[int] = None
+    claimed_by: Optional[int] = None
+    claim_expires_at: Optional[datetime] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+# ============== Calendar Schemas ==============
+class CalendarEntry(BaseModel):
+    employee_id: int
+    leave_id: int
+    type_id: int
+
+
+class CalendarDay(BaseModel):
+    date: date
+    out: List[CalendarEntry]
+
+
+class CalendarResponse(BaseModel):
+    start: date
+    end: date
+    days: List[CalendarDay]
+
+
 # ============== Approval Schemas ==============
 class ApprovalCreate(BaseModel):
     leave_id: int
     decision: str = Field(..., pattern="^(approved|rejected)$")
 
 
+class BulkDecisionRequest(BaseModel):
+    decisions: List[ApprovalCreate] = Field(..., min_length=1, max_length=500)
+
+
+class BulkDecisionResult(BaseModel):
+    leave_id: int
+    decision: str
+    # What POST /approvals/ would have answered for this item
+    status_code: int
+    approval_id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BulkDecisionResponse(BaseModel):
+    approved: int
+    rejected: int
+    failed: int
+    results: List[BulkDecisionResult]
+
+
+class ClaimRelease(BaseModel):
+    # Omit to release every leave the manager holds
+    leave_ids: Optional[List[int]] = None
+
+
+class ClaimReleaseResponse(BaseModel):
+    released: int
+
+
 class ApprovalResponse(BaseModel):
     id: int
     leave_id: int
@@ -172,11 +295,132 @@ class LeaveBalanceUpdate(BaseModel):
 
 class LeaveBalanceResponse(LeaveBalanceBase):
     id: int
+    reserved: int = 0
+
+    class Config:
+        from_attributes = True
+
+
+# ============== Leave Ledger Schemas ==============
+class LedgerEntryResponse(BaseModel):
+    id: int
+    employee_id: int
+    type_id: int
+    entry_type: str
+    days: int
+    effective_date: date
+    leave_id: Optional[int] = None
+    note: Optional[str] = None
+    created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class BalanceAsOfResponse(BaseModel):
+    type_id: int
+    as_of: date
+    credited: int
+    used: int
+    remaining: int
+
+
+# ============== Accrual Schemas ==============
+class AccrualPolicyCreate(BaseModel):
+    type_id: int
+    frequency: str = Field(..., pattern="^(monthly|annual)$")
+    days_per_period: int = Field(..., gt=0)
+    prorate: bool = True
+
+
+class AccrualPolicyResponse(AccrualPolicyCreate):
+    id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class AccrualRunResponse(BaseModel):
+    id: int
+    policy_id: int
+    period_start: date
+    employees: int
+    days: int
+    ran_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+# ============== Auto-Approval Schemas ==============
+class AutoApprovalRuleCreate(BaseModel):
+    approver_id: int
+    # Conditions left out match every leave
+    type_id: Optional[int] = None
+    team_id: Optional[int] = None
+    max_days: Optional[int] = Field(None, ge=0)
+    min_remaining: Optional[int] = Field(None, ge=0)
+    max_team_absent: Optional[int] = Field(None, ge=1)
+    enabled: bool = True
+
+
+class AutoApprovalRuleResponse(AutoApprovalRuleCreate):
+    id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class AutoApprovalReport(BaseModel):
+    batches: int
+    scanned: int
+    matched: int
+    approved: int
+    failed: int
+    elapsed_seconds: float
+
+
+# ============== Carry-Forward Schemas ==============
+class CarryForwardTypeSummary(BaseModel):
+    type_id: int
+    balances: int
+    expired_days: int
+    carried_days: int
+
+
+class CarryForwardReport(BaseModel):
+    year: int
+    dry_run: bool
+    chunks: int
+    balances: int
+    expired_days: int
+    carried_days: int
+    types: List[CarryForwardTypeSummary]
+
+
+# ============== Reconciliation Schemas ==============
+class BalanceDrift(BaseModel):
+    balance_id: int
+    employee_id: int
+    type_id: int
+    recorded_used: int
+    expected_used: int
+    repaired: bool
+
+
+class ReconcileReport(BaseModel):
+    repair: bool
+    balances_scanned: int
+    leaves_scanned: int
+    drifted: int
+    repaired: int
+    skipped: int
+    elapsed_seconds: float
+    drift: List[BalanceDrift]
+
+
 # ============== Audit Log Schemas ==============
 class AuditLogCreate(BaseModel):
     actor_type: str = Field(..., pattern="^(admin|manager|employee)$")
@@ -11,6 +11,8 @@ from models import (
     Base, Admin, Employee, Manager, LeaveType, 
     Leave, Approval, LeaveBalance, AuditLog
 )
+from workdays import working_days
+import crud
 
 # Password hashing function
 def get_password_hash(password: str) -> str:
@@ -281,21 +283,13 @@ def seed_leave_balances(db, employees):
         "Unpaid Leave": 30,
     }
     
+    # Usage comes from the approved leaves booked by seed_approvals
     for employee in employees:
         for leave_type in leave_types:
             allocated = LEAVE_ALLOCATION.get(leave_type.name, 10)
-            used = random.randint(0, min(allocated // 2, 5))  # Some random usage
-            
-            balance = LeaveBalance(
-                employee_id=employee.id,
-                type_id=leave_type.id,
-                total_allocated=allocated,
-                total_used=used,
-                remaining=allocated - used
-            )
+            balance = crud.create_leave_balance(db, employee.id, leave_type.id, allocated)
             leave_balances.append(balance)
     
-    db.add_all(leave_balances)
     db.commit()
     print(f"✅ Created {len(leave_balances)} leave balance records")
     return leave_balances
@@ -317,10 +311,15 @@ def seed_leaves(db, employees):
     }
     
     leaves = []
+    decisions = {}
     statuses = ["pending", "approved", "rejected"]
+    # employee_id -> periods already taken; pending and approved leaves may not overlap
+    taken = {employee.id: [] for employee in employees}
     
     # Generate 100+ leave requests
-    for _ in range(120):
+    attempts = 0
+    while len(leaves) < 120 and attempts < 1000:
+        attempts += 1
         employee = random.choice(employees)
         leave_type_name = random.choices(
             list(leave_type_map.keys()),
@@ -336,43 +335,55 @@ def seed_leaves(db, employees):
         
         start_time = datetime.now() - timedelta(days=start_offset)
         end_time = start_time + timedelta(days=duration)
+        if any(start_time <= end and start <= end_time for start, end in taken[employee.id]):
+            continue
         
-        status = random.choices(statuses, weights=[20, 60, 20])[0]
+        # Filed like POST /leaves/: counted in working days and reserved against the balance
+        days = working_days(db, employee.region, start_time, end_time)
+        if days == 0 or not crud.reserve_leave_days(db, employee.id, type_id, days):
+            continue
         
-        leave = Leave(
+        leave = crud.create_leave(
+            db,
             employee_id=employee.id,
             type_id=type_id,
             start_time=start_time,
             end_time=end_time,
             reason=random.choice(reasons),
-            status=status,
-            created_at=start_time - timedelta(days=random.randint(1, 7))
+            days=days
         )
+        leave.created_at = start_time - timedelta(days=random.randint(1, 7))
+        taken[employee.id].append((start_time, end_time))
+        decisions[leave.id] = random.choices(statuses, weights=[20, 60, 20])[0]
         leaves.append(leave)
     
-    db.add_all(leaves)
     db.commit()
     print(f"✅ Created {len(leaves)} leave requests")
-    return leaves
+    return leaves, decisions
 
 
-def seed_approvals(db, leaves, managers):
+def seed_approvals(db, leaves, decisions, managers):
     """Seed approvals for approved/rejected leaves"""
     print("\n✅ Seeding Approvals...")
     approvals = []
     
+    # Decided like POST /approvals/: approvals book the reserved days, rejections release them
     for leave in leaves:
-        if leave.status in ["approved", "rejected"]:
-            manager = random.choice(managers)
-            approval = Approval(
-                leave_id=leave.id,
-                approved_by=manager.id,
-                approved_at=leave.created_at + timedelta(days=random.randint(1, 3)),
-                decision=leave.status
-            )
-            approvals.append(approval)
+        decision = decisions[leave.id]
+        if decision == "pending":
+            continue
+        if decision == "approved" and not crud.update_leave_balance(
+            db, leave.employee_id, leave.type_id, leave.days, release_reserved=leave.days, leave_id=leave.id
+        ):
+            # Earlier approvals used up the balance; the request stays pending
+            continue
+        if decision == "rejected":
+            crud.release_leave_days(db, leave.employee_id, leave.type_id, leave.days)
+        manager = random.choice(managers)
+        approval = crud.create_approval(db, leave.id, manager.id, decision)
+        approval.approved_at = min(leave.created_at + timedelta(days=random.randint(1, 3)), datetime.now())
+        approvals.append(approval)
     
-    db.add_all(approvals)
     db.commit()
     print(f"✅ Created {len(approvals)} approval records")
     return approvals
@@ -454,8 +465,8 @@ def seed_all():
         managers = seed_managers(db)
         employees = seed_employees(db)
         leave_balances = seed_leave_balances(db, employees)
-        leaves = seed_leaves(db, employees)
-        approvals = seed_approvals(db, leaves, managers)
+        leaves, decisions = seed_leaves(db, employees)
+        approvals = seed_approvals(db, leaves, decisions, managers)
         audit_logs = seed_audit_logs(db, admins, managers, employees)
         
         # Print summary
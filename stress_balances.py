@@ -0,0 +1,145 @@
+"""
+Concurrency stress test for leave balances.
+
+Fires parallel leave requests and approvals through the real route handlers
+(one session per thread, released together from a barrier) and checks that
+the balance counters come out exact:
+
+1. 2N requests compete for a balance that fits N: exactly N are admitted.
+2. Every admitted leave is approved twice in parallel: each is booked once.
+3. 2K parallel crud.update_leave_balance calls of one day against K days:
+   exactly K succeed and remaining never goes below zero.
+
+Needs a PostgreSQL DATABASE_URL (SQLite serializes writers and proves
+nothing). Creates its own employee, manager and leave type and deletes them
+afterwards.
+
+Usage:
+    python stress_balances.py [N]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+import sys
+import threading
+import uuid
+
+from database import SessionLocal, init_db
+from auth import get_password_hash
+from schemas import LeaveCreate, ApprovalCreate
+from routers import leaves as leaves_router, approvals as approvals_router
+import crud
+
+DAYS_PER_LEAVE = 3
+
+
+def run_parallel(calls):
+    """Run each call with its own session, all starting at once; returns results or status codes"""
+    barrier = threading.Barrier(len(calls))
+
+    def worker(call):
+        db = SessionLocal()
+        try:
+            barrier.wait()
+            return call(db)
+        except HTTPException as e:
+            return e.status_code
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        return list(pool.map(worker, calls))
+
+
+def balance_of(employee_id: int, type_id: int):
+    db = SessionLocal()
+    try:
+        return next(
+            b for b in crud.get_leave_balances_by_employee(db, employee_id) if b.type_id == type_id
+        )
+    finally:
+        db.close()
+
+
+def check(label: str, actual, expected):
+    status = "ok" if actual == expected else "FAIL"
+    print(f"  [{status}] {label}: {actual} (expected {expected})")
+    return actual == expected
+
+
+def stress(n: int) -> bool:
+    tag = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    employee = crud.create_employee(db, f"Stress {tag}", f"stress-{tag}@example.com", get_password_hash("stress"))
+    manager = crud.create_manager(db, f"Stress {tag}", f"stress-mgr-{tag}@example.com", get_password_hash("stress"))
+    leave_type = crud.create_leave_type(db, f"Stress {tag}")
+    side_type = crud.create_leave_type(db, f"Stress side {tag}")
+    crud.create_leave_balance(db, employee.id, leave_type.id, n * DAYS_PER_LEAVE)
+    crud.create_leave_balance(db, employee.id, side_type.id, n)
+    db.commit()
+    employee_id, manager_id, type_id, side_type_id = employee.id, manager.id, leave_type.id, side_type.id
+    db.close()
+
+    ok = True
+    try:
+        # Monday to Wednesday of consecutive weeks, so no two requests overlap
+        monday = datetime(2030, 1, 7)
+        requests = [
+            LeaveCreate(
+                type_id=type_id,
+                start_time=monday + timedelta(weeks=i),
+                end_time=monday + timedelta(weeks=i, days=DAYS_PER_LEAVE - 1)
+            )
+            for i in range(2 * n)
+        ]
+
+        print(f"1. {2 * n} parallel requests against {n * DAYS_PER_LEAVE} days")
+        results = run_parallel([
+            lambda session, r=r: leaves_router.create_leave(r, employee_id, session) for r in requests
+        ])
+        admitted = [r.id for r in results if not isinstance(r, int)]
+        balance = balance_of(employee_id, type_id)
+        ok &= check("admitted", len(admitted), n)
+        ok &= check("reserved", balance.reserved, n * DAYS_PER_LEAVE)
+
+        print(f"2. {2 * len(admitted)} parallel approvals ({len(admitted)} leaves, each twice)")
+        results = run_parallel([
+            lambda session, leave_id=leave_id: approvals_router.create_approval(
+                ApprovalCreate(leave_id=leave_id, decision="approved"), manager_id, session
+            )
+            for leave_id in admitted + admitted
+        ])
+        balance = balance_of(employee_id, type_id)
+        ok &= check("approvals accepted", sum(1 for r in results if not isinstance(r, int)), len(admitted))
+        ok &= check("total_used", balance.total_used, n * DAYS_PER_LEAVE)
+        ok &= check("remaining", balance.remaining, 0)
+        ok &= check("reserved", balance.reserved, 0)
+
+        def book_one_day(session):
+            booked = crud.update_leave_balance(session, employee_id, side_type_id, 1)
+            session.commit()
+            return booked is not None
+
+        print(f"3. {2 * n} parallel one-day bookings against {n} days")
+        results = run_parallel([book_one_day] * (2 * n))
+        balance = balance_of(employee_id, side_type_id)
+        ok &= check("bookings accepted", sum(results), n)
+        ok &= check("total_used", balance.total_used, n)
+        ok &= check("remaining", balance.remaining, 0)
+    finally:
+        db = SessionLocal()
+        crud.delete_employee(db, employee_id)
+        crud.delete_manager(db, manager_id)
+        crud.delete_leave_type(db, type_id)
+        crud.delete_leave_type(db, side_type_id)
+        db.commit()
+        db.close()
+    return ok
+
+
+if __name__ == "__main__":
+    init_db()
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    passed = stress(n)
+    print("PASSED" if passed else "FAILED")
+    sys.exit(0 if passed else 1)
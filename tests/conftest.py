@@ -0,0 +1,64 @@
+"""
+Shared fixtures for the balance tests.
+
+The tests exercise row locks and conditional updates, which only mean
+something on PostgreSQL (SQLite serializes writers), so every test is
+skipped unless DATABASE_URL points at a reachable PostgreSQL database.
+Each test creates its own employee, manager and leave types and deletes
+them afterwards.
+"""
+import uuid
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Create the schema once; skips the tests if PostgreSQL cannot be reached"""
+    from sqlalchemy.exc import OperationalError
+    from database import init_db
+
+    try:
+        init_db()
+    except OperationalError as e:
+        pytest.skip(f"PostgreSQL unavailable: {e}")
+
+
+@pytest.fixture
+def make_staff(database):
+    """Factory creating an employee and a manager with one balance per allocation given"""
+    from auth import get_password_hash
+    from database import SessionLocal
+    import crud
+
+    created = []
+
+    def make(*allocations, carry_forward_cap=None):
+        tag = uuid.uuid4().hex[:8]
+        db = SessionLocal()
+        try:
+            employee = crud.create_employee(db, f"Test {tag}", f"test-{tag}@example.com", get_password_hash("test"))
+            manager = crud.create_manager(db, f"Test {tag}", f"test-mgr-{tag}@example.com", get_password_hash("test"))
+            type_ids = []
+            for i, allocated in enumerate(allocations):
+                leave_type = crud.create_leave_type(db, f"Test {tag} {i}", carry_forward_cap=carry_forward_cap)
+                crud.create_leave_balance(db, employee.id, leave_type.id, allocated)
+                type_ids.append(leave_type.id)
+            db.commit()
+            created.append((employee.id, manager.id, type_ids))
+            return employee.id, manager.id, type_ids
+        finally:
+            db.close()
+
+    yield make
+
+    db = SessionLocal()
+    try:
+        for employee_id, manager_id, type_ids in created:
+            crud.delete_employee(db, employee_id)
+            crud.delete_manager(db, manager_id)
+            for type_id in type_ids:
+                crud.delete_leave_type(db, type_id)
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,143 @@
+"""Concurrent requests, approvals and releases never overdraw a balance"""
+from datetime import datetime, timedelta
+import os
+
+import pytest
+
+if not os.getenv("DATABASE_URL", "").startswith("postgresql"):
+    pytest.skip("needs a PostgreSQL DATABASE_URL", allow_module_level=True)
+
+from database import SessionLocal
+from schemas import LeaveCreate, ApprovalCreate
+from routers import leaves as leaves_router, approvals as approvals_router
+from stress_balances import DAYS_PER_LEAVE, balance_of, run_parallel
+import crud
+
+N = 4
+
+
+def file_leaves(employee_id: int, type_id: int, count: int) -> list:
+    """File `count` non-overlapping leaves of DAYS_PER_LEAVE working days in parallel; returns the admitted ids"""
+    monday = datetime(2030, 1, 7)
+    requests = [
+        LeaveCreate(
+            type_id=type_id,
+            start_time=monday + timedelta(weeks=i),
+            end_time=monday + timedelta(weeks=i, days=DAYS_PER_LEAVE - 1)
+        )
+        for i in range(count)
+    ]
+    results = run_parallel([
+        lambda session, r=r: leaves_router.create_leave(r, employee_id, session) for r in requests
+    ])
+    return [r.id for r in results if not isinstance(r, int)]
+
+
+def test_parallel_requests_reserve_only_what_fits(make_staff):
+    employee_id, _, (type_id,) = make_staff(N * DAYS_PER_LEAVE)
+
+    admitted = file_leaves(employee_id, type_id, 2 * N)
+
+    balance = balance_of(employee_id, type_id)
+    assert len(admitted) == N
+    assert balance.reserved == N * DAYS_PER_LEAVE
+    assert balance.remaining - balance.reserved == 0
+
+
+def test_parallel_approvals_book_each_leave_once(make_staff):
+    employee_id, manager_id, (type_id,) = make_staff(N * DAYS_PER_LEAVE)
+    admitted = file_leaves(employee_id, type_id, N)
+
+    # Every leave approved twice at once
+    results = run_parallel([
+        lambda session, leave_id=leave_id: approvals_router.create_approval(
+            ApprovalCreate(leave_id=leave_id, decision="approved"), manager_id, session
+        )
+        for leave_id in admitted + admitted
+    ])
+
+    balance = balance_of(employee_id, type_id)
+    assert sum(1 for r in results if not isinstance(r, int)) == N
+    assert balance.total_used == N * DAYS_PER_LEAVE
+    assert balance.remaining == 0
+    assert balance.reserved == 0
+
+
+def test_parallel_bookings_never_overdraw(make_staff):
+    employee_id, _, (type_id,) = make_staff(N)
+
+    def book_one_day(session):
+        booked = crud.update_leave_balance(session, employee_id, type_id, 1)
+        session.commit()
+        return booked is not None
+
+    results = run_parallel([book_one_day] * (2 * N))
+
+    balance = balance_of(employee_id, type_id)
+    assert sum(results) == N
+    assert balance.total_used == N
+    assert balance.remaining == 0
+
+
+def test_racing_decisions_and_deletes_release_each_reservation_once(make_staff):
+    employee_id, manager_id, (type_id,) = make_staff(N * DAYS_PER_LEAVE)
+    admitted = file_leaves(employee_id, type_id, N)
+
+    # Each leave rejected, deleted and approved at once: exactly one of them wins
+    calls = []
+    for leave_id in admitted:
+        calls.append(lambda session, leave_id=leave_id: approvals_router.create_approval(
+            ApprovalCreate(leave_id=leave_id, decision="rejected"), manager_id, session
+        ))
+        calls.append(lambda session, leave_id=leave_id: leaves_router.delete_leave(leave_id, session) or "deleted")
+        calls.append(lambda session, leave_id=leave_id: approvals_router.create_approval(
+            ApprovalCreate(leave_id=leave_id, decision="approved"), manager_id, session
+        ))
+    results = run_parallel(calls)
+
+    balance = balance_of(employee_id, type_id)
+    assert sum(1 for r in results if not isinstance(r, int)) == N
+    assert balance.reserved == 0
+    db = SessionLocal()
+    try:
+        leaves = [crud.get_leave_by_id(db, leave_id) for leave_id in admitted]
+        approved = sum(1 for leave in leaves if leave is not None and leave.status == "approved")
+    finally:
+        db.close()
+    assert balance.total_used == approved * DAYS_PER_LEAVE
+
+
+def test_releasing_twice_stops_at_zero(make_staff):
+    employee_id, _, (type_id,) = make_staff(10)
+    db = SessionLocal()
+    try:
+        assert crud.reserve_leave_days(db, employee_id, type_id, DAYS_PER_LEAVE) is not None
+        assert crud.release_leave_days(db, employee_id, type_id, DAYS_PER_LEAVE) is not None
+        assert crud.release_leave_days(db, employee_id, type_id, DAYS_PER_LEAVE) is None
+        db.commit()
+    finally:
+        db.close()
+
+    assert balance_of(employee_id, type_id).reserved == 0
+
+
+def test_bulk_approvals_book_the_leaves_that_fit(make_staff):
+    employee_id, manager_id, (type_id,) = make_staff(N * DAYS_PER_LEAVE)
+    admitted = sorted(file_leaves(employee_id, type_id, N))
+    db = SessionLocal()
+    try:
+        # Days booked outside the batch leave room for all but two of the leaves
+        assert crud.update_leave_balance(db, employee_id, type_id, DAYS_PER_LEAVE + 1) is not None
+        results = crud.decide_leaves(db, manager_id, [(leave_id, "approved") for leave_id in reversed(admitted)])
+        db.commit()
+        statuses = {r["leave_id"]: r["status_code"] for r in results}
+        leaves = {leave_id: crud.get_leave_by_id(db, leave_id).status for leave_id in admitted}
+    finally:
+        db.close()
+
+    # Admitted in id order: the first ones are booked, only the last two fail and stay pending
+    assert [statuses[leave_id] for leave_id in admitted] == [201] * (N - 2) + [400] * 2
+    assert [leaves[leave_id] for leave_id in admitted] == ["approved"] * (N - 2) + ["pending"] * 2
+    balance = balance_of(employee_id, type_id)
+    assert balance.total_used == (N - 1) * DAYS_PER_LEAVE + 1
+    assert balance.reserved == 2 * DAYS_PER_LEAVE
@@ -0,0 +1,137 @@
+"""Carry-forward keeps new-year usage, agrees with reconcile and is safe to rerun"""
+from datetime import date, datetime, timedelta
+import os
+
+import pytest
+
+if not os.getenv("DATABASE_URL", "").startswith("postgresql"):
+    pytest.skip("needs a PostgreSQL DATABASE_URL", allow_module_level=True)
+
+from sqlalchemy import func, select, update
+
+from database import SessionLocal
+from models import Leave, LeaveLedgerEntry
+from schemas import LeaveCreate, ApprovalCreate
+from routers import leaves as leaves_router, approvals as approvals_router
+from stress_balances import balance_of
+import carry_forward
+import reconcile
+
+CAP = 5
+CLOSED_YEAR = date.today().year - 1
+
+
+def credit_in_closed_year(employee_id: int):
+    """Date the employee's allocations in the closed year, as if granted before the rollover"""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(LeaveLedgerEntry)
+            .where(LeaveLedgerEntry.employee_id == employee_id, LeaveLedgerEntry.entry_type == "allocation")
+            .values(effective_date=date(CLOSED_YEAR, 1, 1))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def approve_leave(employee_id: int, manager_id: int, type_id: int, days: int, week: int = 0):
+    """File and approve a leave of `days` working days; approved today, so after the rollover"""
+    db = SessionLocal()
+    try:
+        start = datetime(2030, 1, 7) + timedelta(weeks=week)
+        # From a Monday, skipping a weekend for every five working days
+        end = start + timedelta(days=days - 1 + 2 * ((days - 1) // 5))
+        leave = leaves_router.create_leave(
+            LeaveCreate(type_id=type_id, start_time=start, end_time=end),
+            employee_id,
+            db
+        )
+        approvals_router.create_approval(ApprovalCreate(leave_id=leave.id, decision="approved"), manager_id, db)
+    finally:
+        db.close()
+
+
+def run_carry_forward(employee_id: int, type_id: int) -> dict:
+    """Carry forward the closed year for this one balance"""
+    balance_id = balance_of(employee_id, type_id).id
+    db = SessionLocal()
+    try:
+        return carry_forward.carry_forward_chunk(db, CLOSED_YEAR, balance_id, balance_id + 1)
+    finally:
+        db.close()
+
+
+def reconciled_used(employee_id: int) -> int:
+    db = SessionLocal()
+    try:
+        usage = db.execute(reconcile.expected_usage_query().where(Leave.employee_id == employee_id)).all()
+    finally:
+        db.close()
+    return int(usage[0][2]) if usage else 0
+
+
+def counters(employee_id: int, type_id: int) -> tuple:
+    balance = balance_of(employee_id, type_id)
+    return balance.total_allocated, balance.total_used, balance.remaining, balance.carried_over_year
+
+
+def expired_days(employee_id: int) -> int:
+    """Days posted to the ledger as expired"""
+    db = SessionLocal()
+    try:
+        return -db.scalar(
+            select(func.coalesce(func.sum(LeaveLedgerEntry.days), 0))
+            .where(LeaveLedgerEntry.employee_id == employee_id, LeaveLedgerEntry.entry_type == "expiry")
+        )
+    finally:
+        db.close()
+
+
+def test_new_year_credits_and_usage_are_kept(make_staff):
+    employee_id, manager_id, (type_id,) = make_staff(20, carry_forward_cap=CAP)
+    approve_leave(employee_id, manager_id, type_id, 3)
+
+    run_carry_forward(employee_id, type_id)
+
+    assert counters(employee_id, type_id) == (20, 3, 17, CLOSED_YEAR)
+    assert reconciled_used(employee_id) == 3
+
+
+def test_days_over_the_cap_expire_from_the_closed_year(make_staff):
+    employee_id, manager_id, (type_id,) = make_staff(20, carry_forward_cap=CAP)
+    credit_in_closed_year(employee_id)
+    approve_leave(employee_id, manager_id, type_id, 3)
+
+    summary = run_carry_forward(employee_id, type_id)
+
+    assert summary == {type_id: [1, 15, CAP]}
+    assert counters(employee_id, type_id) == (CAP, 3, CAP - 3, CLOSED_YEAR)
+    assert reconciled_used(employee_id) == 3
+
+
+def test_usage_beyond_the_headroom_is_never_expired(make_staff):
+    employee_id, manager_id, (type_id,) = make_staff(10, carry_forward_cap=CAP)
+    credit_in_closed_year(employee_id)
+    # 8 of the 10 days at the rollover taken in the new year: only the 2 left can expire
+    approve_leave(employee_id, manager_id, type_id, 8)
+
+    summary = run_carry_forward(employee_id, type_id)
+
+    assert summary == {type_id: [1, 2, 8]}
+    assert counters(employee_id, type_id) == (8, 8, 0, CLOSED_YEAR)
+    assert expired_days(employee_id) == 2
+    assert reconciled_used(employee_id) == 8
+
+
+def test_rerun_changes_nothing(make_staff):
+    employee_id, manager_id, (type_id,) = make_staff(20, carry_forward_cap=CAP)
+    credit_in_closed_year(employee_id)
+    approve_leave(employee_id, manager_id, type_id, 3)
+    run_carry_forward(employee_id, type_id)
+    before = counters(employee_id, type_id)
+
+    assert run_carry_forward(employee_id, type_id) == {}
+
+    assert counters(employee_id, type_id) == before
+    assert expired_days(employee_id) == 20 - CAP
@@ -0,0 +1,68 @@
+"""
+Token-bucket throttling for the login routes.
+
+Every login attempt takes a token from two buckets, one keyed by the email
+and one by the client IP, so neither a single account nor a single source
+can drive more bcrypt work than the configured rate. Buckets refill
+continuously at LOGIN_RATE_PER_MINUTE up to LOGIN_BURST.
+"""
+from fastapi import HTTPException, Request, status
+from typing import Dict, Tuple
+import math
+import os
+import threading
+import time
+
+LOGIN_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE", "10"))
+LOGIN_BURST = float(os.getenv("LOGIN_BURST", "5"))
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv("LOGIN_THROTTLE_MAX_KEYS", "100000"))
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets held in memory"""
+
+    def __init__(self, rate_per_second: float, burst: float, max_keys: int):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, *keys: str) -> float:
+        """Take one token from each key's bucket; returns 0, or seconds to wait if any bucket is empty"""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            levels = {key: self._level(key, now) for key in keys}
+            lowest = min(levels.values())
+            if lowest < 1:
+                return (1 - lowest) / self.rate
+            for key, level in levels.items():
+                self._buckets[key] = (level - 1, now)
+            return 0.0
+
+    def _level(self, key: str, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        full = [key for key in self._buckets if self._level(key, now) >= self.burst]
+        for key in full:
+            del self._buckets[key]
+
+
+login_limiter = TokenBucketLimiter(LOGIN_RATE_PER_MINUTE / 60, LOGIN_BURST, LOGIN_THROTTLE_MAX_KEYS)
+
+
+def throttle_login(request: Request, email: str):
+    """Raise 429 if this email or client IP has run out of login attempts"""
+    client_ip = request.client.host if request.client else "unknown"
+    wait = login_limiter.acquire(f"email:{email.lower()}", f"ip:{client_ip}")
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
@@ -0,0 +1,128 @@
+"""
+Working-day calculations with per-region holiday calendars.
+
+Leave durations count the working days from the start date to the end date
+inclusive, skipping weekends (WORKWEEK_MASK) and the holidays stored for the
+employee's region. Each region's holidays are loaded once into a
+numpy.busdaycalendar and reused; crud drops a region's calendar when its
+holidays change. Batch calls count thousands of periods with one vectorized
+busday_count per region.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+from typing import Iterable, List, Sequence, Union
+import os
+import threading
+import time
+
+import numpy as np
+
+from models import Employee, Holiday
+
+DEFAULT_REGION = "default"
+WORKWEEK_MASK = os.getenv("WORKWEEK_MASK", "1111100")
+HOLIDAY_CACHE_TTL = float(os.getenv("HOLIDAY_CACHE_TTL", "300"))
+
+# Session.info key holding regions whose holidays changed in the current transaction
+CHANGED_KEY = "changed_holiday_regions"
+
+
+class HolidayCalendars:
+    """In-memory busdaycalendar per region, reloaded after changes or HOLIDAY_CACHE_TTL"""
+
+    def __init__(self, weekmask: str, ttl: float):
+        self.weekmask = weekmask
+        self.ttl = ttl
+        self._calendars = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, db: Session, region: str) -> np.busdaycalendar:
+        entry = self._calendars.get(region)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        with self._lock:
+            holidays = [row.date for row in db.query(Holiday.date).filter(Holiday.region == region)]
+            calendar = np.busdaycalendar(
+                weekmask=self.weekmask,
+                holidays=np.array(holidays, dtype="datetime64[D]")
+            )
+            self._calendars[region] = (calendar, time.monotonic() + self.ttl)
+            self.loads += 1
+            return calendar
+
+    def invalidate(self, region: str):
+        self._calendars.pop(region, None)
+
+    def stats(self) -> dict:
+        return {"regions": len(self._calendars), "loads": self.loads, "weekmask": self.weekmask}
+
+
+holiday_calendars = HolidayCalendars(WORKWEEK_MASK, HOLIDAY_CACHE_TTL)
+
+
+def _as_date(value: Union[date, datetime]) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def working_days(db: Session, region: str, start: Union[date, datetime], end: Union[date, datetime]) -> int:
+    """Working days from start to end, both inclusive"""
+    return int(working_days_batch(db, [region], [start], [end])[0])
+
+
+def working_days_batch(
+    db: Session,
+    regions: Sequence[str],
+    starts: Sequence[Union[date, datetime]],
+    ends: Sequence[Union[date, datetime]]
+) -> np.ndarray:
+    """Working days for many periods at once, one busday_count call per distinct region"""
+    region_array = np.asarray(regions, dtype=object)
+    start_array = np.array([_as_date(s) for s in starts], dtype="datetime64[D]")
+    # busday_count excludes the end date, and leave periods include it
+    end_array = np.array([_as_date(e) for e in ends], dtype="datetime64[D]") + np.timedelta64(1, "D")
+    days = np.zeros(len(start_array), dtype=np.int64)
+    for region in set(region_array):
+        mask = region_array == region
+        days[mask] = np.busday_count(
+            start_array[mask], end_array[mask], busdaycal=holiday_calendars.get(db, region)
+        )
+    return np.maximum(days, 0)
+
+
+def employee_regions(db: Session, employee_ids: Iterable[int]) -> dict:
+    rows = db.query(Employee.id, Employee.region).filter(Employee.id.in_(set(employee_ids))).all()
+    return dict(rows)
+
+
+def leave_days_batch(db: Session, leaves: Sequence) -> List[int]:
+    """Working days for each leave, looking up all employee regions in one query"""
+    if not leaves:
+        return []
+    regions = employee_regions(db, (leave.employee_id for leave in leaves))
+    return working_days_batch(
+        db,
+        [regions.get(leave.employee_id, DEFAULT_REGION) for leave in leaves],
+        [leave.start_time for leave in leaves],
+        [leave.end_time for leave in leaves]
+    ).tolist()
+
+
+def mark_changed(db: Session, region: str):
+    """Drop a region's calendar now and again after the session commits"""
+    holiday_calendars.invalidate(region)
+    db.info.setdefault(CHANGED_KEY, set()).add(region)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session):
+    for region in session.info.pop(CHANGED_KEY, ()):
+        holiday_calendars.invalidate(region)
+
+
+@event.listens_for(Session, "after_rollback")
+def _invalidate_rolled_back(session: Session):
+    # A calendar loaded inside the failed transaction may hold its uncommitted holidays
+    for region in session.info.pop(CHANGED_KEY, ()):
+        holiday_calendars.invalidate(region)